@@ -0,0 +1,199 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+from .synthetic_galaxy import DEFAULT_DENSITY, DEFAULT_RADIUS, DEFAULT_SEED, SyntheticGalaxy
+
+SPHERE_SEARCH_PATH = '/api-v1/sphere-systems'
+SYSTEM_PATH = '/api-v1/system'
+BODIES_PATH = '/api-system-v1/bodies'
+
+# EDSM caps sphere searches to this radius
+MAX_SEARCH_RADIUS = 100
+RATE_LIMIT_WINDOW = 60.0
+UNLIMITED_CALLS = 1_000_000
+
+
+class RateLimitWindow:
+    """
+    Fixed window rate limit of one EDSM api, answered through `x-rate-limit-*` headers
+    """
+    limit: int
+    calls: int
+    started_at: float
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.calls = 0
+        self.started_at = time.monotonic()
+
+    def take(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        :return: whether the call is allowed, and the rate limit headers of the response
+        """
+        now = time.monotonic()
+        if now - self.started_at >= RATE_LIMIT_WINDOW:
+            self.calls = 0
+            self.started_at = now
+        reset = max(1, round(self.started_at + RATE_LIMIT_WINDOW - now))
+        allowed = self.calls < self.limit
+        if allowed:
+            self.calls += 1
+        headers = {
+                'x-rate-limit-limit'    : str(self.limit),
+                'x-rate-limit-remaining': str(self.limit - self.calls),
+                'x-rate-limit-reset'    : str(reset),
+        }
+        if not allowed:
+            headers['retry-after'] = str(reset)
+        return allowed, headers
+
+
+class EdsmStubServer:
+    """
+    Local stand-in for EDSM, serving `api-v1/sphere-systems`, `api-v1/system` and
+    `api-system-v1/bodies` from a synthetic galaxy. Point `EDSM_BASE_URL` at `base_url`.
+
+    With `rate_limit`, each api allows that many calls per minute and answers 429 beyond,
+    as EDSM does; `latency` delays every response to emulate the network.
+    """
+    galaxy: SyntheticGalaxy
+    calls: Dict[str, int]
+
+    def __init__(self, galaxy: SyntheticGalaxy, port: int = 0, host: str = '127.0.0.1',
+                 rate_limit: Optional[int] = None, latency: float = 0.0):
+        """
+        :param galaxy: the galaxy served
+        :param port: the port to listen on (0 for any free port)
+        :param host: the interface to listen on
+        :param rate_limit: the calls allowed per minute and per api (no limit if None)
+        :param latency: the delay added to every response, in seconds
+        """
+        self.galaxy = galaxy
+        self.calls = {SPHERE_SEARCH_PATH: 0, SYSTEM_PATH: 0, BODIES_PATH: 0}
+        self._latency = latency
+        self._windows = {path: RateLimitWindow(rate_limit if rate_limit else UNLIMITED_CALLS)
+                         for path in self.calls}
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer((host, port), self.__handler_class())
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, name='edsm-stub', daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self) -> 'EdsmStubServer':
+        self._thread.start()
+        return self
+
+    def join(self) -> None:
+        self._thread.join()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, str], object]:
+        """
+        Answer a call to the stub
+        :param path: the path called
+        :param params: the query parameters
+        :return: status code, headers and json payload of the response
+        """
+        if path not in self.calls:
+            return 404, {}, {}
+        with self._lock:
+            allowed, headers = self._windows[path].take()
+            if allowed:
+                self.calls[path] += 1
+        if not allowed:
+            return 429, headers, {'msg': 'Too many requests'}
+        if self._latency > 0:
+            time.sleep(self._latency)
+
+        if path == SPHERE_SEARCH_PATH:
+            return 200, headers, self.__sphere_systems(params)
+        if path == SYSTEM_PATH:
+            system = self.__find_system(params)
+            return 200, headers, system if system is not None else []
+        system = self.__find_system(params)
+        if system is None:
+            return 200, headers, {}
+        return 200, headers, {'id'       : system['id'],
+                              'id64'     : system['id64'],
+                              'name'     : system['name'],
+                              'bodyCount': system['bodyCount'],
+                              'bodies'   : self.galaxy.bodies(system)}
+
+    def __sphere_systems(self, params: Dict[str, str]) -> list:
+        # the reader sends `x_coord`, EDSM documents `x`: both are understood
+        center = tuple(float(params.get(f'{axis}_coord', params.get(axis, 0))) for axis in 'xyz')
+        radius = min(float(params.get('radius', MAX_SEARCH_RADIUS)), MAX_SEARCH_RADIUS)
+        return self.galaxy.sphere_systems(center, radius)
+
+    def __find_system(self, params: Dict[str, str]) -> Optional[dict]:
+        if 'systemId' in params:
+            return self.galaxy.system_by_id(int(params['systemId']))
+        if 'systemName' in params:
+            return self.galaxy.system_by_name(params['systemName'])
+        return None
+
+    def __handler_class(self):
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, headers, payload = stub.handle(url.path, params)
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, message_format, *args):
+                pass
+
+        return StubHandler
+
+
+@click.command()
+@click.option('--port', type=int, default=8080, help="The port the stub listens on")
+@click.option('--seed', type=int, default=DEFAULT_SEED, help="The seed of the synthetic galaxy")
+@click.option('--radius', type=float, default=DEFAULT_RADIUS,
+              help="The radius of the synthetic galaxy around Sol, in light years")
+@click.option('--density', type=float, default=DEFAULT_DENSITY,
+              help="The number of systems per cubic light year on the galactic plane")
+@click.option('--rate_limit', type=int, help="The calls allowed per minute and per api (no limit if not set)")
+@click.option('--latency', type=float, default=0.0, help="The delay added to every response, in seconds")
+def command_line(port: int, seed: int, radius: float, density: float, rate_limit: Optional[int],
+                 latency: float):
+    """Serve a synthetic galaxy through a local EDSM stub
+
+    example:
+    python -m bench.edsm_stub_server --port 8080 --rate_limit 360
+    """
+    galaxy = SyntheticGalaxy(seed, radius, density)
+    server = EdsmStubServer(galaxy, port, rate_limit=rate_limit, latency=latency).start()
+    print(f'=== EDSM stub serving {len(galaxy)} systems on {server.base_url} ===')
+    try:
+        server.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    command_line()
@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+import click
+
+from edsm_reader import PREPARED_STATEMENTS
+from edsm_reader.io.bulk_database import DEFAULT_PAGE_SIZE, BulkDatabase
+from edsm_reader.io.write_buffer import DEFAULT_MAX_DELAY, DEFAULT_MAX_SIZE, WriteBuffer
+from edsm_reader.loader.dump_loader import DumpLoader
+from edsm_reader.orchestrator.edsm_orchestrator import (BODIES_PROCESSED, DEFAULT_CRAWL_WORKERS,
+                                                        SYSTEMS_PROCESSED, EDSMOrchestrator)
+from edsm_reader.utils.log import configure_logging
+
+from .edsm_stub_server import EdsmStubServer
+from .synthetic_galaxy import DEFAULT_DENSITY, DEFAULT_RADIUS, DEFAULT_SEED, SyntheticGalaxy
+
+CRAWL_SCENARIO = 'crawl'
+PLAN_SCENARIO = 'plan'
+REFRESH_SCENARIO = 'refresh'
+DUMP_SCENARIO = 'dump'
+SCENARIOS = (DUMP_SCENARIO, CRAWL_SCENARIO, PLAN_SCENARIO, REFRESH_SCENARIO)
+ALL_SCENARIOS = 'all'
+
+DEFAULT_REFRESH_COUNT = 500
+REPORT_COLUMNS = ('scenario', 'seconds', 'systems', 'bodies', 'systems_per_min', 'bodies_per_min',
+                  'db_queries_per_system', 'edsm_calls', 'peak_rss_mb')
+
+
+class CountingDatabase:
+    """
+    Proxy of a database counting the round-trips sent through it
+    """
+
+    def __init__(self, db, page_size: int = DEFAULT_PAGE_SIZE):
+        self._db = db
+        self._page_size = page_size
+        self._lock = Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def exec_db_read(self, query: str, params: dict):
+        with self._lock:
+            self.reads += 1
+        return self._db.exec_db_read(query, params)
+
+    def exec_db_write(self, query: str, params: dict):
+        with self._lock:
+            self.writes += 1
+        return self._db.exec_db_write(query, params)
+
+    def exec_db_batch(self, statements: List[Tuple[str, List[dict]]]):
+        # `execute_batch` sends one round-trip per page of parameters
+        with self._lock:
+            self.writes += sum(math.ceil(len(params_list) / self._page_size)
+                               for _, params_list in statements)
+        return self._db.exec_db_batch(statements)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def _peak_rss_mb() -> float:
+    # `ru_maxrss` is in KB on linux, the dump loader pool counts as children
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / 1024, 1)
+
+
+def _build_databases(crawl_workers: int) -> Tuple[CountingDatabase, CountingDatabase]:
+    db_params = (os.getenv("DB_HOST", default="localhost"),
+                 os.getenv("DB_PORT", default="5432"),
+                 os.getenv("DB_USER", default="astraeus"),
+                 os.getenv("DB_NAME", default="astraeus-db"),
+                 os.getenv("DB_PASSWORD", default="astraeus"))
+    # pooled as by the reader: the services and the bulk writes share the same connections
+    database = BulkDatabase(*db_params, min_size=1, max_size=crawl_workers + 2,
+                            prepared_statements=PREPARED_STATEMENTS)
+    return CountingDatabase(database), CountingDatabase(database)
+
+
+def run_scenario(scenario: str, galaxy: SyntheticGalaxy, stub: EdsmStubServer,
+                 crawl_workers: int, write_buffer_size: int, refresh_count: int) -> Dict[str, object]:
+    """
+    Run one scenario against the stub and the database configured by `DB_*` environment variables
+    :return: the measures of the scenario
+    """
+    os.environ['EDSM_BASE_URL'] = stub.base_url
+    # every call must reach the stub to be measured
+    os.environ.pop('EDSM_CACHE_PATH', None)
+
+    database, bulk_database = _build_databases(crawl_workers)
+    write_buffer = None
+    if write_buffer_size > 0:
+        write_buffer = WriteBuffer(bulk_database, write_buffer_size, DEFAULT_MAX_DELAY)
+    orchestrator = EDSMOrchestrator(database, write_buffer, crawl_workers)
+
+    scenarios: Dict[str, Callable[[], Optional[Tuple[int, int]]]] = {
+            CRAWL_SCENARIO  : lambda: orchestrator.full_scan_from_coord(0, 0, 0),
+            PLAN_SCENARIO   : lambda: orchestrator.planned_scan_from_coord(0, 0, 0, galaxy.radius),
+            REFRESH_SCENARIO: lambda: _refresh_systems(galaxy, orchestrator, refresh_count),
+            DUMP_SCENARIO   : lambda: _load_dumps(galaxy, bulk_database),
+    }
+
+    start = time.monotonic()
+    try:
+        loaded = scenarios[scenario]()
+    finally:
+        orchestrator.close()
+        if write_buffer is not None:
+            write_buffer.close()
+        bulk_database.close()
+    elapsed = time.monotonic() - start
+
+    systems, bodies = loaded if loaded is not None \
+        else (int(SYSTEMS_PROCESSED.value()), int(BODIES_PROCESSED.value()))
+    queries = database.reads + database.writes + bulk_database.reads + bulk_database.writes
+    return {
+            'scenario'             : scenario,
+            'seconds'              : round(elapsed, 1),
+            'systems'              : systems,
+            'bodies'               : bodies,
+            'systems_per_min'      : round(systems / elapsed * 60, 1),
+            'bodies_per_min'       : round(bodies / elapsed * 60, 1),
+            'db_reads'             : database.reads + bulk_database.reads,
+            'db_writes'            : database.writes + bulk_database.writes,
+            'db_queries_per_system': round(queries / systems, 2) if systems > 0 else None,
+            'edsm_calls'           : sum(stub.calls.values()),
+            'peak_rss_mb'          : _peak_rss_mb(),
+    }
+
+
+def _refresh_systems(galaxy: SyntheticGalaxy, orchestrator: EDSMOrchestrator,
+                     refresh_count: int) -> None:
+    for system in galaxy.systems[:refresh_count]:
+        orchestrator.refresh_a_full_system(system)
+
+
+def _load_dumps(galaxy: SyntheticGalaxy, bulk_database: CountingDatabase) -> Tuple[int, int]:
+    with tempfile.TemporaryDirectory() as directory:
+        systems_path = os.path.join(directory, 'systemsWithCoordinates.json')
+        bodies_path = os.path.join(directory, 'bodies.json')
+        counts = galaxy.write_dumps(systems_path, bodies_path)
+        loader = DumpLoader(bulk_database)
+        loader.load(systems_path)
+        loader.load(bodies_path)
+    return counts
+
+
+def _print_report(results: List[Dict[str, object]]) -> None:
+    widths = {column: max(len(column), *(len(str(result.get(column))) for result in results))
+              for column in REPORT_COLUMNS}
+    print('  '.join(column.ljust(widths[column]) for column in REPORT_COLUMNS))
+    for result in results:
+        print('  '.join(str(result.get(column)).ljust(widths[column]) for column in REPORT_COLUMNS))
+
+
+@click.command()
+@click.option('--scenario', type=click.Choice([*SCENARIOS, ALL_SCENARIOS]), default=ALL_SCENARIOS,
+              help="The ingestion path measured (all: each one in its own process)")
+@click.option('--seed', type=int, default=DEFAULT_SEED, help="The seed of the synthetic galaxy")
+@click.option('--radius', type=float, default=DEFAULT_RADIUS,
+              help="The radius of the synthetic galaxy around Sol, in light years")
+@click.option('--density', type=float, default=DEFAULT_DENSITY,
+              help="The number of systems per cubic light year on the galactic plane")
+@click.option('--rate_limit', type=int, help="The calls allowed per minute and per api by the stub")
+@click.option('--latency', type=float, default=0.0, help="The delay added to every stub response, in seconds")
+@click.option('--crawl_workers', type=int, default=DEFAULT_CRAWL_WORKERS,
+              help="The number of workers running the sphere searches")
+@click.option('--write_buffer_size', type=int, default=DEFAULT_MAX_SIZE,
+              help="The number of pending rows before a bulk write (0 to write each row at once)")
+@click.option('--refresh_count', type=int, default=DEFAULT_REFRESH_COUNT,
+              help="The number of systems refreshed by the refresh scenario")
+@click.option('--output', help="The file the results are written to, as json")
+@click.option('--log_level', default='WARNING', help="The log level of the reader during the runs")
+def command_line(scenario: str, seed: int, radius: float, density: float, rate_limit: Optional[int],
+                 latency: float, crawl_workers: int, write_buffer_size: int, refresh_count: int,
+                 output: Optional[str], log_level: str):
+    """Benchmark the reader offline, against a local EDSM stub serving a synthetic galaxy
+
+    The database configured by `DB_*` environment variables is written to: use a local one
+    (`make db-local-reset`).
+
+    example:
+    python -m bench.run_bench --scenario all --radius 200 --output bench_output.json
+    """
+    if scenario == ALL_SCENARIOS:
+        # one process per scenario, so the peak RSS of each one is its own
+        results = []
+        arguments = ['--seed', str(seed), '--radius', str(radius), '--density', str(density),
+                     '--latency', str(latency), '--crawl_workers', str(crawl_workers),
+                     '--write_buffer_size', str(write_buffer_size),
+                     '--refresh_count', str(refresh_count), '--log_level', log_level]
+        if rate_limit is not None:
+            arguments.extend(['--rate_limit', str(rate_limit)])
+        for single_scenario in SCENARIOS:
+            completed = subprocess.run([sys.executable, '-m', 'bench.run_bench', *arguments,
+                                        '--scenario', single_scenario],
+                                       capture_output=True, text=True, check=True)
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        _print_report(results)
+    else:
+        configure_logging(log_level)
+        galaxy = SyntheticGalaxy(seed, radius, density)
+        stub = EdsmStubServer(galaxy, rate_limit=rate_limit, latency=latency).start()
+        try:
+            results = [run_scenario(scenario, galaxy, stub, crawl_workers, write_buffer_size,
+                                    refresh_count)]
+        finally:
+            stub.stop()
+        print(json.dumps(results[0]))
+
+    if output is not None:
+        with open(output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    command_line()
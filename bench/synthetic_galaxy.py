@@ -0,0 +1,209 @@
+import json
+import math
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_SEED = 42
+DEFAULT_RADIUS = 200.0
+# systems per cubic light year on the galactic plane (the neighbourhood of Sol holds ~0.004 stars)
+DEFAULT_DENSITY = 0.0005
+# the density halves every `scale_height * ln 2` light years away from the galactic plane
+DEFAULT_SCALE_HEIGHT = 1000.0
+GRID_CELL_SIZE = 50.0
+# share of the systems without any body known by EDSM
+NO_BODY_RATIO = 0.4
+MEAN_BODY_COUNT = 8
+MAX_BODY_COUNT = 80
+SECTOR_NAMES = ('Synuefe', 'Col 285 Sector', 'Wregoe', 'Outorst', 'Droju', 'Bleia Eohn')
+STAR_CLASSES = ('M (Red dwarf) Star', 'K (Yellow-Orange) Star', 'G (White-Yellow) Star',
+                'F (White) Star', 'L (Brown dwarf) Star', 'T Tauri Star')
+PLANET_CLASSES = ('Icy body', 'Rocky body', 'High metal content world', 'Class I gas giant',
+                  'Class II gas giant', 'Gas giant with water based life', 'Water world',
+                  'Earth-like world', 'Metal-rich body', 'Rocky Ice world')
+
+Coord = Tuple[float, float, float]
+
+
+class SyntheticGalaxy:
+    """
+    Seeded, reproducible galaxy shaped like EDSM data: systems spread around `Sol` with a density
+    falling off away from the galactic plane, and bodies generated on demand for each system.
+
+    The same seed always gives the same systems, bodies and ids, so benchmark runs compare.
+    """
+    seed: int
+    radius: float
+    systems: List[dict]
+    _by_id: Dict[int, dict]
+    _by_name: Dict[str, dict]
+    _grid: Dict[Tuple[int, int, int], List[dict]]
+
+    def __init__(self, seed: int = DEFAULT_SEED,
+                 radius: float = DEFAULT_RADIUS,
+                 density: float = DEFAULT_DENSITY,
+                 scale_height: float = DEFAULT_SCALE_HEIGHT):
+        """
+        :param seed: the seed of the generator
+        :param radius: the radius of the galaxy around `Sol`, in light years
+        :param density: the number of systems per cubic light year on the galactic plane
+        :param scale_height: the vertical scale of the density falloff, in light years
+        """
+        self.seed = seed
+        self.radius = radius
+        self.systems = []
+        self._by_id = {}
+        self._by_name = {}
+        self._grid = {}
+
+        rng = random.Random(seed)
+        candidates = int(density * 4 / 3 * math.pi * radius ** 3)
+        self.__add_system(self.__build_system(rng, 1, 'Sol', (0.0, 0.0, 0.0)))
+        for _ in range(candidates):
+            coord = self.__random_point_in_sphere(rng, radius)
+            if rng.random() <= math.exp(-abs(coord[1]) / scale_height):
+                system_id = len(self.systems) + 1
+                self.__add_system(self.__build_system(rng, system_id, None, coord))
+
+    def __len__(self):
+        return len(self.systems)
+
+    def system_by_id(self, system_id: int) -> Optional[dict]:
+        return self._by_id.get(system_id)
+
+    def system_by_name(self, name: str) -> Optional[dict]:
+        return self._by_name.get(name.lower())
+
+    def sphere_systems(self, center: Coord, radius: float) -> List[dict]:
+        """
+        Systems inside a sphere, with their distance to its center, as EDSM `sphere-systems` does
+        :param center: the center of the sphere
+        :param radius: the radius of the sphere
+        :return: the systems found, nearest first
+        """
+        found = []
+        lower = [math.floor((center[axis] - radius) / GRID_CELL_SIZE) for axis in range(3)]
+        upper = [math.floor((center[axis] + radius) / GRID_CELL_SIZE) for axis in range(3)]
+        for i in range(lower[0], upper[0] + 1):
+            for j in range(lower[1], upper[1] + 1):
+                for k in range(lower[2], upper[2] + 1):
+                    for system in self._grid.get((i, j, k), ()):
+                        coords = system['coords']
+                        distance = math.dist(center, (coords['x'], coords['y'], coords['z']))
+                        if distance <= radius:
+                            found.append({**system, 'distance': round(distance, 2)})
+        found.sort(key=lambda elem: elem['distance'])
+        return found
+
+    def bodies(self, system: dict) -> List[dict]:
+        """
+        Bodies of a system, generated from the seed of the galaxy and the id of the system
+        :param system: the system
+        :return: the bodies of the system, main star first
+        """
+        rng = random.Random(self.seed * 1_000_003 + system['id'])
+        bodies = []
+        for body_index in range(system['bodyCount']):
+            is_star = body_index == 0 or rng.random() < 0.05
+            body_id = system['id'] * 100 + body_index
+            body = {
+                    'id'               : body_id,
+                    'id64'             : (body_index << 55) | system['id64'],
+                    'bodyId'           : body_index,
+                    'name'             : system['name'] if body_index == 0
+                    else f'{system["name"]} {body_index}',
+                    'type'             : 'Star' if is_star else 'Planet',
+                    'subType'          : rng.choice(STAR_CLASSES if is_star else PLANET_CLASSES),
+                    'distanceToArrival': 0 if body_index == 0 else round(rng.uniform(10, 6000), 2),
+                    'systemId'         : system['id'],
+                    'systemId64'       : system['id64'],
+                    'systemName'       : system['name'],
+                    'updateTime'       : system['date'],
+            }
+            if is_star:
+                body.update({
+                        'isMainStar'        : body_index == 0,
+                        'isScoopable'       : rng.random() < 0.7,
+                        'age'               : rng.randint(10, 13_000),
+                        'solarMasses'       : round(rng.uniform(0.1, 3), 4),
+                        'solarRadius'       : round(rng.uniform(0.1, 3), 4),
+                        'surfaceTemperature': rng.randint(800, 12_000),
+                })
+            else:
+                body.update({
+                        'isLandable'        : rng.random() < 0.35,
+                        'gravity'           : round(rng.uniform(0.01, 3), 4),
+                        'earthMasses'       : round(rng.uniform(0.001, 300), 4),
+                        'radius'            : round(rng.uniform(200, 70_000), 2),
+                        'surfaceTemperature': rng.randint(20, 2000),
+                        'orbitalPeriod'     : round(rng.uniform(0.5, 50_000), 3),
+                        'semiMajorAxis'     : round(rng.uniform(0.01, 100), 4),
+                        'terraformingState' : 'Not terraformable',
+                })
+            bodies.append(body)
+        return bodies
+
+    def write_dumps(self, systems_path: str, bodies_path: str) -> Tuple[int, int]:
+        """
+        Write the galaxy as EDSM nightly dumps (`systemsWithCoordinates.json`, `bodies.json`)
+        :param systems_path: the path of the systems dump
+        :param bodies_path: the path of the bodies dump
+        :return: the number of systems and bodies written
+        """
+        with open(systems_path, 'w', encoding='utf-8') as systems_file:
+            self.__write_dump(systems_file, ({key: system[key] for key in
+                                              ('id', 'id64', 'name', 'coords', 'date')}
+                                             for system in self.systems))
+        with open(bodies_path, 'w', encoding='utf-8') as bodies_file:
+            self.__write_dump(bodies_file, (body for system in self.systems
+                                            for body in self.bodies(system)))
+        return len(self.systems), sum(system['bodyCount'] for system in self.systems)
+
+    @staticmethod
+    def __write_dump(dump_file, records: Iterator[dict]) -> None:
+        dump_file.write('[\n')
+        first = True
+        for record in records:
+            if not first:
+                dump_file.write(',\n')
+            dump_file.write(f'    {json.dumps(record)}')
+            first = False
+        dump_file.write('\n]\n')
+
+    def __add_system(self, system: dict) -> None:
+        self.systems.append(system)
+        self._by_id[system['id']] = system
+        self._by_name[system['name'].lower()] = system
+        coords = system['coords']
+        cell = tuple(math.floor(coords[axis] / GRID_CELL_SIZE) for axis in ('x', 'y', 'z'))
+        self._grid.setdefault(cell, []).append(system)
+
+    @staticmethod
+    def __random_point_in_sphere(rng: random.Random, radius: float) -> Coord:
+        while True:
+            point = tuple(rng.uniform(-radius, radius) for _ in range(3))
+            if point[0] ** 2 + point[1] ** 2 + point[2] ** 2 <= radius ** 2:
+                # EDSM coordinates are multiples of 1/32 light year
+                return tuple(round(value * 32) / 32 for value in point)
+
+    @staticmethod
+    def __build_system(rng: random.Random, system_id: int, name: Optional[str], coord: Coord) -> dict:
+        if name is None:
+            name = f'{rng.choice(SECTOR_NAMES)} {chr(65 + rng.randrange(26))}' \
+                   f'{chr(65 + rng.randrange(26))}-{chr(65 + rng.randrange(26))} ' \
+                   f'{rng.choice("abcdefgh")}{rng.randrange(40)}-{system_id}'
+        if rng.random() < NO_BODY_RATIO and system_id != 1:
+            body_count = 0
+        else:
+            body_count = min(MAX_BODY_COUNT, 1 + int(rng.expovariate(1 / (MEAN_BODY_COUNT - 1))))
+        return {
+                'id'           : system_id,
+                'id64'         : system_id * 1024 + 7,
+                'name'         : name,
+                'coords'       : {'x': coord[0], 'y': coord[1], 'z': coord[2]},
+                'coordsLocked' : True,
+                'requirePermit': False,
+                'information'  : {},
+                'primaryStar'  : {'type': rng.choice(STAR_CLASSES), 'name': name, 'isScoopable': True},
+                'bodyCount'    : body_count,
+                'date'         : '2024-01-01 00:00:00',
+        }
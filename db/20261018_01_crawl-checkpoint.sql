@@ -0,0 +1,17 @@
+-- Checkpoint of the sphere-search crawls, to resume them after a restart
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.crawl_checkpoint
+(
+    crawl_id    TEXT             NOT NULL,
+    x           DOUBLE PRECISION NOT NULL,
+    y           DOUBLE PRECISION NOT NULL,
+    z           DOUBLE PRECISION NOT NULL,
+    radius      INTEGER          NOT NULL,
+    status      TEXT             NOT NULL,
+    update_time TIMESTAMP        NOT NULL DEFAULT now(),
+    PRIMARY KEY (crawl_id, x, y, z, radius)
+);
+
+CREATE INDEX IF NOT EXISTS crawl_checkpoint_status_idx
+    ON astraeus.crawl_checkpoint (crawl_id, status);
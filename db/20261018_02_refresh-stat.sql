@@ -0,0 +1,12 @@
+-- Refresh statistics of the systems, to schedule the refresh of the stalest and most changing ones
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.refresh_stat
+(
+    key          JSONB            NOT NULL PRIMARY KEY,
+    change_count INTEGER          NOT NULL DEFAULT 0,
+    checked_date TIMESTAMP,
+    x            DOUBLE PRECISION,
+    y            DOUBLE PRECISION,
+    z            DOUBLE PRECISION
+);
@@ -0,0 +1,18 @@
+-- Leases of the galaxy sectors, shared by the reader instances of a sharded scan
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.sector_lease
+(
+    sector_id   TEXT             NOT NULL PRIMARY KEY,
+    x           DOUBLE PRECISION NOT NULL,
+    y           DOUBLE PRECISION NOT NULL,
+    z           DOUBLE PRECISION NOT NULL,
+    size        DOUBLE PRECISION NOT NULL,
+    status      TEXT             NOT NULL,
+    owner       TEXT,
+    lease_until TIMESTAMP,
+    update_time TIMESTAMP        NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sector_lease_status_idx
+    ON astraeus.sector_lease (status, lease_until);
@@ -0,0 +1,9 @@
+-- Last fetch of the bodies of each system, to skip the bodies call of the systems unchanged since
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.body_sync
+(
+    key         JSONB     NOT NULL PRIMARY KEY,
+    body_count  INTEGER,
+    synced_date TIMESTAMP NOT NULL
+);
@@ -0,0 +1,18 @@
+-- Append-only history of the changes of the systems and bodies, by compressed batches of records,
+-- partitioned by month (the monthly partitions are created by the reader as needed)
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.change_history
+(
+    recorded_date TIMESTAMP  NOT NULL,
+    id64s         BIGINT[]   NOT NULL,
+    record_count  INTEGER    NOT NULL,
+    codec         VARCHAR(8) NOT NULL,
+    records       BYTEA      NOT NULL
+) PARTITION BY RANGE (recorded_date);
+
+CREATE TABLE IF NOT EXISTS astraeus.change_history_default
+    PARTITION OF astraeus.change_history DEFAULT;
+
+CREATE INDEX IF NOT EXISTS change_history_id64s_idx
+    ON astraeus.change_history USING GIN (id64s);
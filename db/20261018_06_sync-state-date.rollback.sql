@@ -0,0 +1 @@
+DROP INDEX IF EXISTS astraeus.sync_state_sync_date_idx;
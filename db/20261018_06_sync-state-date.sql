@@ -0,0 +1,4 @@
+-- Index of the sync dates, to read the entities synced since the last snapshot export
+-- depends:
+
+CREATE INDEX IF NOT EXISTS sync_state_sync_date_idx ON astraeus.sync_state (sync_date);
@@ -0,0 +1 @@
+DROP TABLE IF EXISTS astraeus.edsm_dead_letter;
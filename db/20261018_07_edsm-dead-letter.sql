@@ -0,0 +1,17 @@
+-- Systems and bodies whose refresh failed, retried later with an increasing delay
+-- depends:
+
+CREATE TABLE IF NOT EXISTS astraeus.edsm_dead_letter
+(
+    kind            VARCHAR(16) NOT NULL,
+    key             JSONB       NOT NULL,
+    payload         JSONB       NOT NULL,
+    error           TEXT,
+    attempts        INTEGER     NOT NULL DEFAULT 1,
+    created_date    TIMESTAMP   NOT NULL,
+    next_retry_date TIMESTAMP   NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+
+CREATE INDEX IF NOT EXISTS edsm_dead_letter_next_retry_idx
+    ON astraeus.edsm_dead_letter (next_retry_date);
@@ -0,0 +1,2 @@
+DROP INDEX IF EXISTS astraeus.refresh_stat_x_idx;
+DROP INDEX IF EXISTS astraeus.refresh_stat_checked_date_idx;
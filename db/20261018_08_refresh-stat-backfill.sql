@@ -0,0 +1,22 @@
+-- Refresh statistics of the systems stored before them (position and last refresh), and the
+-- indexes bounding the search of the refresh candidates
+-- depends:
+
+INSERT INTO astraeus.refresh_stat (key, change_count, checked_date, x, y, z)
+SELECT s.key, 0, s.sync_date,
+       (sy.coords::JSONB ->> 'x')::DOUBLE PRECISION,
+       (sy.coords::JSONB ->> 'y')::DOUBLE PRECISION,
+       (sy.coords::JSONB ->> 'z')::DOUBLE PRECISION
+  FROM astraeus.sync_state s
+  LEFT JOIN astraeus.system sy ON sy.key = s.key
+ WHERE s.data_type = 'system'
+    ON CONFLICT (key)
+    DO UPDATE SET checked_date = COALESCE(refresh_stat.checked_date, EXCLUDED.checked_date),
+                  x            = COALESCE(refresh_stat.x, EXCLUDED.x),
+                  y            = COALESCE(refresh_stat.y, EXCLUDED.y),
+                  z            = COALESCE(refresh_stat.z, EXCLUDED.z);
+
+CREATE INDEX IF NOT EXISTS refresh_stat_checked_date_idx
+    ON astraeus.refresh_stat (checked_date NULLS FIRST);
+
+CREATE INDEX IF NOT EXISTS refresh_stat_x_idx ON astraeus.refresh_stat (x);
@@ -0,0 +1,13 @@
+DROP INDEX IF EXISTS astraeus.sector_lease_scan_status_idx;
+CREATE INDEX IF NOT EXISTS sector_lease_status_idx
+    ON astraeus.sector_lease (status, lease_until);
+
+-- a sector shared by several scans is kept once
+DELETE FROM astraeus.sector_lease
+ WHERE ctid NOT IN (SELECT DISTINCT ON (sector_id) ctid
+                      FROM astraeus.sector_lease
+                     ORDER BY sector_id, update_time DESC);
+
+ALTER TABLE astraeus.sector_lease DROP CONSTRAINT IF EXISTS sector_lease_pkey;
+ALTER TABLE astraeus.sector_lease ADD PRIMARY KEY (sector_id);
+ALTER TABLE astraeus.sector_lease DROP COLUMN IF EXISTS scan_id;
@@ -0,0 +1,12 @@
+-- Sector leases kept apart by sharded scan (region and sector size), the sectors leased before
+-- belong to no scan anymore
+-- depends:
+
+ALTER TABLE astraeus.sector_lease ADD COLUMN IF NOT EXISTS scan_id TEXT NOT NULL DEFAULT '';
+
+ALTER TABLE astraeus.sector_lease DROP CONSTRAINT IF EXISTS sector_lease_pkey;
+ALTER TABLE astraeus.sector_lease ADD PRIMARY KEY (scan_id, sector_id);
+
+DROP INDEX IF EXISTS astraeus.sector_lease_status_idx;
+CREATE INDEX IF NOT EXISTS sector_lease_scan_status_idx
+    ON astraeus.sector_lease (scan_id, status, lease_until);
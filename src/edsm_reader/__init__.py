@@ -1,45 +1,149 @@
-import logging
 import os
+import socket
 from threading import Thread
+from typing import Optional
 
 import click
 import structlog as structlog
 
-from astraeus_common.io.database import Database
+from .io.bulk_database import DEFAULT_POOL_MIN_SIZE, BulkDatabase
+from .export.snapshot_exporter import SnapshotExporter
+from .io.write_buffer import DEFAULT_MAX_DELAY, DEFAULT_MAX_SIZE, WriteBuffer
+from .loader.dump_loader import DumpLoader
+from .orchestrator.body_refresh_policy import DEFAULT_BODY_MAX_AGE
+from .orchestrator.crawl_frontier import DEFAULT_FRONTIER_MAX_SIZE
+from .orchestrator.edsm_orchestrator import (DEFAULT_BODY_WORKERS, DEFAULT_CRAWL_WORKERS,
+                                             DEFAULT_SYSTEM_WORKERS, EDSMOrchestrator)
+from .orchestrator.pipeline import DEFAULT_STAGE_QUEUE_SIZE
+from .orchestrator.refresh_scheduler import DEFAULT_REFRESH_BUDGET, parse_hot_regions
+from .orchestrator.scan_planner import DEFAULT_REGION_RADIUS
+from .orchestrator.sector import DEFAULT_SECTOR_SIZE
+from .services import body_service, sync_state_service, system_service
+from .services.known_key_service import KnownKeyService
+from .services.sector_lease_service import SectorLeaseService
+from .services.system_position_service import SystemPositionService
+from .utils.known_key_index import KnownKeyIndex
+from .utils.log import AsyncLogWriter, configure_logging
+from .utils.metrics import DEFAULT_METRICS_HOST, MetricsServer, TextfileWriter
+from .utils.spatial_index import SpatialIndex
 
-from .orchestrator.edsm_orchestrator import EDSMOrchestrator
+CRAWL_SCAN_MODE = 'crawl'
+PLAN_SCAN_MODE = 'plan'
+REFRESH_SCAN_MODE = 'refresh'
+SHARD_SCAN_MODE = 'shard'
+
+# the statements prepared on every connection of the pool
+PREPARED_STATEMENTS = (system_service.PREPARED_STATEMENTS + body_service.PREPARED_STATEMENTS
+                       + sync_state_service.PREPARED_STATEMENTS)
 
 
 class EDSMReader:
     _orchestrator: EDSMOrchestrator
     _parameters: dict
+    _bulk_database: BulkDatabase
+    _known_keys: Optional[KnownKeyIndex]
+    _write_buffer: Optional[WriteBuffer]
     _init_thread: Thread
+    _metrics_server: Optional[MetricsServer]
+    _metrics_textfile: Optional[TextfileWriter]
+    _log_writer: Optional[AsyncLogWriter]
 
-    def __init__(self, log_level: str):
+    def __init__(self, log_level: str, init_file_path: str = None,
+                 write_buffer_size: int = DEFAULT_MAX_SIZE,
+                 crawl_workers: int = DEFAULT_CRAWL_WORKERS,
+                 frontier_max_size: int = DEFAULT_FRONTIER_MAX_SIZE,
+                 scan_mode: str = CRAWL_SCAN_MODE,
+                 region_radius: int = DEFAULT_REGION_RADIUS,
+                 resume: bool = False,
+                 metrics_port: int = 0,
+                 metrics_textfile: str = None,
+                 refresh_budget: int = DEFAULT_REFRESH_BUDGET,
+                 hot_regions: str = None,
+                 refresh_cycles: int = 0,
+                 sector_size: int = DEFAULT_SECTOR_SIZE,
+                 instance_id: str = None,
+                 api_key: str = None,
+                 db_pool_min_size: int = DEFAULT_POOL_MIN_SIZE,
+                 db_pool_max_size: int = 0,
+                 body_max_age: int = DEFAULT_BODY_MAX_AGE,
+                 system_workers: int = DEFAULT_SYSTEM_WORKERS,
+                 body_workers: int = DEFAULT_BODY_WORKERS,
+                 stage_queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+                 spatial_index: bool = False,
+                 local_search_min: int = 0,
+                 known_key_index: bool = False,
+                 export_path: str = None,
+                 log_async: bool = False,
+                 log_sample: int = 1,
+                 metrics_host: str = DEFAULT_METRICS_HOST,
+                 reset_sectors: bool = False):
         if log_level is None:
             log_level = 'INFO'
 
-        structlog.configure(
-                wrapper_class=structlog.make_filtering_bound_logger(
-                        logging.getLevelName(log_level)),
-        )
+        self._log_writer = configure_logging(log_level, log_async, log_sample)
         self._log = structlog.get_logger()
 
         self._parameters = {}
-        database = self.__build_db_from_param()
-        self._orchestrator = EDSMOrchestrator(database)
+        # a connection per worker of the pipeline, plus the write buffer flush and the lease heartbeat
+        db_pool_max_size = db_pool_max_size or crawl_workers + system_workers + body_workers + 2
+        self._bulk_database = self.__build_db_from_param(db_pool_min_size, db_pool_max_size)
+        index = self.__build_spatial_index() if spatial_index else None
+        self._known_keys = self.__build_known_key_index() if known_key_index else None
+        self._write_buffer = None
+        if write_buffer_size > 0:
+            self._write_buffer = WriteBuffer(self._bulk_database, write_buffer_size,
+                                             DEFAULT_MAX_DELAY)
+        self._orchestrator = EDSMOrchestrator(self._bulk_database, self._write_buffer,
+                                              crawl_workers, frontier_max_size, api_key,
+                                              body_max_age, system_workers, body_workers,
+                                              stage_queue_size, index, local_search_min,
+                                              self._known_keys)
+
+        self._metrics_server = MetricsServer(metrics_port, metrics_host) if metrics_port > 0 else None
+        self._metrics_textfile = TextfileWriter(metrics_textfile) if metrics_textfile else None
 
         self._parameters.update({
-                'log_level': log_level
+                'log_level'        : log_level,
+                'init_file_path'   : init_file_path,
+                'write_buffer_size': write_buffer_size,
+                'crawl_workers'    : crawl_workers,
+                'frontier_max_size': frontier_max_size,
+                'scan_mode'        : scan_mode,
+                'region_radius'    : region_radius,
+                'resume'           : resume,
+                'metrics_port'     : metrics_port,
+                'metrics_host'     : metrics_host,
+                'metrics_textfile' : metrics_textfile,
+                'refresh_budget'   : refresh_budget,
+                'hot_regions'      : parse_hot_regions(hot_regions),
+                'refresh_cycles'   : refresh_cycles,
+                'sector_size'      : sector_size,
+                'reset_sectors'    : reset_sectors,
+                'instance_id'      : instance_id or f'{socket.gethostname()}:{os.getpid()}',
+                'api_key'          : '*************' if api_key else None,
+                'db_pool_min_size' : db_pool_min_size,
+                'db_pool_max_size' : db_pool_max_size,
+                'body_max_age'     : body_max_age,
+                'system_workers'   : system_workers,
+                'body_workers'     : body_workers,
+                'stage_queue_size' : stage_queue_size,
+                'spatial_index'    : spatial_index,
+                'local_search_min' : local_search_min,
+                'known_key_index'  : known_key_index,
+                'export_path'      : export_path,
+                'log_async'        : log_async,
+                'log_sample'       : log_sample,
         })
 
-    def __build_db_from_param(self):
+    def __build_db_from_param(self, pool_min_size: int, pool_max_size: int) -> BulkDatabase:
         db_host = os.getenv("DB_HOST", default="localhost")
         db_port = os.getenv("DB_PORT", default="5432")
         db_user = os.getenv("DB_USER", default="astraeus")
         db_name = os.getenv("DB_NAME", default="astraeus-db")
         db_password = os.getenv("DB_PASSWORD", default="astraeus")
-        database = Database(db_host, db_port, db_user, db_name, db_password)
+        database = BulkDatabase(db_host, db_port, db_user, db_name, db_password,
+                                min_size=pool_min_size, max_size=pool_max_size,
+                                prepared_statements=PREPARED_STATEMENTS)
 
         self._parameters.update({
                 'db_host'    : db_host,
@@ -51,22 +155,177 @@ class EDSMReader:
 
         return database
 
+    def __build_spatial_index(self) -> SpatialIndex:
+        index = SpatialIndex()
+        indexed = index.load(SystemPositionService(self._bulk_database).stream_positions())
+        self._log.info(f'[spatial index]{indexed} stored systems indexed')
+        return index
+
+    def __build_known_key_index(self) -> KnownKeyIndex:
+        index = KnownKeyIndex()
+        loaded = index.load(KnownKeyService(self._bulk_database).stream_key_ids())
+        self._log.info(f'[known keys]{loaded} stored keys indexed in {index.size_bytes // 1024} KiB')
+        return index
+
     def run(self):
         self._log.debug('===  Starting parameters')
         for key in self._parameters:
             self._log.debug(f'===  {key}: {self._parameters[key]}')
 
-        self._orchestrator.full_scan_from_coord(0, 0, 0)  # start scan from `Sol` system
+        if self._metrics_server is not None:
+            self._metrics_server.start()
+            self._log.info(f'[metrics]Serving metrics on {self._parameters["metrics_host"]}:'
+                           f'{self._parameters["metrics_port"]}')
+        if self._metrics_textfile is not None:
+            self._metrics_textfile.start()
+
+        try:
+            if self._parameters['init_file_path'] is not None:
+                DumpLoader(self._bulk_database,
+                           known_keys=self._known_keys).load(self._parameters['init_file_path'])
+            elif self._parameters['export_path'] is not None:
+                SnapshotExporter(self._bulk_database, self._parameters['export_path']).export()
+            elif self._parameters['scan_mode'] == PLAN_SCAN_MODE:
+                # plan the scan of the region around `Sol` system
+                self._orchestrator.planned_scan_from_coord(0, 0, 0, self._parameters['region_radius'],
+                                                           self._parameters['resume'])
+            elif self._parameters['scan_mode'] == SHARD_SCAN_MODE:
+                # share the scan of the region around `Sol` system with the other instances
+                self._orchestrator.sharded_scan_from_coord(0, 0, 0,
+                                                           SectorLeaseService(self._bulk_database),
+                                                           self._parameters['instance_id'],
+                                                           self._parameters['region_radius'],
+                                                           self._parameters['sector_size'],
+                                                           reset=self._parameters['reset_sectors'])
+            elif self._parameters['scan_mode'] == REFRESH_SCAN_MODE:
+                self._orchestrator.scheduled_refresh(self._parameters['refresh_budget'],
+                                                     self._parameters['hot_regions'],
+                                                     self._parameters['refresh_cycles'] or None)
+            else:
+                # start scan from `Sol` system
+                self._orchestrator.full_scan_from_coord(0, 0, 0, self._parameters['resume'])
+        finally:
+            self._orchestrator.close()
+            if self._write_buffer is not None:
+                self._write_buffer.close()
+            self._bulk_database.close()
+            if self._metrics_textfile is not None:
+                self._metrics_textfile.stop()
+            if self._metrics_server is not None:
+                self._metrics_server.stop()
+            if self._log_writer is not None:
+                self._log_writer.stop()
 
 
 @click.command()
 @click.option('--log_level', help="The log level for trace")
-def command_line(log_level: str = 'INFO'):
+@click.option('--init_file_path', help="The file path to the EDSM dump file (json or json.gz) for init")
+@click.option('--write_buffer_size', type=int, default=DEFAULT_MAX_SIZE,
+              help="The number of pending rows before a bulk write (0 to write each row at once)")
+@click.option('--crawl_workers', type=int, default=DEFAULT_CRAWL_WORKERS,
+              help="The number of workers running the sphere searches of the crawl")
+@click.option('--frontier_max_size', type=int, default=DEFAULT_FRONTIER_MAX_SIZE,
+              help="The maximum number of pending sphere searches kept in memory")
+@click.option('--scan_mode', type=click.Choice([CRAWL_SCAN_MODE, PLAN_SCAN_MODE, SHARD_SCAN_MODE,
+                                                REFRESH_SCAN_MODE]),
+              default=CRAWL_SCAN_MODE,
+              help="Follow the systems found (crawl), cover a region with planned searches (plan), "
+                   "share the planned scan with other instances by sectors (shard) "
+                   "or refresh the stored systems by priority (refresh)")
+@click.option('--region_radius', type=int, default=DEFAULT_REGION_RADIUS,
+              help="The radius of the region around Sol covered in plan mode")
+@click.option('--resume', is_flag=True, default=False,
+              help="Resume the previous scan from its checkpoint instead of starting over")
+@click.option('--metrics_port', type=int, default=0,
+              help="The port serving the Prometheus metrics on /metrics (0 to disable)")
+@click.option('--metrics_host', default=DEFAULT_METRICS_HOST,
+              help="The interface serving the Prometheus metrics (0.0.0.0 to serve them on every one)")
+@click.option('--metrics_textfile',
+              help="The file the Prometheus metrics are written to, for a textfile collector")
+@click.option('--refresh_budget', type=int, default=DEFAULT_REFRESH_BUDGET,
+              help="The maximum number of EDSM calls per hour in refresh mode")
+@click.option('--hot_regions',
+              help="The regions kept fresher in refresh mode, as `x,y,z,radius;x,y,z,radius`")
+@click.option('--refresh_cycles', type=int, default=0,
+              help="The number of one hour refresh cycles to run (0 to run forever)")
+@click.option('--sector_size', type=int, default=DEFAULT_SECTOR_SIZE,
+              help="The size of the sectors leased by the instances in shard mode")
+@click.option('--reset_sectors', is_flag=True, default=False,
+              help="Scan again the sectors already scanned by a previous shard scan of the same region "
+                   "and sector size (on a single instance)")
+@click.option('--instance_id', help="The identifier of this instance in shard mode (host:pid by default)")
+@click.option('--api_key', envvar='EDSM_API_KEY', help="The EDSM api key of this instance")
+@click.option('--db_pool_min_size', type=int, default=DEFAULT_POOL_MIN_SIZE,
+              help="The number of database connections opened at start and kept open "
+                   "(0 for the maximum)")
+@click.option('--db_pool_max_size', type=int, default=0,
+              help="The maximum number of database connections (0 for one per worker + 2)")
+@click.option('--body_max_age', type=int, default=DEFAULT_BODY_MAX_AGE,
+              help="The hours after which the bodies of an unchanged system are fetched again "
+                   "(0 to fetch them every time)")
+@click.option('--system_workers', type=int, default=DEFAULT_SYSTEM_WORKERS,
+              help="The number of workers storing the systems found by the searches")
+@click.option('--body_workers', type=int, default=DEFAULT_BODY_WORKERS,
+              help="The number of workers fetching and storing the bodies of the systems found")
+@click.option('--stage_queue_size', type=int, default=DEFAULT_STAGE_QUEUE_SIZE,
+              help="The maximum number of systems waiting for the system or body workers")
+@click.option('--spatial_index', is_flag=True, default=False,
+              help="Index the positions of the stored systems in memory at start (needs numpy)")
+@click.option('--local_search_min', type=int, default=0,
+              help="The number of indexed systems in the sphere of a search from which it is "
+                   "answered by the spatial index instead of EDSM (0 to always call EDSM)")
+@click.option('--known_key_index', is_flag=True, default=False,
+              help="Index the keys of the stored systems and bodies in memory at start, "
+                   "to skip the database lookups of the new ones")
+@click.option('--export_path',
+              help="The directory of the columnar snapshot to append the entities synced since "
+                   "its last export to (instead of scanning)")
+@click.option('--log_async', is_flag=True, default=False,
+              help="Write the logs from a background thread, dropping them if it falls behind")
+@click.option('--log_sample', type=int, default=1,
+              help="Log one out of N per-system, per-search and per-body messages "
+                   "(warnings and errors are always logged)")
+def command_line(log_level: str = 'INFO', init_file_path: str = None,
+                 write_buffer_size: int = DEFAULT_MAX_SIZE,
+                 crawl_workers: int = DEFAULT_CRAWL_WORKERS,
+                 frontier_max_size: int = DEFAULT_FRONTIER_MAX_SIZE,
+                 scan_mode: str = CRAWL_SCAN_MODE,
+                 region_radius: int = DEFAULT_REGION_RADIUS,
+                 resume: bool = False,
+                 metrics_port: int = 0,
+                 metrics_textfile: str = None,
+                 refresh_budget: int = DEFAULT_REFRESH_BUDGET,
+                 hot_regions: str = None,
+                 refresh_cycles: int = 0,
+                 sector_size: int = DEFAULT_SECTOR_SIZE,
+                 instance_id: str = None,
+                 api_key: str = None,
+                 db_pool_min_size: int = DEFAULT_POOL_MIN_SIZE,
+                 db_pool_max_size: int = 0,
+                 body_max_age: int = DEFAULT_BODY_MAX_AGE,
+                 system_workers: int = DEFAULT_SYSTEM_WORKERS,
+                 body_workers: int = DEFAULT_BODY_WORKERS,
+                 stage_queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+                 spatial_index: bool = False,
+                 local_search_min: int = 0,
+                 known_key_index: bool = False,
+                 export_path: str = None,
+                 log_async: bool = False,
+                 log_sample: int = 1,
+                 metrics_host: str = DEFAULT_METRICS_HOST,
+                 reset_sectors: bool = False):
     """Start the EDSM reader application
 
     example:
-    edsm-reader -log_level [CRITICAL|ERROR|WARNING|INFO|DEBUG]
+    edsm-reader -log_level [CRITICAL|ERROR|WARNING|INFO|DEBUG] --init_file_path [path/to/file]
     """
     print(f'=== Starting {EDSMReader.__name__} ===')
-    edsm_reader = EDSMReader(log_level)
+    edsm_reader = EDSMReader(log_level, init_file_path, write_buffer_size,
+                             crawl_workers, frontier_max_size, scan_mode, region_radius, resume,
+                             metrics_port, metrics_textfile, refresh_budget, hot_regions,
+                             refresh_cycles, sector_size, instance_id, api_key,
+                             db_pool_min_size, db_pool_max_size, body_max_age, system_workers,
+                             body_workers, stage_queue_size, spatial_index, local_search_min,
+                             known_key_index, export_path, log_async, log_sample, metrics_host,
+                             reset_sectors)
     edsm_reader.run()
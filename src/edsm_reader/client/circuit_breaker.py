@@ -0,0 +1,92 @@
+import time
+from threading import Condition
+from typing import Callable
+
+import structlog
+
+from ..utils.metrics import REGISTRY
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60.0
+
+CLOSED_STATE = 'closed'
+OPEN_STATE = 'open'
+HALF_OPEN_STATE = 'half_open'
+
+CIRCUIT_OPEN = REGISTRY.gauge('edsm_circuit_open',
+                              'Whether the calls to EDSM are paused after consecutive failures')
+
+
+class CircuitBreaker:
+    """
+    Pause every call to EDSM while it is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens: the callers wait in
+    `wait_until_closed` for `reset_timeout` seconds, then a single probe call is let through
+    (half open). Its success closes the circuit and wakes everybody up, its failure opens it again.
+    """
+    _state: str
+    _failures: int
+    _opened_at: float
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param failure_threshold: the number of consecutive failures opening the circuit
+        :param reset_timeout: the seconds the circuit stays open before a probe call
+        :param clock: the source of time, in seconds
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CLOSED_STATE
+        self._failures = 0
+        self._opened_at = 0.0
+        self._condition = Condition()
+        self._log = structlog.get_logger()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def wait_until_closed(self) -> float:
+        """
+        Block while the circuit is open, or while the probe call is running
+        :return: the seconds waited
+        """
+        start = self._clock()
+        with self._condition:
+            while True:
+                if self._state == CLOSED_STATE:
+                    return self._clock() - start
+                if self._state == OPEN_STATE:
+                    remaining = self._opened_at + self._reset_timeout - self._clock()
+                    if remaining <= 0:
+                        # this caller is the probe
+                        self._state = HALF_OPEN_STATE
+                        return self._clock() - start
+                    self._condition.wait(remaining)
+                else:
+                    self._condition.wait(self._reset_timeout)
+
+    def record_success(self) -> None:
+        with self._condition:
+            if self._state != CLOSED_STATE:
+                self._log.info('[edsm]EDSM is healthy again, resuming the calls')
+                CIRCUIT_OPEN.set(0)
+            self._state = CLOSED_STATE
+            self._failures = 0
+            self._condition.notify_all()
+
+    def record_failure(self) -> None:
+        with self._condition:
+            self._failures += 1
+            if self._state == HALF_OPEN_STATE or self._failures >= self._failure_threshold:
+                if self._state != OPEN_STATE:
+                    self._log.warning(f'[edsm]{self._failures} consecutive failures, pausing the calls '
+                                      f'for {self._reset_timeout:.0f}s')
+                self._state = OPEN_STATE
+                self._opened_at = self._clock()
+                CIRCUIT_OPEN.set(1)
+            self._condition.notify_all()
@@ -1,12 +1,20 @@
 import os
-from typing import List
+import time
+from typing import Any, Iterator, List, Optional, Tuple
 
+import backoff
 import requests
 import structlog
-from ratelimit import limits, sleep_and_retry
 from requests import Response
+from requests.adapters import HTTPAdapter
 
-from astraeus_common.decorator.logit import logit
+from ..utils.json_codec import loads
+from ..utils.log import logit
+from ..utils.metrics import REGISTRY
+from ..utils.redaction import redact
+from .circuit_breaker import CircuitBreaker
+from .rate_limiter import RateLimiter
+from .response_cache import DEFAULT_MAX_SIZE_MB, ResponseCache
 
 SYSTEM_PREFIX = "api-v1/"
 BODY_PREFIX = "api-system-v1/"
@@ -18,19 +26,206 @@ BODY_ENTITY = "bodies"
 
 BODY_CALL_LIMIT = 10
 SEARCH_CALL_LIMIT = 6
+SYSTEM_CALL_LIMIT = 10
 ONE_MINUTE_CALL_PERIOD = 60
+MAX_THROTTLED_RETRIES = 5
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 4
+# the longest wait between two retries of a failed call, in seconds
+MAX_RETRY_DELAY = 60
+
+ONE_HOUR = 3600
+# time to live of cached responses per endpoint, in seconds
+CACHE_TTLS = {
+        SYSTEM_ENTITY       : 24 * ONE_HOUR,
+        CUBE_SEARCH_ENTITY  : 6 * ONE_HOUR,
+        SPHERE_SEARCH_ENTITY: 6 * ONE_HOUR,
+        BODY_ENTITY         : 24 * ONE_HOUR,
+}
+
+REQUEST_DURATION = REGISTRY.histogram('edsm_request_duration_seconds',
+                                      'Duration of the calls to EDSM api', ['api'])
+RESPONSES = REGISTRY.counter('edsm_responses_total',
+                             'Responses of EDSM api, by status code', ['api', 'status'])
+RATE_LIMIT_WAIT = REGISTRY.counter('edsm_rate_limit_wait_seconds_total',
+                                   'Time spent waiting for the rate limit of EDSM api', ['api'])
+CACHED_RESPONSES = REGISTRY.counter('edsm_cached_responses_total',
+                                    'Responses served from the response cache', ['api', 'result'])
+RETRIES = REGISTRY.counter('edsm_retries_total',
+                           'Calls to EDSM api retried after a transient failure', ['api'])
+
+
+class EdsmServerError(requests.HTTPError):
+    """
+    EDSM answered with a server error (5xx): the call is worth retrying
+    """
+
+
+class SearchTimeout(requests.ReadTimeout):
+    """
+    A search timed out: its area is too dense, it is split instead of retried
+    """
+
+
+def _is_search_timeout(error: Exception) -> bool:
+    return isinstance(error, SearchTimeout)
 
 
 class EdsmClient:
     _base_url: str
+    _session: requests.Session
+    _timeout: Tuple[float, float]
+    _rate_limiter: RateLimiter
+    _response_cache: Optional[ResponseCache]
+    _api_key: Optional[str]
+    _circuit_breaker: CircuitBreaker
 
-    def __init__(self):
+    def __init__(self, pool_size: int = None, rate_limiter: RateLimiter = None,
+                 response_cache: ResponseCache = None, api_key: str = None,
+                 circuit_breaker: CircuitBreaker = None, max_retries: int = None):
+        """
+        :param pool_size: the maximum number of keep-alive connections to EDSM,
+                          `EDSM_POOL_SIZE` environment variable by default
+        :param rate_limiter: the scheduler of the calls, shared by every endpoint
+        :param response_cache: the cache of responses, built from `EDSM_CACHE_PATH`
+                               environment variable by default (no cache if not set)
+        :param api_key: the EDSM api key of this instance, `EDSM_API_KEY` environment variable
+                        by default (anonymous calls if not set)
+        :param circuit_breaker: the breaker pausing the calls while EDSM is unhealthy
+        :param max_retries: the retries of a call failing on a connection error, a timeout or a
+                            server error, `EDSM_MAX_RETRIES` environment variable by default
+        """
         self._base_url = os.getenv("EDSM_BASE_URL", default="https://edsm.net/")
+        if pool_size is None:
+            pool_size = int(os.getenv("EDSM_POOL_SIZE", default=DEFAULT_POOL_SIZE))
+        self._timeout = (float(os.getenv("EDSM_CONNECT_TIMEOUT", default=DEFAULT_CONNECT_TIMEOUT)),
+                         float(os.getenv("EDSM_READ_TIMEOUT", default=DEFAULT_READ_TIMEOUT)))
+
+        # one shared session: connections (and TLS handshakes) are reused between calls
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        if rate_limiter is None:
+            rate_limiter = RateLimiter({
+                    SYSTEM_ENTITY       : (SYSTEM_CALL_LIMIT, ONE_MINUTE_CALL_PERIOD),
+                    CUBE_SEARCH_ENTITY  : (SEARCH_CALL_LIMIT, ONE_MINUTE_CALL_PERIOD),
+                    SPHERE_SEARCH_ENTITY: (SEARCH_CALL_LIMIT, ONE_MINUTE_CALL_PERIOD),
+                    BODY_ENTITY         : (BODY_CALL_LIMIT, ONE_MINUTE_CALL_PERIOD),
+            })
+        self._rate_limiter = rate_limiter
+
+        if response_cache is None and os.getenv("EDSM_CACHE_PATH") is not None:
+            response_cache = ResponseCache(
+                    os.getenv("EDSM_CACHE_PATH"), CACHE_TTLS,
+                    int(os.getenv("EDSM_CACHE_MAX_SIZE_MB", default=DEFAULT_MAX_SIZE_MB)))
+        self._response_cache = response_cache
+        self._api_key = api_key if api_key is not None else os.getenv("EDSM_API_KEY")
+
+        self._circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        if max_retries is None:
+            max_retries = int(os.getenv("EDSM_MAX_RETRIES", default=DEFAULT_MAX_RETRIES))
+        # exponential delays with full jitter, so the workers do not retry all at once
+        self._get_with_retries = backoff.on_exception(
+                backoff.expo, (requests.ConnectionError, requests.Timeout, EdsmServerError),
+                max_tries=max_retries + 1, max_value=MAX_RETRY_DELAY, jitter=backoff.full_jitter,
+                giveup=_is_search_timeout, on_backoff=self.__on_retry,
+                logger=None)(self.__get_rate_limited)
+
         self._log = structlog.get_logger()
 
     def __get_url(self, prefix: str, entity: str) -> str:
         return f'{self._base_url}{prefix}{entity}'
 
+    def __get(self, entity: str, url: str, params: dict) -> Response:
+        cached = None
+        headers = {}
+        if self._response_cache is not None:
+            cached = self._response_cache.get(entity, params)
+            if cached is not None:
+                if self._response_cache.is_fresh(entity, cached):
+                    CACHED_RESPONSES.inc(api=entity, result='hit')
+                    return cached.to_response()
+                headers = cached.conditional_headers()
+
+        response = self._get_with_retries(entity, url, params, headers)
+
+        if self._response_cache is not None:
+            if response.status_code == 304 and cached is not None:
+                self._response_cache.refresh(entity, params)
+                CACHED_RESPONSES.inc(api=entity, result='revalidated')
+                return cached.to_response()
+            if response.status_code == 200:
+                self._response_cache.put(entity, params, response)
+        return response
+
+    def __get_rate_limited(self, entity: str, url: str, params: dict, headers: dict) -> Response:
+        # the key is kept out of the cache keys: responses are the same whatever the key
+        if self._api_key:
+            params = {**params, 'apiKey': self._api_key}
+        for _ in range(MAX_THROTTLED_RETRIES):
+            self._circuit_breaker.wait_until_closed()
+            RATE_LIMIT_WAIT.inc(self._rate_limiter.acquire(entity), api=entity)
+            start = time.monotonic()
+            try:
+                response = self._session.get(url, params=params, headers=headers,
+                                             timeout=self._timeout)
+            except requests.ReadTimeout as error:
+                if entity in (SPHERE_SEARCH_ENTITY, CUBE_SEARCH_ENTITY):
+                    # EDSM is answering, the search is too large
+                    self._circuit_breaker.record_success()
+                    raise SearchTimeout(error, request=error.request) from error
+                self._circuit_breaker.record_failure()
+                raise
+            except requests.RequestException:
+                self._circuit_breaker.record_failure()
+                raise
+            REQUEST_DURATION.observe(time.monotonic() - start, api=entity)
+            RESPONSES.inc(api=entity, status=response.status_code)
+            if response.status_code >= 500:
+                self._circuit_breaker.record_failure()
+                raise EdsmServerError(f"EDSM failed on {entity} - Status: {response.status_code}",
+                                      response=response)
+            self._circuit_breaker.record_success()
+            if response.status_code != 429:
+                self._rate_limiter.update_from_headers(entity, response.headers)
+                return response
+            self._rate_limiter.on_throttled(entity, response.headers)
+        return response
+
+    def __on_retry(self, details: dict) -> None:
+        entity = details['args'][0]
+        RETRIES.inc(api=entity)
+        self._log.warning(f'[edsm]Call to {entity} failed ({redact(str(details["exception"]))}), '
+                          f'retry {details["tries"]} in {details["wait"]:.1f}s')
+
+    @staticmethod
+    def __parse(entity: str, response: Response) -> Any:
+        # decoded once per response, from its raw bytes
+        if response.status_code != 200:
+            raise requests.HTTPError(
+                    f"Unable to retrieve {entity} on EDSM - "
+                    f"Status: {response.status_code}, "
+                    f"Response: {response.text}")
+        return loads(response.content)
+
+    def cache_stats(self) -> Optional[dict]:
+        """
+        :return: the statistics of the response cache, None without cache
+        """
+        if self._response_cache is None:
+            return None
+        return self._response_cache.stats()
+
+    def close(self) -> None:
+        self._session.close()
+        if self._response_cache is not None:
+            self._response_cache.close()
+
     def __get_generic_param_by_entity(self, entity: str) -> dict:
         if entity == SYSTEM_ENTITY \
                 or entity == CUBE_SEARCH_ENTITY \
@@ -51,69 +246,47 @@ class EdsmClient:
         params = self.__get_generic_param_by_entity(SYSTEM_ENTITY)
         params.update({'systemId': system_id})
         url = self.__get_url(SYSTEM_PREFIX, SYSTEM_ENTITY)
-        response: Response = requests.get(url, params)
+        response: Response = self.__get(SYSTEM_ENTITY, url, params)
 
-        if response.status_code != 200:
-            raise requests.HTTPError(
-                    f"Unable to retrieve {SYSTEM_ENTITY} on EDSM - "
-                    f"Status: {response.status_code}, "
-                    f"Response: {response.text}")
-        else:
-            if response.json() is None or type(response.json()) is list:
-                return {}
-            return response.json()
+        system = self.__parse(SYSTEM_ENTITY, response)
+        if system is None or type(system) is list:
+            return {}
+        return system
 
     @logit
     def get_system_from_system_name(self, system_name: str) -> dict:
         params = self.__get_generic_param_by_entity(SYSTEM_ENTITY)
         params.update({'systemName': system_name})
         url = self.__get_url(SYSTEM_PREFIX, SYSTEM_ENTITY)
-        response: Response = requests.get(url, params)
+        response: Response = self.__get(SYSTEM_ENTITY, url, params)
 
-        if response.status_code != 200:
-            raise requests.HTTPError(
-                    f"Unable to retrieve {SYSTEM_ENTITY} on EDSM - "
-                    f"Status: {response.status_code}, "
-                    f"Response: {response.text}")
-        else:
-            return response.json()
+        return self.__parse(SYSTEM_ENTITY, response)
 
     @logit
-    @sleep_and_retry
-    @limits(calls=BODY_CALL_LIMIT, period=ONE_MINUTE_CALL_PERIOD)
     def get_bodies_from_system_id(self, system_id: int) -> List[dict]:
         params = self.__get_generic_param_by_entity(BODY_ENTITY)
         params.update({'systemId': system_id})
         url = self.__get_url(BODY_PREFIX, BODY_ENTITY)
-        response: Response = requests.get(url, params)
+        response: Response = self.__get(BODY_ENTITY, url, params)
 
-        if response.status_code != 200:
-            raise requests.HTTPError(
-                    f"Unable to retrieve {BODY_ENTITY} on EDSM - "
-                    f"Status: {response.status_code}, "
-                    f"Response: {response.text}")
-        else:
-            self.__log_remaining_rate(response)
-            if 'bodies' in response.json():
-                return response.json()['bodies']
-            else:
-                return []
+        bodies = self.__parse(BODY_ENTITY, response)
+        if isinstance(bodies, dict) and 'bodies' in bodies:
+            return bodies['bodies']
+        return []
 
     @logit
-    @sleep_and_retry
-    @limits(calls=SEARCH_CALL_LIMIT, period=ONE_MINUTE_CALL_PERIOD)
     def search_systems_from_coord(self,
                                   x_coord: int,
                                   y_coord: int,
                                   z_coord: int,
-                                  radius: int) -> List[dict]:
+                                  radius: int) -> Iterator[dict]:
         """
         Call a sphere systems search
         :param x_coord: x-axis coordinate
         :param y_coord: y-axis coordinate
         :param z_coord: z-axis coordinate
         :param radius: the radius of research
-        :return: list of system from the response of edsm
+        :return: iterator over the systems of the response of edsm, not copied
         """
         params = self.__get_generic_param_by_entity(SPHERE_SEARCH_ENTITY)
         params.update({
@@ -123,22 +296,10 @@ class EdsmClient:
                 'radius' : radius,
         })
         url = self.__get_url(SYSTEM_PREFIX, SPHERE_SEARCH_ENTITY)
-        response: Response = requests.get(url, params)
+        response: Response = self.__get(SPHERE_SEARCH_ENTITY, url, params)
 
-        if response.status_code != 200:
-            raise requests.HTTPError(
-                    f"Unable to retrieve {CUBE_SEARCH_ENTITY} on EDSM - "
-                    f"Status: {response.status_code}, "
-                    f"Response: {response.text}")
-        else:
-            self.__log_remaining_rate(response)
-            systems = []
-            for elem in response.json():
-                systems.append(elem)
-            self._log.info(f'search_systems_from_coord found {len(systems)} systems')
-            return systems
-
-    def __log_remaining_rate(self, response):
-        if 'x-rate-limit-remaining' in response.headers:
-            self._log.debug(
-                    f'remaining call to rate-limit: {response.headers["x-rate-limit-remaining"]}')
+        systems = self.__parse(SPHERE_SEARCH_ENTITY, response)
+        if not isinstance(systems, list):
+            return iter(())
+        self._log.info('search_systems_from_coord found %s systems', len(systems), sampled='search')
+        return iter(systems)
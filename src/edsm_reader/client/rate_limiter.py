@@ -0,0 +1,145 @@
+import time
+from threading import Lock
+from typing import Callable, Dict, Mapping, Tuple
+
+import structlog
+
+from ..utils.metrics import REGISTRY
+
+RATE_LIMIT_LIMIT_HEADER = 'x-rate-limit-limit'
+RATE_LIMIT_REMAINING_HEADER = 'x-rate-limit-remaining'
+RATE_LIMIT_RESET_HEADER = 'x-rate-limit-reset'
+RETRY_AFTER_HEADER = 'retry-after'
+
+DEFAULT_THROTTLE_DELAY = 60.0
+
+REMAINING_QUOTA = REGISTRY.gauge('edsm_rate_limit_remaining',
+                                 'Calls left in the current rate limit window of EDSM api', ['api'])
+THROTTLED = REGISTRY.counter('edsm_throttled_total', 'Throttled (429) responses of EDSM api',
+                             ['api'])
+
+
+class TokenBucket:
+    """
+    Token bucket of one EDSM api: `capacity` calls at most in a burst, refilled at `rate` calls
+    per second. Tokens may go negative: each caller reserves its own slot in the future.
+    """
+    capacity: float
+    tokens: float
+    rate: float
+    updated_at: float
+    blocked_until: float
+
+    def __init__(self, calls: int, period: float, now: float):
+        self.capacity = float(calls)
+        self.tokens = float(calls)
+        self.rate = calls / period
+        self.updated_at = now
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class RateLimiter:
+    """
+    Central scheduler of the calls to EDSM, one token bucket per api.
+
+    Buckets start from the given limits and follow the `x-rate-limit-*` headers of every
+    response, so the whole quota is used; a throttled (429) response blocks the api until
+    EDSM allows calls again.
+    """
+    _buckets: Dict[str, TokenBucket]
+
+    def __init__(self, limits: Mapping[str, Tuple[int, float]],
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        :param limits: initial limits per api, as (calls, period in seconds)
+        :param clock: the source of time, in seconds
+        :param sleep: the wait of a caller, in seconds
+        """
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = {api: TokenBucket(calls, period, clock())
+                         for api, (calls, period) in limits.items()}
+        self._lock = Lock()
+        self._log = structlog.get_logger()
+
+    def acquire(self, api: str) -> float:
+        """
+        Reserve a call on an api, sleeping until it is allowed
+        :param api: the api called
+        :return: the time slept, in seconds
+        """
+        with self._lock:
+            bucket = self._buckets[api]
+            now = self._clock()
+            bucket.refill(now)
+            bucket.tokens -= 1
+            wait = max(0.0, -bucket.tokens / bucket.rate, bucket.blocked_until - now)
+
+        if wait > 0:
+            self._log.debug('[rate limit]Waiting %.1fs before calling `%s`', wait, api)
+            self._sleep(wait)
+        return wait
+
+    def update_from_headers(self, api: str, headers: Mapping[str, str]) -> None:
+        """
+        Align the bucket of an api on the rate limit state sent back by EDSM
+        :param api: the api called
+        :param headers: the response headers
+        """
+        if RATE_LIMIT_REMAINING_HEADER not in headers:
+            return
+        try:
+            remaining = float(headers[RATE_LIMIT_REMAINING_HEADER])
+            limit = float(headers.get(RATE_LIMIT_LIMIT_HEADER, remaining))
+            reset = float(headers.get(RATE_LIMIT_RESET_HEADER, 0))
+        except ValueError:
+            return
+
+        with self._lock:
+            bucket = self._buckets[api]
+            now = self._clock()
+            bucket.refill(now)
+            if limit > 0:
+                bucket.capacity = limit
+            if reset > 0 and limit > remaining:
+                # the bucket is full again in `reset` seconds
+                bucket.rate = (limit - remaining) / reset
+            # slots already reserved by waiting callers stay reserved
+            reserved = min(bucket.tokens, 0.0)
+            bucket.tokens = min(bucket.capacity, remaining + reserved)
+        REMAINING_QUOTA.set(remaining, api=api)
+
+        self._log.debug('[rate limit]`%s`: remaining %.0f/%.0f, reset in %.0fs', api, remaining,
+                        limit, reset)
+
+    def on_throttled(self, api: str, headers: Mapping[str, str]) -> float:
+        """
+        Block an api after a throttled (429) response
+        :param api: the api called
+        :param headers: the response headers
+        :return: the delay before the api can be called again, in seconds
+        """
+        delay = DEFAULT_THROTTLE_DELAY
+        for header in (RETRY_AFTER_HEADER, RATE_LIMIT_RESET_HEADER):
+            if header in headers:
+                try:
+                    delay = max(1.0, float(headers[header]))
+                    break
+                except ValueError:
+                    continue
+
+        with self._lock:
+            bucket = self._buckets[api]
+            now = self._clock()
+            bucket.refill(now)
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+        THROTTLED.inc(api=api)
+
+        self._log.warning(f'[rate limit]`{api}` throttled by EDSM, blocked for {delay:.0f}s')
+        return delay
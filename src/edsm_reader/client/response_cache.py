@@ -0,0 +1,200 @@
+import json
+import math
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, Mapping, Optional
+
+import structlog
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_MAX_SIZE_MB = 1024
+EVICTION_TARGET_RATIO = 0.9
+
+CACHE_CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS response_cache
+    (
+        cache_key     TEXT PRIMARY KEY,
+        entity        TEXT    NOT NULL,
+        body          BLOB    NOT NULL,
+        etag          TEXT,
+        last_modified TEXT,
+        stored_at     REAL    NOT NULL,
+        accessed_at   REAL    NOT NULL,
+        size          INTEGER NOT NULL
+    )
+'''
+CACHE_CREATE_ACCESS_INDEX = '''
+    CREATE INDEX IF NOT EXISTS response_cache_accessed_at_idx ON response_cache (accessed_at)
+'''
+
+# the least recently used responses, read through the index on `accessed_at`
+CACHE_LEAST_RECENTLY_USED_SIZE = '''
+    SELECT COUNT(*), COALESCE(SUM(size), 0)
+      FROM (SELECT size FROM response_cache ORDER BY accessed_at, cache_key LIMIT ?)
+'''
+CACHE_EVICT_LEAST_RECENTLY_USED = '''
+    DELETE FROM response_cache
+     WHERE cache_key IN (SELECT cache_key FROM response_cache ORDER BY accessed_at, cache_key LIMIT ?)
+'''
+
+REVALIDATION_HEADERS = ('etag', 'last-modified')
+
+
+class CachedResponse:
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    def __init__(self, body: bytes, etag: Optional[str], last_modified: Optional[str],
+                 stored_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """
+        :return: the headers to revalidate this response with EDSM
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self) -> Response:
+        response = Response()
+        response.status_code = 200
+        response._content = self.body
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict()
+        if self.etag is not None:
+            response.headers['etag'] = self.etag
+        if self.last_modified is not None:
+            response.headers['last-modified'] = self.last_modified
+        return response
+
+
+class ResponseCache:
+    """
+    On-disk (sqlite) cache of EDSM responses, keyed by endpoint and parameters.
+
+    Responses are fresh for the ttl of their endpoint, then revalidated with
+    `If-None-Match` / `If-Modified-Since` when EDSM sent an `ETag` / `Last-Modified`.
+    Least recently used responses are evicted once the cache grows over `max_size_mb`.
+    """
+    _ttls: Mapping[str, float]
+    _max_size: int
+
+    def __init__(self, path: str, ttls: Mapping[str, float], max_size_mb: int = DEFAULT_MAX_SIZE_MB):
+        """
+        :param path: the path of the sqlite database file
+        :param ttls: time to live of the responses, in seconds, per endpoint
+        :param max_size_mb: the maximum size of the cached responses, in MB
+        """
+        self._ttls = ttls
+        self._max_size = max_size_mb * 1024 * 1024
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(CACHE_CREATE_TABLE)
+        self._connection.execute(CACHE_CREATE_ACCESS_INDEX)
+        self._count, self._size = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache').fetchone()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0}
+        self._log = structlog.get_logger()
+
+    @staticmethod
+    def cache_key(entity: str, params: dict) -> str:
+        return f'{entity}?{json.dumps(params, sort_keys=True, default=str)}'
+
+    def get(self, entity: str, params: dict) -> Optional[CachedResponse]:
+        """
+        Look for a cached response, fresh or not
+        :param entity: the endpoint called
+        :param params: the parameters of the call
+        :return: the cached response, or None if never cached
+        """
+        cache_key = self.cache_key(entity, params)
+        with self._lock:
+            row = self._connection.execute(
+                    'SELECT body, etag, last_modified, stored_at FROM response_cache '
+                    'WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._connection.execute('UPDATE response_cache SET accessed_at = ? WHERE cache_key = ?',
+                                     (time.time(), cache_key))
+        return CachedResponse(*row)
+
+    def is_fresh(self, entity: str, cached: CachedResponse) -> bool:
+        fresh = time.time() - cached.stored_at < self._ttls.get(entity, 0)
+        with self._lock:
+            self._stats['hits' if fresh else 'misses'] += 1
+        return fresh
+
+    def put(self, entity: str, params: dict, response: Response) -> None:
+        """
+        Store a successful response
+        :param entity: the endpoint called
+        :param params: the parameters of the call
+        :param response: the response of EDSM
+        """
+        if self._ttls.get(entity, 0) <= 0:
+            return
+        cache_key = self.cache_key(entity, params)
+        body = response.content
+        now = time.time()
+        with self._lock:
+            previous = self._connection.execute(
+                    'SELECT size FROM response_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+            self._connection.execute(
+                    'INSERT OR REPLACE INTO response_cache '
+                    '(cache_key, entity, body, etag, last_modified, stored_at, accessed_at, size) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (cache_key, entity, body, response.headers.get('etag'),
+                     response.headers.get('last-modified'), now, now, len(body)))
+            self._size += len(body) - (previous[0] if previous is not None else 0)
+            self._count += 1 if previous is None else 0
+            if self._size > self._max_size:
+                self.__evict()
+
+    def refresh(self, entity: str, params: dict) -> None:
+        """
+        Mark a cached response as fresh again, after EDSM answered `304 Not Modified`
+        :param entity: the endpoint called
+        :param params: the parameters of the call
+        """
+        with self._lock:
+            self._connection.execute('UPDATE response_cache SET stored_at = ? WHERE cache_key = ?',
+                                     (time.time(), self.cache_key(entity, params)))
+            self._stats['revalidated'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: hits, misses, revalidated and evicted counts, and the size of the cache in bytes
+        """
+        with self._lock:
+            return {**self._stats, 'size': self._size}
+
+    def close(self) -> None:
+        self._log.info(f'[cache]Response cache stats: {self.stats()}')
+        self._connection.close()
+
+    def __evict(self) -> None:
+        # to be called with `_lock` held: enough of the least recently used responses are deleted
+        # at once, estimated from their mean size, until the cache is under its target size
+        target = self._max_size * EVICTION_TARGET_RATIO
+        while self._size > target and self._count > 0:
+            limit = max(1, math.ceil((self._size - target) * self._count / self._size))
+            count, size = self._connection.execute(CACHE_LEAST_RECENTLY_USED_SIZE, (limit,)).fetchone()
+            if count == 0:
+                break
+            self._connection.execute(CACHE_EVICT_LEAST_RECENTLY_USED, (limit,))
+            self._count -= count
+            self._size -= size
+            self._stats['evicted'] += count
@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+
+from ..io.bulk_database import BulkDatabase
+from ..io.write_buffer import DEFAULT_MAX_DELAY
+from ..services.snapshot_service import SnapshotService
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is only needed by the export
+    np = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - the bodies are exported as json lines without pyarrow
+    pyarrow = None
+
+MANIFEST_FILE = 'manifest.json'
+SYSTEM_IDS_FILE = 'system_ids.i64'
+SYSTEM_COORDS_FILE = 'system_coords.f32'
+BODIES_DIRECTORY = 'bodies'
+MANIFEST_VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 100000
+# the sync dates are stamped before the rows reach the database (through the write buffer):
+# an export stops this many seconds before now, so the rows still pending are not skipped
+DEFAULT_EXPORT_LAG = max(600.0, 10 * DEFAULT_MAX_DELAY)
+# the first export reads everything
+_EPOCH = datetime(1970, 1, 1)
+
+
+def open_system_coordinates(directory: str) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Map the exported system arrays in memory, without reading them
+    :param directory: the directory of the snapshot
+    :return: the id64 (int64, N) and coordinates (float32, N x 3) of the systems; a system synced
+             again by a later export appears again, its last row is the current one
+    """
+    if np is None:
+        raise RuntimeError('The snapshot export needs numpy, install it with `pip install numpy`')
+    rows = _read_manifest(directory)['system_rows']
+    if rows == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.float32)
+    return (np.memmap(os.path.join(directory, SYSTEM_IDS_FILE), dtype=np.int64, mode='r',
+                      shape=(rows,)),
+            np.memmap(os.path.join(directory, SYSTEM_COORDS_FILE), dtype=np.float32, mode='r',
+                      shape=(rows, 3)))
+
+
+def _read_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'version': MANIFEST_VERSION, 'last_sync_date': None, 'system_rows': 0, 'exports': {}}
+    with open(path, 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+class SnapshotExporter:
+    """
+    Export the systems and bodies as columnar snapshots, for the downstream services.
+
+    Each export only appends the entities synced since the previous one (by `sync_date`):
+     - the id64 and coordinates of the systems, to raw int64 / float32 arrays meant to be
+       memory-mapped (`open_system_coordinates`)
+     - the bodies, to a new Parquet file (json lines, gzip'd, without pyarrow)
+    The manifest, keyed by the sync date each export reached, is written last: rows appended by
+    an interrupted export are dropped by the next one.
+    """
+    _snapshot_service: SnapshotService
+    _directory: str
+    _chunk_size: int
+    _lag: float
+
+    def __init__(self, db: BulkDatabase, directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 lag: float = DEFAULT_EXPORT_LAG):
+        """
+        :param directory: the directory of the snapshot, created if needed
+        :param chunk_size: the number of rows converted and written at once
+        :param lag: the seconds before now at which an export stops by default, longer than the
+                    flush delay of the write buffer plus the clock skew between the readers
+        """
+        if np is None:
+            raise RuntimeError('The snapshot export needs numpy, install it with `pip install numpy`')
+        self._snapshot_service = SnapshotService(db)
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._lag = lag
+        self._log = structlog.get_logger()
+
+    def export(self, until: Optional[datetime] = None) -> dict:
+        """
+        Append the systems and bodies synced since the last export
+        :param until: the sync date up to which the entities are exported (now minus the lag
+                      by default)
+        :return: the entry of this export in the manifest
+        """
+        start = time.monotonic()
+        os.makedirs(os.path.join(self._directory, BODIES_DIRECTORY), exist_ok=True)
+        manifest = _read_manifest(self._directory)
+        since = datetime.fromisoformat(manifest['last_sync_date']) if manifest['last_sync_date'] \
+            else _EPOCH
+        until = until or datetime.now() - timedelta(seconds=self._lag)
+        if until <= since:
+            # run again within the lag: the manifest must not go back in time
+            self._log.info(f'[export]Nothing to export, the last export reached {since.isoformat()}')
+            return {'since': since.isoformat(), 'systems': 0, 'first_row': manifest['system_rows'],
+                    'bodies': 0, 'body_file': None}
+
+        systems = self.__append_systems(manifest['system_rows'],
+                                        self._snapshot_service.stream_system_positions(since, until))
+        body_file, bodies = self.__write_bodies(until, self._snapshot_service.stream_bodies(since, until))
+
+        entry = {
+                'since'    : since.isoformat(),
+                'systems'  : systems,
+                'first_row': manifest['system_rows'],
+                'bodies'   : bodies,
+                'body_file': body_file,
+        }
+        manifest['exports'][until.isoformat()] = entry
+        manifest['system_rows'] += systems
+        manifest['last_sync_date'] = until.isoformat()
+        self.__write_manifest(manifest)
+
+        self._log.info(f'[export]{systems} systems and {bodies} bodies synced since {since.isoformat()} '
+                       f'exported in {time.monotonic() - start:.0f}s')
+        return entry
+
+    def __append_systems(self, known_rows: int,
+                         positions: Iterable[Tuple[int, float, float, float]]) -> int:
+        ids_path = os.path.join(self._directory, SYSTEM_IDS_FILE)
+        coords_path = os.path.join(self._directory, SYSTEM_COORDS_FILE)
+        appended = 0
+        with open(ids_path, 'ab') as ids_file, open(coords_path, 'ab') as coords_file:
+            # drop the rows of an interrupted export, not in the manifest
+            ids_file.truncate(known_rows * np.dtype(np.int64).itemsize)
+            coords_file.truncate(known_rows * 3 * np.dtype(np.float32).itemsize)
+            for chunk in self.__chunks(positions):
+                array = np.asarray(chunk, dtype=np.float64)
+                ids_file.write(np.asarray([position[0] for position in chunk], dtype=np.int64).tobytes())
+                coords_file.write(array[:, 1:4].astype(np.float32).tobytes())
+                appended += len(chunk)
+        return appended
+
+    def __write_bodies(self, until: datetime, bodies: Iterable[dict]) -> Tuple[Optional[str], int]:
+        extension = 'parquet' if pyarrow is not None else 'jsonl.gz'
+        name = os.path.join(BODIES_DIRECTORY, f'bodies-{until.strftime("%Y%m%dT%H%M%S")}.{extension}')
+        path = os.path.join(self._directory, name)
+        written = 0
+        writer = None
+        try:
+            for chunk in self.__chunks(bodies):
+                rows = [self.__flatten(body) for body in chunk]
+                if pyarrow is not None:
+                    table = pyarrow.Table.from_pylist(rows)
+                    if writer is None:
+                        writer = pyarrow.parquet.ParquetWriter(path, self.__file_schema(table.schema))
+                    writer.write_table(table.cast(writer.schema))
+                else:
+                    if writer is None:
+                        writer = gzip.open(path, 'wt', encoding='utf-8')
+                    writer.writelines(json.dumps(row) + '\n' for row in rows)
+                written += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        return (name if written > 0 else None), written
+
+    def __chunks(self, rows: Iterable) -> Iterator[List]:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self._chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    @staticmethod
+    def __file_schema(schema: 'pyarrow.Schema') -> 'pyarrow.Schema':
+        # a column empty in the first chunk has no type yet: kept as text for the whole file
+        return pyarrow.schema([field.with_type(pyarrow.string()) if pyarrow.types.is_null(field.type)
+                               else field for field in schema])
+
+    @staticmethod
+    def __flatten(body: dict) -> dict:
+        # nested values (keys, rings, materials...) are kept as json, for a flat table schema
+        return {column: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for column, value in body.items()}
+
+    def __write_manifest(self, manifest: dict) -> None:
+        path = os.path.join(self._directory, MANIFEST_FILE)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,197 @@
+import re
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+
+import psycopg2
+import structlog
+from psycopg2.extras import RealDictCursor, execute_batch
+from psycopg2.pool import ThreadedConnectionPool
+
+DEFAULT_PAGE_SIZE = 500
+# 0: as many as the maximum, the pool closes the connections handed back over its minimum
+DEFAULT_POOL_MIN_SIZE = 0
+DEFAULT_POOL_MAX_SIZE = 1
+DEFAULT_STREAM_BATCH_SIZE = 10000
+
+NAMED_PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+
+class PreparedStatement:
+    """
+    A query with named parameters (`%(name)s`), turned into a server-side prepared statement
+    """
+    name: str
+    prepare_sql: str
+    execute_sql: str
+    param_names: List[str]
+
+    def __init__(self, name: str, query: str):
+        self.name = name
+        self.param_names = []
+
+        def to_positional(match: re.Match) -> str:
+            if match.group(1) not in self.param_names:
+                self.param_names.append(match.group(1))
+            return f'${self.param_names.index(match.group(1)) + 1}'
+
+        body = NAMED_PLACEHOLDER.sub(to_positional, query).replace('%%', '%')
+        self.prepare_sql = f'PREPARE {name} AS {body}'
+        self.execute_sql = f'EXECUTE {name}'
+        if len(self.param_names) > 0:
+            self.execute_sql += f' ({", ".join(["%s"] * len(self.param_names))})'
+
+    def args(self, params: dict) -> List:
+        return [params[name] for name in self.param_names]
+
+
+class BulkDatabase:
+    """
+    Database access shared by the crawl workers and dedicated to mass writes.
+
+    It exposes the same `exec_db_read` / `exec_db_write` contract as the common `Database`,
+    so services can run on top of it, plus `exec_db_batch` which sends many statements
+    in a few round-trips and commit them in a single transaction.
+
+    Connections come from a pool of `min_size` to `max_size` connections: each call checks one
+    out (waiting for a free one if needed), so workers run their queries side by side. The pool
+    keeps `min_size` idle connections at most, the ones handed back over it are closed.
+    The `prepared_statements` are prepared once per connection, then executed by name.
+    """
+    _pool: ThreadedConnectionPool
+    _page_size: int
+    _prepared: Dict[str, PreparedStatement]
+    _prepared_on: 'WeakKeyDictionary[psycopg2.extensions.connection, Set[str]]'
+
+    def __init__(self, host: str, port: str, user: str, name: str, password: str,
+                 page_size: int = DEFAULT_PAGE_SIZE,
+                 min_size: int = DEFAULT_POOL_MIN_SIZE,
+                 max_size: int = DEFAULT_POOL_MAX_SIZE,
+                 prepared_statements: Iterable[str] = ()):
+        """
+        :param page_size: the number of rows sent per round-trip by `exec_db_batch`
+        :param min_size: the number of connections opened at start and kept open (0 for `max_size`)
+        :param max_size: the maximum number of connections opened at once
+        :param prepared_statements: the queries to run as server-side prepared statements
+        """
+        max_size = max(min_size, max_size)
+        min_size = min_size or max_size
+        self._pool = ThreadedConnectionPool(min_size, max_size, host=host, port=port, user=user,
+                                            dbname=name, password=password)
+        # the pool raises when exhausted: callers wait for a free connection instead
+        self._slots = BoundedSemaphore(max_size)
+        self._page_size = page_size
+        self._prepared = {query: PreparedStatement(f'edsm_reader_{index}', query)
+                          for index, query in enumerate(dict.fromkeys(prepared_statements))}
+        # by connection object: the id of a closed connection may be reused by a new one
+        self._prepared_on = WeakKeyDictionary()
+        self._prepared_lock = Lock()
+        self._log = structlog.get_logger()
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg2.extensions.connection]:
+        """
+        Check a connection out of the pool, within a transaction committed on exit
+        (rolled back on error)
+        """
+        with self._slots:
+            connection = self._pool.getconn()
+            try:
+                self.__prepare_statements(connection)
+                with connection:
+                    yield connection
+            finally:
+                self._pool.putconn(connection, close=bool(connection.closed))
+                if connection.closed:
+                    # closed by the pool when it already holds `min_size` idle connections
+                    self.__forget(connection)
+
+    def exec_db_read(self, query: str, params: dict) -> List[dict]:
+        """
+        Execute a read query
+        :param query: the sql query
+        :param params: the named parameters of the query
+        :return: the rows found, as dictionaries
+        """
+        with self.connection() as connection:
+            with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                prepared = self.__prepared_for(connection, query)
+                if prepared is not None:
+                    cursor.execute(prepared.execute_sql, prepared.args(params))
+                else:
+                    cursor.execute(query, params)
+                return cursor.fetchall()
+
+    def stream_db_read(self, query: str, params: dict,
+                       batch_size: int = DEFAULT_STREAM_BATCH_SIZE) -> Iterator[tuple]:
+        """
+        Execute a read query through a server-side cursor, for results too large to be fetched
+        at once. The connection is held until the rows are all read (or the iterator closed).
+        :param query: the sql query
+        :param params: the named parameters of the query
+        :param batch_size: the number of rows fetched per round-trip
+        :return: iterator over the rows, as tuples
+        """
+        with self.connection() as connection:
+            with connection.cursor(name=f'edsm_reader_stream_{id(connection)}') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                yield from cursor
+
+    def exec_db_write(self, query: str, params: dict) -> None:
+        """
+        Execute a single write query within its own transaction
+        :param query: the sql query
+        :param params: the named parameters of the query
+        """
+        self.exec_db_batch([(query, [params])])
+
+    def exec_db_batch(self, statements: List[Tuple[str, List[dict]]]) -> None:
+        """
+        Execute a list of statements, each one with many parameter sets, in one transaction.
+        Either every row is committed, or none of them.
+        :param statements: list of (query, list of named parameters)
+        """
+        with self.connection() as connection:
+            with connection.cursor() as cursor:
+                for query, params_list in statements:
+                    if len(params_list) == 0:
+                        continue
+                    prepared = self.__prepared_for(connection, query)
+                    if prepared is not None:
+                        execute_batch(cursor, prepared.execute_sql,
+                                      [prepared.args(params) for params in params_list],
+                                      page_size=self._page_size)
+                    else:
+                        execute_batch(cursor, query, params_list, page_size=self._page_size)
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+    def __prepared_for(self, connection, query: str) -> Optional[PreparedStatement]:
+        prepared = self._prepared.get(query)
+        if prepared is None or prepared.name not in self._prepared_on.get(connection, ()):
+            return None
+        return prepared
+
+    def __prepare_statements(self, connection) -> None:
+        with self._prepared_lock:
+            if connection in self._prepared_on:
+                return
+            self._prepared_on[connection] = set()
+        prepared_names = set()
+        for prepared in self._prepared.values():
+            try:
+                with connection, connection.cursor() as cursor:
+                    cursor.execute(prepared.prepare_sql)
+                prepared_names.add(prepared.name)
+            except psycopg2.Error as error:
+                # left unprepared: the query is sent as is on this connection
+                self._log.warning(f'[database]Unable to prepare `{prepared.name}`: {error}')
+        with self._prepared_lock:
+            self._prepared_on[connection] = prepared_names
+
+    def __forget(self, connection) -> None:
+        with self._prepared_lock:
+            self._prepared_on.pop(connection, None)
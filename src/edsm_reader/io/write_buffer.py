@@ -0,0 +1,229 @@
+import itertools
+import time
+from contextlib import contextmanager
+from threading import Event, Lock, Thread, local
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import psycopg2
+import structlog
+
+from .bulk_database import BulkDatabase
+
+DEFAULT_MAX_SIZE = 500
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+# the database is unavailable: the rows are kept as they are, without counting a failed attempt
+UNAVAILABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer, grouping pending writes per statement.
+
+    Pending rows are flushed with `BulkDatabase.exec_db_batch`, so every statement of a flush
+    is committed in the same transaction, once `max_size` rows are pending or after `max_delay`
+    seconds. Writes made inside an `unit_of_work` are kept aside by the thread until its end,
+    so they are never split between two flushes: an entity and its sync state are always
+    committed together.
+
+    When a flush fails on its rows (constraint, bad value...), they are written again one at a
+    time, so a bad row does not hold the others back: the rows still failing are kept for the
+    next flushes, and dropped after `max_attempts` failed writes. When the database is
+    unavailable, every row is kept for the next flush.
+    """
+    _io_db: BulkDatabase
+    _max_size: int
+    _max_delay: float
+    _max_attempts: int
+    _pending: Dict[str, Dict[str, dict]]
+    _attempts: Dict[Tuple[str, str], int]
+    _flush_sources: List[Callable[[], List[Tuple[str, dict]]]]
+
+    def __init__(self, db: BulkDatabase,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self._io_db = db
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+        self._pending = {}
+        self._attempts = {}
+        self._size = 0
+        self._flush_sources = []
+        self._sequence = itertools.count(1)
+        self._last_flush = time.monotonic()
+        # `_lock` guards the pending rows, `_flush_lock` keeps the flushes in order
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._units = local()
+        self._log = structlog.get_logger()
+
+        self._stopped = Event()
+        self._flusher = Thread(target=self.__flush_periodically, name='write-buffer-flusher',
+                               daemon=True)
+        self._flusher.start()
+
+    def add(self, query: str, params: dict) -> None:
+        """
+        Buffer a write. A write on a key already pending for the same query replaces it.
+        :param query: the sql query
+        :param params: the named parameters of the query
+        """
+        row_id = self.__row_id(params)
+        unit = self.__current_unit()
+        if unit is not None:
+            unit.setdefault(query, {})[row_id] = params
+            return
+
+        with self._lock:
+            self.__merge({query: {row_id: params}})
+        self.__flush_if_needed()
+
+    def on_flush(self, source: Callable[[], List[Tuple[str, dict]]]) -> None:
+        """
+        Register writes kept aside by a service, to be written by every flush.
+        The source is called with the pending rows locked, so the rows handed to the buffer
+        before it are committed in the same flush as the writes it returns (or a later one):
+        it must not call the buffer.
+        :param source: returns the (query, params) to write with the flush
+        """
+        self._flush_sources.append(source)
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[None]:
+        """
+        Group writes which must be committed together: they are kept aside by the calling
+        thread and only handed to the buffer at the end of the outermost unit of work (an error
+        in the unit drops them). The other threads go on reading and writing meanwhile.
+        """
+        depth = getattr(self._units, 'depth', 0)
+        if depth == 0:
+            self._units.pending = {}
+        self._units.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._units.depth = depth
+        if depth == 0:
+            pending, self._units.pending = self._units.pending, None
+            with self._lock:
+                self.__merge(pending)
+            self.__flush_if_needed()
+
+    def flush(self) -> None:
+        """
+        Write every pending row, in one transaction.
+        If the write fails, the rows are written one at a time, and the ones still failing are
+        pending again for the next flush. Raises when the database is unavailable.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._last_flush = time.monotonic()
+                for source in self._flush_sources:
+                    for query, params in source():
+                        self.__merge({query: {self.__row_id(params): params}})
+                if self._size == 0:
+                    return
+                # inserts first, a buffered update may target a row inserted in the same flush
+                statements = sorted(self._pending.items(),
+                                    key=lambda item: not item[0].lstrip().upper().startswith('INSERT'))
+                size = self._size
+                self._pending = {}
+                self._size = 0
+            try:
+                self._io_db.exec_db_batch([(query, list(rows.values()))
+                                           for query, rows in statements])
+            except UNAVAILABLE_ERRORS:
+                self.__restore([], statements)
+                self._log.error(f'[write buffer]Flush of {size} rows failed, transaction rolled back, '
+                                f'rows kept for the next flush')
+                raise
+            except Exception as error:
+                self._log.warning(f'[write buffer]Flush of {size} rows failed, transaction rolled back, '
+                                  f'rows written one at a time: {error}')
+                self.__write_one_at_a_time(statements)
+                return
+            self._log.debug(f'[write buffer]{size} rows flushed')
+
+    def close(self) -> None:
+        """
+        Stop the periodic flush and write the remaining rows
+        """
+        self._stopped.set()
+        self._flusher.join()
+        self.flush()
+
+    def __write_one_at_a_time(self, statements: List[Tuple[str, Dict[str, dict]]]) -> None:
+        failed = []
+        left = [(query, dict(rows)) for query, rows in statements]
+        try:
+            for query, rows in left:
+                for row_id, params in list(rows.items()):
+                    try:
+                        self._io_db.exec_db_batch([(query, [params])])
+                    except UNAVAILABLE_ERRORS:
+                        raise
+                    except Exception as error:
+                        self._log.warning(f'[write buffer]Row `{row_id}` failed: {error}')
+                        failed.append((query, {row_id: params}))
+                    del rows[row_id]
+        finally:
+            self.__restore(failed, [(query, rows) for query, rows in left if len(rows) > 0])
+
+    def __row_id(self, params: dict) -> str:
+        return str(params['key']) if 'key' in params else f'#{next(self._sequence)}'
+
+    def __current_unit(self):
+        if getattr(self._units, 'depth', 0) > 0:
+            return self._units.pending
+        return None
+
+    def __merge(self, pending: Dict[str, Dict[str, dict]], failed: bool = False) -> None:
+        # to be called with `_lock` held: a row replaces the one pending on the same key,
+        # and its failed attempts
+        for query, rows in pending.items():
+            statement = self._pending.setdefault(query, {})
+            for row_id, params in rows.items():
+                if row_id not in statement:
+                    self._size += 1
+                statement[row_id] = params
+                if not failed:
+                    self._attempts.pop((query, row_id), None)
+
+    def __restore(self, failed: List[Tuple[str, Dict[str, dict]]],
+                  unwritten: List[Tuple[str, Dict[str, dict]]]) -> None:
+        # the rows failed (one more attempt) or not written go back ahead of the ones added since,
+        # which replace them on the same key
+        with self._lock:
+            kept = {}
+            for query, rows in failed:
+                for row_id, params in rows.items():
+                    attempts = self._attempts.get((query, row_id), 0) + 1
+                    if attempts < self._max_attempts:
+                        self._attempts[(query, row_id)] = attempts
+                        kept.setdefault(query, {})[row_id] = params
+                    else:
+                        self._attempts.pop((query, row_id), None)
+                        self._log.error(f'[write buffer]Row `{row_id}` dropped after {attempts} failed '
+                                        f'writes: {" ".join(query.split())[:80]}')
+            for query, rows in unwritten:
+                kept.setdefault(query, {}).update(rows)
+            pending = self._pending
+            self._pending = {}
+            self._size = 0
+            self.__merge(kept, failed=True)
+            self.__merge(pending)
+
+    def __flush_if_needed(self) -> None:
+        if self._size >= self._max_size \
+                or time.monotonic() - self._last_flush >= self._max_delay:
+            self.flush()
+
+    def __flush_periodically(self) -> None:
+        while not self._stopped.wait(self._max_delay):
+            try:
+                self.__flush_if_needed()
+            except Exception as error:
+                self._log.error(f'[write buffer]Periodic flush failed: {error}')
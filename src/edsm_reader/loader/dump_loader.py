@@ -0,0 +1,205 @@
+import gzip
+import json
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from typing import IO, Iterator, List, Optional, Tuple
+
+import structlog
+from astraeus_common.models.body import Body, body_from_edsm
+from astraeus_common.models.sync_state import SyncState
+from astraeus_common.models.system import System, system_from_edsm
+
+from ..io.bulk_database import BulkDatabase
+from ..services.body_service import BodyService
+from ..services.change_history_service import CHANGE_HISTORY_INSERT, ChangeHistoryService
+from ..services.refresh_stat_service import REFRESH_STAT_UPSERT, RefreshStatService
+from ..services.sync_state_service import SyncStateService
+from ..services.system_service import SystemService
+from ..utils.entity_key import key_of, key_to_str
+from ..utils.fingerprint import DELTA_IGNORED_FIELDS, compute_delta, fingerprint_of, matches_previous_of
+from ..utils.known_key_index import KnownKeyIndex
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_CHUNK_SIZE = 250
+
+SYSTEM_TYPE = 'system'
+BODY_TYPE = 'body'
+
+
+def _parse_dump_line(line: str) -> Optional[Tuple[str, dict, str]]:
+    """
+    Parse one line of an EDSM dump, run inside the process pool
+    :param line: a raw line of the dump (one json record per line, inside a json array)
+    :return: (data type, record, hash of record) or None if the line holds no record
+    """
+    line = line.strip().rstrip(',')
+    if line == '' or line == '[' or line == ']':
+        return None
+    record = json.loads(line)
+    data_type = BODY_TYPE if 'systemId' in record else SYSTEM_TYPE
+    return data_type, record, fingerprint_of(record)
+
+
+class DumpLoader:
+    """
+    Load an EDSM nightly dump (`systemsWithCoordinates.json`, `bodies.json`, gzip'd or not)
+    straight into the database, without any call to EDSM api.
+
+    The file is streamed by batch of lines, so memory stays bounded whatever the dump size.
+    Parsing and hashing is done by a process pool, while the previous batch is written.
+    The previous values of the entities updated are recorded in the change history, in the
+    transaction of their batch.
+    """
+    _io_db: BulkDatabase
+    _state_service: SyncStateService
+    _system_service: SystemService
+    _body_service: BodyService
+    _change_history_service: ChangeHistoryService
+    _batch_size: int
+    _workers: Optional[int]
+    _known_keys: Optional[KnownKeyIndex]
+
+    def __init__(self, db: BulkDatabase,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 workers: Optional[int] = None,
+                 known_keys: Optional[KnownKeyIndex] = None):
+        self._io_db = db
+        self._known_keys = known_keys
+        self._state_service = SyncStateService(db, known_keys=known_keys)
+        self._system_service = SystemService(db)
+        self._body_service = BodyService(db)
+        self._change_history_service = ChangeHistoryService(db)
+        self._batch_size = batch_size
+        self._workers = workers
+        self._log = structlog.get_logger()
+        self._stats = {'created': 0, 'updated': 0, 'unchanged': 0}
+
+    def load(self, file_path: str) -> None:
+        """
+        Load the whole dump file
+        :param file_path: path to the dump file, gzip'd if it ends with `.gz`
+        """
+        self._log.info(f'[dump]Loading file `{file_path}`')
+        start = time.monotonic()
+        with self.__open(file_path) as dump_file, Pool(processes=self._workers) as pool:
+            pending = None
+            for lines in self.__read_batches(dump_file):
+                parsing = pool.map_async(_parse_dump_line, lines, DEFAULT_CHUNK_SIZE)
+                if pending is not None:
+                    self.__write_batch(pending.get())
+                pending = parsing
+            if pending is not None:
+                self.__write_batch(pending.get())
+
+        self._log.info(f'[dump]File `{file_path}` loaded in {time.monotonic() - start:.0f}s - '
+                       f'created: {self._stats["created"]}, '
+                       f'updated: {self._stats["updated"]}, '
+                       f'unchanged: {self._stats["unchanged"]}')
+
+    @staticmethod
+    def __open(file_path: str) -> IO[str]:
+        if file_path.endswith('.gz'):
+            return gzip.open(file_path, 'rt', encoding='utf-8')
+        return open(file_path, 'r', encoding='utf-8')
+
+    def __read_batches(self, dump_file: IO[str]) -> Iterator[List[str]]:
+        lines = []
+        for line in dump_file:
+            lines.append(line)
+            if len(lines) >= self._batch_size:
+                yield lines
+                lines = []
+        if len(lines) > 0:
+            yield lines
+
+    def __write_batch(self, parsed: List[Optional[Tuple[str, dict, str]]]) -> None:
+        records = [elem for elem in parsed if elem is not None]
+        if len(records) == 0:
+            return
+
+        states = self._state_service.read_sync_states_by_keys(
+                [key_of(record) for _, record, _ in records])
+        known_hashes = {key_to_str(state.key): state.sync_hash for state in states}
+
+        now = datetime.now()
+        entity_inserts = {SYSTEM_TYPE: [], BODY_TYPE: []}
+        entity_updates = {SYSTEM_TYPE: [], BODY_TYPE: []}
+        state_inserts = []
+        state_updates = []
+        # refresh statistics of the systems, with their position to match the hot regions
+        positions = []
+        created_keys = []
+        updated = []
+        for data_type, record, record_hash in records:
+            key = key_of(record)
+            known_hash = known_hashes.get(key_to_str(key))
+            if known_hash == record_hash:
+                self._stats['unchanged'] += 1
+                continue
+
+            sync_state = SyncState(key=key, data_type=data_type, sync_hash=record_hash)
+            sync_state.sync_date = now
+            if known_hash is not None and matches_previous_of(record, known_hash):
+                # unchanged, hashed by the previous algorithm: only the hash is replaced
+                state_updates.append(sync_state.to_dict_for_db())
+                self._stats['unchanged'] += 1
+                continue
+
+            entity = self.__build_entity(data_type, record, now)
+            if data_type == SYSTEM_TYPE:
+                positions.append(RefreshStatService.stat_params(key, 0, record.get('coords'), now))
+            if known_hash is None:
+                entity_inserts[data_type].append(entity.to_dict_for_db())
+                state_inserts.append(sync_state.to_dict_for_db())
+                created_keys.append(key)
+                self._stats['created'] += 1
+            else:
+                entity_updates[data_type].append(entity.to_dict_for_db())
+                state_updates.append(sync_state.to_dict_for_db())
+                updated.append((key, data_type, entity))
+                self._stats['updated'] += 1
+
+        self._io_db.exec_db_batch([
+                (System.SYSTEM_INSERT, entity_inserts[SYSTEM_TYPE]),
+                (System.SYSTEM_UPDATE_BY_KEY, entity_updates[SYSTEM_TYPE]),
+                (Body.BODY_INSERT, entity_inserts[BODY_TYPE]),
+                (Body.BODY_UPDATE_BY_KEY, entity_updates[BODY_TYPE]),
+                (SyncState.SYNC_STATE_INSERT, state_inserts),
+                (SyncState.SYNC_STATE_UPDATE_BY_KEY, state_updates),
+                (REFRESH_STAT_UPSERT, positions),
+                (CHANGE_HISTORY_INSERT, self.__history_params(updated)),
+        ])
+        if self._known_keys is not None:
+            for key in created_keys:
+                self._known_keys.add(key)
+        self._log.debug(f'[dump]Batch of {len(records)} records written')
+
+    def __history_params(self, updated: List[Tuple[dict, str, object]]) -> List[dict]:
+        # the entities are read before their update, for the previous values of the changed fields
+        stored = self._system_service.read_systems_by_keys(
+                [key for key, data_type, _ in updated if data_type == SYSTEM_TYPE])
+        stored += self._body_service.read_bodies_by_keys(
+                [key for key, data_type, _ in updated if data_type == BODY_TYPE])
+        stored_entities = {key_to_str(entity.key): entity for entity in stored}
+
+        changes = []
+        for key, data_type, entity in updated:
+            stored_entity = stored_entities.get(key_to_str(key))
+            if stored_entity is None:
+                continue
+            previous_state = compute_delta(stored_entity.to_dict_for_db(), entity.to_dict_for_db(),
+                                           DELTA_IGNORED_FIELDS)
+            if previous_state:
+                changes.append((key, data_type, previous_state))
+        return self._change_history_service.batch_params(changes)
+
+    @staticmethod
+    def __build_entity(data_type: str, record: dict, update_time: datetime):
+        if data_type == BODY_TYPE:
+            entity = body_from_edsm(record)
+            entity.system_key = {'id': record['systemId'], 'id64': record['systemId64']}
+        else:
+            entity = system_from_edsm(record)
+        entity.update_time = update_time
+        return entity
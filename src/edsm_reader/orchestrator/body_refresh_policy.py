@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+DEFAULT_BODY_MAX_AGE = 168
+
+NEVER_SYNCED_REASON = 'never_synced'
+SYSTEM_CHANGED_REASON = 'system_changed'
+BODY_COUNT_CHANGED_REASON = 'body_count_changed'
+STALE_REASON = 'stale'
+ALWAYS_REASON = 'always'
+
+
+class BodyRefreshPolicy:
+    """
+    Decide whether the bodies of a system are worth a call to the bodies api, the most
+    rate-limited one: they are not when the system is unchanged, reports as many bodies
+    as at the last fetch, and this fetch is recent enough.
+    """
+    _max_age: Optional[timedelta]
+
+    def __init__(self, max_age_hours: int = DEFAULT_BODY_MAX_AGE):
+        """
+        :param max_age_hours: the age of the last fetch after which the bodies are fetched
+                              again anyway, 0 to fetch them every time
+        """
+        self._max_age = timedelta(hours=max_age_hours) if max_age_hours > 0 else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_age is not None
+
+    def reason_to_fetch(self, system_changed: bool, reported_body_count: Optional[int],
+                        last_sync: Optional[dict], now: Optional[datetime] = None) -> Optional[str]:
+        """
+        :param system_changed: whether the system is new or differs from its stored sync state
+        :param reported_body_count: the `bodyCount` reported by EDSM with the system, if any
+        :param last_sync: the last fetch of the bodies, as `body_count` and `synced_date`
+        :param now: the current date
+        :return: the reason to fetch the bodies, None to skip them
+        """
+        if not self.enabled:
+            return ALWAYS_REASON
+        if system_changed:
+            return SYSTEM_CHANGED_REASON
+        if last_sync is None:
+            return NEVER_SYNCED_REASON
+        if reported_body_count is not None and reported_body_count != last_sync['body_count']:
+            return BODY_COUNT_CHANGED_REASON
+        if (now or datetime.now()) - last_sync['synced_date'] > self._max_age:
+            return STALE_REASON
+        return None
@@ -0,0 +1,182 @@
+from threading import Event, Lock
+from typing import List, Optional, Tuple
+
+import structlog
+
+from ..services.crawl_checkpoint_service import (DONE_STATUS, IN_FLIGHT_STATUS, PENDING_STATUS,
+                                                 SPILLED_STATUS, CrawlCheckpointService)
+from ..utils.metrics import REGISTRY
+from ..utils.sphere_coverage import SphereCoverage
+from ..utils.thread_safe_set import ThreadSafeSet
+from .crawl_frontier import CrawlFrontier, SearchItem
+from .scan_planner import ScanPlanner
+from .sector import SectorBox
+
+FRONTIER_SIZE = REGISTRY.gauge('edsm_reader_frontier_size', 'Searches waiting in the crawl frontier')
+SEARCHES = REGISTRY.counter('edsm_reader_searches_total', 'Searches run by the crawl, by outcome',
+                            ['status'])
+
+
+class CrawlContext:
+    """
+    State of one crawl shared by its workers: the frontier of searches to run, the spheres
+    already searched, the ones scheduled (queued or in flight) and the systems already registered.
+
+    Every move of a search (pending, in flight, done) is recorded in the crawl checkpoint,
+    so an interrupted crawl can be resumed where it stopped. The searches pushed while the
+    frontier is full are spilled to the checkpoint, and queued again once it is drained.
+    """
+    crawl_id: str
+    frontier: CrawlFrontier
+    coverage: SphereCoverage
+    scheduled: SphereCoverage
+    registered: ThreadSafeSet
+    planner: Optional[ScanPlanner]
+    bounds: Optional[SectorBox]
+    failures: int
+    spilled: int
+    _checkpoint_service: CrawlCheckpointService
+
+    def __init__(self, crawl_id: str,
+                 frontier: CrawlFrontier,
+                 coverage: SphereCoverage,
+                 checkpoint_service: CrawlCheckpointService,
+                 planner: Optional[ScanPlanner] = None,
+                 bounds: Optional[SectorBox] = None):
+        self.crawl_id = crawl_id
+        self.frontier = frontier
+        self.coverage = coverage
+        self.scheduled = SphereCoverage(coverage.cell_size)
+        self.registered = ThreadSafeSet()
+        self.planner = planner
+        self.bounds = bounds
+        self.failures = 0
+        self.spilled = 0
+        self._spill_backlog = 0
+        self._spill_lock = Lock()
+        self._cancelled = Event()
+        self._checkpoint_service = checkpoint_service
+        self._log = structlog.get_logger()
+        frontier.refill_with(self.__unspill)
+
+    def restore(self) -> int:
+        """
+        Reload the checkpoint of the crawl: the searches done are marked as covered, the ones
+        not done yet (pending, in flight, failed or spilled) are queued again.
+        :return: the number of searches queued again
+        """
+        queued = 0
+        for row in self._checkpoint_service.read_checkpoint(self.crawl_id):
+            item = ((row['x'], row['y'], row['z']), row['radius'])
+            if row['status'] == DONE_STATUS:
+                self.coverage.add(*item)
+            else:
+                self.push(item)
+                queued += 1
+        self._log.info(f'[checkpoint]Crawl `{self.crawl_id}` restored - '
+                       f'{len(self.coverage)} searches done, {queued} queued again')
+        return queued
+
+    def reset(self) -> None:
+        """
+        Forget the previous run of the crawl: its checkpoint, and what a `restore` of it loaded
+        """
+        self._checkpoint_service.delete_checkpoint(self.crawl_id)
+        self.coverage.clear()
+        self.scheduled.clear()
+        self.registered.clear()
+        with self._spill_lock:
+            self._spill_backlog = 0
+
+    def push(self, item: SearchItem) -> None:
+        self.scheduled.add(*item)
+        if self.frontier.push(item):
+            FRONTIER_SIZE.set(len(self.frontier))
+            self.__save(item, PENDING_STATUS)
+            return
+        with self._spill_lock:
+            self.spilled += 1
+            self._spill_backlog += 1
+        self.__save(item, SPILLED_STATUS)
+
+    def pop(self) -> Optional[SearchItem]:
+        if self._cancelled.is_set():
+            return None
+        item = self.frontier.pop()
+        FRONTIER_SIZE.set(len(self.frontier))
+        if item is not None and self._cancelled.is_set():
+            # left pending in the checkpoint, for the instance taking the crawl over
+            self.frontier.task_done()
+            return None
+        if item is not None:
+            self.__save(item, IN_FLIGHT_STATUS)
+        return item
+
+    def done(self, item: SearchItem) -> None:
+        self.scheduled.discard(*item)
+        self.__save(item, DONE_STATUS)
+        SEARCHES.inc(status=DONE_STATUS)
+        self.frontier.task_done()
+
+    def failed(self, item: SearchItem) -> None:
+        # kept as pending: it will be run again on resume, meanwhile its sphere may be searched again
+        self.scheduled.discard(*item)
+        self.__save(item, PENDING_STATUS)
+        SEARCHES.inc(status='failed')
+        self.failures += 1
+        self.frontier.task_done()
+
+    def cancel(self) -> None:
+        """
+        Stop the crawl: workers get no more searches, the ones in flight are still acknowledged
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def is_searched(self, point: Tuple[float, float, float]) -> bool:
+        """
+        :return: whether a point is inside a sphere already searched, or scheduled to be
+        """
+        return self.coverage.contains(point) or self.scheduled.contains(point)
+
+    def accepts(self, system: dict) -> bool:
+        """
+        :return: whether a system found by a search belongs to the crawl (inside its sector if any)
+        """
+        if self.bounds is None:
+            return True
+        if 'coords' not in system:
+            return False
+        coords = system['coords']
+        return self.bounds.contains((coords['x'], coords['y'], coords['z']))
+
+    def __unspill(self, room: int) -> List[SearchItem]:
+        # called by the frontier once drained, out of its lock: the searches taken back are queued
+        # again as pending
+        with self._spill_lock:
+            if self._spill_backlog == 0:
+                return []
+        try:
+            rows = self._checkpoint_service.read_searches_by_status(self.crawl_id, SPILLED_STATUS, room)
+        except Exception as error:
+            self._log.error(f'[checkpoint]Unable to read the searches spilled: {error}')
+            return []
+        with self._spill_lock:
+            # a search spilled twice is a single row
+            self._spill_backlog = 0 if len(rows) < room else max(0, self._spill_backlog - len(rows))
+        items = [((row['x'], row['y'], row['z']), row['radius']) for row in rows]
+        for item in items:
+            self.__save(item, PENDING_STATUS)
+        if len(items) > 0:
+            self._log.info(f'[checkpoint]{len(items)} searches spilled queued again')
+        return items
+
+    def __save(self, item: SearchItem, status: str) -> None:
+        (x, y, z), radius = item
+        try:
+            self._checkpoint_service.save_search_status(self.crawl_id, x, y, z, radius, status)
+        except Exception as error:
+            self._log.error(f'[checkpoint]Unable to save search {item} as `{status}`: {error}')
@@ -0,0 +1,147 @@
+import heapq
+from threading import Condition
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import structlog
+
+DEFAULT_FRONTIER_MAX_SIZE = 100_000
+
+Coord = Tuple[float, float, float]
+SearchItem = Tuple[Coord, int]
+
+
+class CrawlFrontier:
+    """
+    Nearest-first queue of the sphere searches still to run, shared by the crawl workers.
+
+    Searches are served by increasing distance from the crawl origin, and the queue never
+    holds more than `max_size` pending searches: once full, new searches are refused and counted,
+    their caller keeps them elsewhere (the crawl context spills them to its checkpoint).
+    An optional `source` of planned searches is drawn lazily, once the queue is empty, then the
+    searches refused are taken back from the `refill` set with `refill_with`, by one worker at
+    a time and out of the queue lock (it reads them from the database).
+    The crawl is over when the queue, the source and the refill are empty, and no worker is
+    processing a search anymore.
+    """
+    _origin: Coord
+    _max_size: int
+    _heap: List[Tuple[float, int, SearchItem]]
+    _source: Optional[Iterator[SearchItem]]
+    _refill: Optional[Callable[[int], List[SearchItem]]]
+
+    def __init__(self, origin: Coord, max_size: int = DEFAULT_FRONTIER_MAX_SIZE,
+                 source: Iterator[SearchItem] = None):
+        self._origin = origin
+        self._max_size = max_size
+        self._source = source
+        self._refill = None
+        self._refilling = False
+        self._heap = []
+        self._sequence = 0
+        self._in_flight = 0
+        self._refused = 0
+        self._condition = Condition()
+        self._log = structlog.get_logger()
+
+    def push(self, item: SearchItem) -> bool:
+        """
+        Add a search to run
+        :param item: the center and the radius of the search
+        :return: False if the search has been refused because the frontier is full
+        """
+        with self._condition:
+            if len(self._heap) >= self._max_size:
+                self._refused += 1
+                if self._refused % 1000 == 1:
+                    self._log.warning(f'[frontier]Frontier full ({self._max_size}), '
+                                      f'{self._refused} searches refused so far')
+                return False
+            self.__enqueue(item)
+            self._condition.notify()
+            return True
+
+    def refill_with(self, refill: Callable[[int], List[SearchItem]]) -> None:
+        """
+        Take back the searches refused while the frontier was full, once it is empty
+        :param refill: called with the room of the frontier, returns up to that many searches
+        """
+        self._refill = refill
+
+    def pop(self) -> Optional[SearchItem]:
+        """
+        Take the nearest search to run, waiting for one if others are still being processed.
+        Every search returned must be acknowledged with `task_done`.
+        :return: the center and the radius of the search, or None when the crawl is over
+        """
+        with self._condition:
+            while len(self._heap) == 0:
+                planned = self.__next_planned()
+                if planned is not None:
+                    self._in_flight += 1
+                    return planned
+                if self._refilling:
+                    self._condition.wait()
+                    continue
+                if self.__next_refill():
+                    continue
+                if self._in_flight == 0:
+                    return None
+                self._condition.wait()
+            self._in_flight += 1
+            return heapq.heappop(self._heap)[2]
+
+    def task_done(self) -> None:
+        """
+        Acknowledge a search returned by `pop` as processed
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if self._in_flight == 0 and len(self._heap) == 0:
+                self._condition.notify_all()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def refused(self) -> int:
+        return self._refused
+
+    def __next_planned(self) -> Optional[SearchItem]:
+        if self._source is None:
+            return None
+        planned = next(self._source, None)
+        if planned is None:
+            self._source = None
+        return planned
+
+    def __next_refill(self) -> bool:
+        # called with the lock held, released during the refill: the other workers go on pushing
+        # and acknowledging their searches, and wait for the refill instead of running it too
+        if self._refill is None:
+            return False
+        self._refilling = True
+        room = self._max_size - len(self._heap)
+        self._condition.release()
+        try:
+            refilled = self._refill(room)
+        finally:
+            self._condition.acquire()
+            self._refilling = False
+        for item in refilled:
+            self.__enqueue(item)
+        self._condition.notify_all()
+        return len(refilled) > 0
+
+    def __enqueue(self, item: SearchItem) -> None:
+        self._sequence += 1
+        heapq.heappush(self._heap, (self.__distance(item[0]), self._sequence, item))
+
+    def __distance(self, coord: Coord) -> float:
+        return (coord[0] - self._origin[0]) ** 2 \
+            + (coord[1] - self._origin[1]) ** 2 \
+            + (coord[2] - self._origin[2]) ** 2
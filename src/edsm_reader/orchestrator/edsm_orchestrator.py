@@ -1,48 +1,361 @@
-import hashlib
-import json
-from threading import Thread, current_thread
-from typing import List, Optional
+import math
+import time
+from contextlib import nullcontext
+from threading import Thread
+from typing import ContextManager, Iterable, List, Optional, Sequence, Tuple
 
 import structlog
-from astraeus_common.decorator.logit import logit
 from astraeus_common.io.database import Database
-from astraeus_common.models.body import body_from_edsm
+from astraeus_common.models.body import Body, body_from_edsm
 from astraeus_common.models.sync_state import SyncState
 from astraeus_common.models.system import system_from_edsm
-from astraeus_common.utils.thread_safe_list import ThreadSafeList
 
-from ..client.edsm_client import EdsmClient
+from ..client.edsm_client import EdsmClient, SearchTimeout
+from ..io.write_buffer import WriteBuffer
 from ..services.body_service import BodyService
+from ..services.body_sync_service import BodySyncService
+from ..services.change_history_service import ChangeHistoryService
+from ..services.crawl_checkpoint_service import CrawlCheckpointService
+from ..services.dead_letter_service import (BODIES_KIND, DEFAULT_REPLAY_LIMIT, SEARCH_KIND,
+                                            SYSTEM_KIND, DeadLetterService)
+from ..services.refresh_stat_service import HotRegion, RefreshStatService
+from ..services.sector_lease_service import SectorLeaseService
 from ..services.sync_state_service import SyncStateService
 from ..services.system_service import SystemService
 from ..utils.coordinate import Coordinate
+from ..utils.entity_key import key_of, key_to_str
+from ..utils.fingerprint import DELTA_IGNORED_FIELDS, Fingerprinter, compute_delta
+from ..utils.known_key_index import KnownKeyIndex
+from ..utils.log import logit
+from ..utils.metrics import REGISTRY
+from ..utils.redaction import redact
+from ..utils.spatial_index import SpatialIndex
+from ..utils.sphere_coverage import SphereCoverage
+from ..utils.thread_safe_set import ThreadSafeSet
+from .body_refresh_policy import DEFAULT_BODY_MAX_AGE, BodyRefreshPolicy
+from .crawl_context import CrawlContext
+from .crawl_frontier import DEFAULT_FRONTIER_MAX_SIZE, CrawlFrontier, SearchItem
+from .pipeline import DEFAULT_STAGE_QUEUE_SIZE, PipelineStage, SearchTicket
+from .refresh_scheduler import DEFAULT_REFRESH_BUDGET, RefreshScheduler
+from .scan_planner import DEFAULT_REGION_RADIUS, ScanPlanner
+from .sector import (DEFAULT_LEASE_DURATION, DEFAULT_SECTOR_SIZE, LeaseHeartbeat, SectorBox,
+                     sectors_of_region)
+
+SEARCH_RADIUS = 100
+DEFAULT_CRAWL_WORKERS = 4
+DEFAULT_SYSTEM_WORKERS = 2
+# the bodies api allows 10 calls per minute: more workers would only wait on its rate limit
+DEFAULT_BODY_WORKERS = 2
+# delay before looking again for a sector, while the last ones are scanned by other instances
+LEASE_POLL_DELAY = 30
+# fields of a system found by a sphere search which depend on the search, not on the system
+SEARCH_ONLY_FIELDS = ('distance',)
+
+SYSTEMS_PROCESSED = REGISTRY.counter('edsm_reader_systems_processed_total',
+                                     'Systems fetched from EDSM and refreshed')
+BODIES_PROCESSED = REGISTRY.counter('edsm_reader_bodies_processed_total',
+                                    'Bodies fetched from EDSM and refreshed')
+BODY_REFRESHES = REGISTRY.counter('edsm_reader_body_refreshes_total',
+                                  'Bodies calls made by reason, or skipped (`skipped`) '
+                                  'by the body refresh policy', ['reason'])
+LOCAL_SEARCHES = REGISTRY.counter('edsm_reader_local_searches_total',
+                                  'Searches answered by the spatial index instead of EDSM')
+UNSPLIT_SEARCHES = REGISTRY.counter('edsm_reader_unsplit_searches_total',
+                                    'Dense searches which cannot be split anymore (minimum radius), '
+                                    'by reason (`truncated` or `timeout`)', ['reason'])
+ACTIVE_WORKERS = REGISTRY.gauge('edsm_reader_active_workers',
+                                'Crawl workers currently running a search')
 
 
 class EDSMOrchestrator:
     _state_service: SyncStateService
     _body_service: BodyService
     _system_service: SystemService
+    _checkpoint_service: CrawlCheckpointService
+    _refresh_stat_service: RefreshStatService
+    _body_sync_service: BodySyncService
+    _change_history_service: ChangeHistoryService
+    _dead_letter_service: DeadLetterService
+    _body_refresh_policy: BodyRefreshPolicy
+    _fingerprinter: Fingerprinter
     _edsm_client: EdsmClient
+    _write_buffer: Optional[WriteBuffer]
+    _crawl_workers: int
+    _system_workers: int
+    _body_workers: int
+    _stage_queue_size: int
+    _frontier_max_size: int
+    _spatial_index: Optional[SpatialIndex]
+    _local_search_min_systems: int
+
+    def __init__(self, db: Database,
+                 write_buffer: Optional[WriteBuffer] = None,
+                 crawl_workers: int = DEFAULT_CRAWL_WORKERS,
+                 frontier_max_size: int = DEFAULT_FRONTIER_MAX_SIZE,
+                 api_key: Optional[str] = None,
+                 body_max_age: int = DEFAULT_BODY_MAX_AGE,
+                 system_workers: int = DEFAULT_SYSTEM_WORKERS,
+                 body_workers: int = DEFAULT_BODY_WORKERS,
+                 stage_queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+                 spatial_index: Optional[SpatialIndex] = None,
+                 local_search_min_systems: int = 0,
+                 known_keys: Optional[KnownKeyIndex] = None):
+        """
+        :param spatial_index: the index of the stored systems, kept up to date by the scans
+        :param local_search_min_systems: the number of stored systems in the sphere of a search
+                                         from which it is answered by the spatial index instead
+                                         of EDSM (0 to always call EDSM)
+        :param known_keys: the index of the stored keys, to skip the lookups of the new ones
+        """
+        self._write_buffer = write_buffer
+        self._crawl_workers = crawl_workers
+        self._system_workers = system_workers
+        self._body_workers = body_workers
+        self._stage_queue_size = stage_queue_size
+        self._frontier_max_size = frontier_max_size
+        self._spatial_index = spatial_index
+        self._local_search_min_systems = local_search_min_systems
+        self._state_service = SyncStateService(db, write_buffer, known_keys)
+        self._body_service = BodyService(db, write_buffer)
+        self._system_service = SystemService(db, write_buffer, spatial_index)
+        self._checkpoint_service = CrawlCheckpointService(db, write_buffer)
+        self._refresh_stat_service = RefreshStatService(db, write_buffer)
+        self._body_sync_service = BodySyncService(db, write_buffer)
+        self._change_history_service = ChangeHistoryService(db, write_buffer)
+        self._dead_letter_service = DeadLetterService(db)
+        self._body_refresh_policy = BodyRefreshPolicy(body_max_age)
+
+        self._edsm_client = EdsmClient(pool_size=crawl_workers + body_workers, api_key=api_key)
+        self._fingerprinter = Fingerprinter.from_env()
 
-    def __init__(self, db: Database):
-        self._state_service = SyncStateService(db)
-        self._body_service = BodyService(db)
-        self._system_service = SystemService(db)
+        self._log = structlog.get_logger()
 
-        self._edsm_client = EdsmClient()
+    @logit
+    def full_scan_from_coord(self, x_coord: int, y_coord: int, z_coord: int,
+                             resume: bool = False):
+        """
+        Crawl the systems by sphere searches, from a start coordinate
+        :param x_coord: x-axis coordinate of the start
+        :param y_coord: y-axis coordinate of the start
+        :param z_coord: z-axis coordinate of the start
+        :param resume: resume the previous run of this crawl from its checkpoint
+        """
+        self.replay_dead_letters()
+        start = (x_coord, y_coord, z_coord)
+        context = CrawlContext(f'crawl:{x_coord}:{y_coord}:{z_coord}',
+                               CrawlFrontier(start, self._frontier_max_size),
+                               SphereCoverage(SEARCH_RADIUS),
+                               self._checkpoint_service)
+        if not resume or context.restore() == 0:
+            context.reset()
+            context.push((start, SEARCH_RADIUS))
+
+        self.__run_workers(self.__crawl_worker, context)
+
+        self._log.info(f'[crawl]Crawl from x:`{x_coord}`, y:`{y_coord}`, z:`{z_coord}` done - '
+                       f'{len(context.coverage)} searches, '
+                       f'{context.spilled} spilled to the checkpoint (frontier full)')
 
-        self._log = structlog.get_logger()
+    @logit
+    def planned_scan_from_coord(self, x_coord: int, y_coord: int, z_coord: int,
+                                region_radius: float = DEFAULT_REGION_RADIUS,
+                                resume: bool = False):
+        """
+        Scan a spherical region with searches laid on a covering lattice
+        :param x_coord: x-axis coordinate of the region center
+        :param y_coord: y-axis coordinate of the region center
+        :param z_coord: z-axis coordinate of the region center
+        :param region_radius: the radius of the region
+        :param resume: resume the previous run of this scan from its checkpoint
+        """
+        self.replay_dead_letters()
+        center = (x_coord, y_coord, z_coord)
+        planner = ScanPlanner(center, region_radius, SEARCH_RADIUS)
+        coverage = SphereCoverage(SEARCH_RADIUS)
+        context = CrawlContext(f'plan:{x_coord}:{y_coord}:{z_coord}:{region_radius}',
+                               CrawlFrontier(center, self._frontier_max_size,
+                                             planner.plan(coverage)),
+                               coverage,
+                               self._checkpoint_service,
+                               planner)
+        if resume:
+            context.restore()
+        else:
+            context.reset()
+
+        self.__run_workers(self.__planned_worker, context)
+
+        self._log.info(f'[plan]Scan of region x:`{x_coord}`, y:`{y_coord}`, z:`{z_coord}`, '
+                       f'radius:`{region_radius}` done - {len(coverage)} searches')
+
+    @logit
+    def sharded_scan_from_coord(self, x_coord: int, y_coord: int, z_coord: int,
+                                lease_service: SectorLeaseService,
+                                owner: str,
+                                region_radius: float = DEFAULT_REGION_RADIUS,
+                                sector_size: float = DEFAULT_SECTOR_SIZE,
+                                lease_duration: int = DEFAULT_LEASE_DURATION,
+                                reset: bool = False):
+        """
+        Scan a spherical region split in sectors, shared with the other instances running the
+        same scan: each instance leases one sector at a time and only registers the systems
+        inside it, so a system is never processed by two instances.
+        :param x_coord: x-axis coordinate of the region center
+        :param y_coord: y-axis coordinate of the region center
+        :param z_coord: z-axis coordinate of the region center
+        :param lease_service: the service managing the leases of the sectors
+        :param owner: the identifier of this instance
+        :param region_radius: the radius of the region
+        :param sector_size: the size of the sectors
+        :param lease_duration: the duration of a lease without renewal, in seconds
+        :param reset: scan again the sectors already scanned by a previous run of this scan
+        """
+        self.replay_dead_letters()
+        center = (x_coord, y_coord, z_coord)
+        scan_id = f'shard:{x_coord}:{y_coord}:{z_coord}:{region_radius}:{sector_size}'
+        lease_service.create_sectors(scan_id, sectors_of_region(center, region_radius, sector_size))
+        if reset:
+            reset_count = lease_service.reset_sectors(scan_id)
+            self._log.info(f'[shard]{reset_count} sectors already scanned are to be scanned again')
+
+        scanned = 0
+        while True:
+            lease = lease_service.claim_sector(scan_id, owner, lease_duration)
+            if lease is None:
+                if lease_service.count_unfinished(scan_id) == 0:
+                    break
+                # the last sectors are leased by other instances, they come back if one fails
+                time.sleep(LEASE_POLL_DELAY)
+                continue
+            sector = SectorBox((lease['x'], lease['y'], lease['z']), lease['size'])
+            if self.__scan_sector(lease_service, scan_id, owner, lease['sector_id'], sector,
+                                  lease_duration):
+                scanned += 1
+
+        self._log.info(f'[shard]Sharded scan of region x:`{x_coord}`, y:`{y_coord}`, z:`{z_coord}`, '
+                       f'radius:`{region_radius}` done - {scanned} sectors scanned by `{owner}`')
+
+    def __scan_sector(self, lease_service: SectorLeaseService, scan_id: str, owner: str,
+                      sector_id: str, sector: SectorBox, lease_duration: int) -> bool:
+        planner = ScanPlanner(sector.center, sector.radius, SEARCH_RADIUS, bounds=sector)
+        coverage = SphereCoverage(SEARCH_RADIUS)
+        context = CrawlContext(f'sector:{scan_id}:{sector_id}',
+                               CrawlFrontier(sector.center, self._frontier_max_size,
+                                             planner.plan(coverage)),
+                               coverage,
+                               self._checkpoint_service,
+                               planner,
+                               sector)
+        # a sector handed back (or taken over) resumes where its previous owner stopped
+        context.restore()
+        self._log.info(f'[shard]Scanning sector `{sector_id}`')
+
+        heartbeat = LeaseHeartbeat(lease_service, scan_id, sector_id, owner, lease_duration,
+                                   context.cancel)
+        heartbeat.start()
+        try:
+            self.__run_workers(self.__planned_worker, context)
+        except Exception:
+            lease_service.release_sector(scan_id, sector_id, owner)
+            raise
+        finally:
+            heartbeat.stop()
+
+        if context.cancelled:
+            return False
+        if context.failures > 0:
+            self._log.warning(f'[shard]{context.failures} searches failed in sector `{sector_id}`, '
+                              f'handed back')
+            lease_service.release_sector(scan_id, sector_id, owner)
+            return False
+        if not lease_service.complete_sector(scan_id, sector_id, owner):
+            return False
+        # a finished sector needs no checkpoint anymore: once reset, it is scanned from scratch
+        context.reset()
+        return True
 
     @logit
-    def full_scan_from_coord(self, x_coord: int, y_coord: int, z_coord: int):
-        scans_done = ThreadSafeList()
-        system_already_registered = ThreadSafeList()
-        self.__recursive_system_scan_from_coord(system_already_registered,
-                                                scans_done,
-                                                x_coord,
-                                                y_coord,
-                                                z_coord,
-                                                100)
+    def scheduled_refresh(self, budget_per_hour: int = DEFAULT_REFRESH_BUDGET,
+                          hot_regions: Sequence[HotRegion] = (),
+                          cycles: Optional[int] = None):
+        """
+        Refresh the stored systems by priority (stalest, most changing, in hot regions first)
+        within a fixed EDSM api budget per hour
+        :param budget_per_hour: the maximum number of EDSM calls per hour
+        :param hot_regions: the regions to keep fresher, as (x, y, z, radius)
+        :param cycles: the number of one hour cycles to run, forever if None
+        """
+        self.replay_dead_letters()
+        RefreshScheduler(self.refresh_a_full_system, self._refresh_stat_service,
+                         budget_per_hour, hot_regions).run(cycles)
+
+    def __run_workers(self, worker_target, context: CrawlContext):
+        """
+        Run a crawl as a pipeline: the searches, the system upserts and the body fetches each
+        have their own workers, linked by bounded queues, so the searches go on while the
+        bodies wait on their rate limit (until the queues are full)
+        """
+        body_stage = PipelineStage('bodies', self.__body_stage, self._body_workers,
+                                   self._stage_queue_size)
+        system_stage = PipelineStage('systems',
+                                     lambda item: self.__system_stage(body_stage, item),
+                                     self._system_workers, self._stage_queue_size)
+        body_stage.start()
+        system_stage.start()
+
+        workers = [Thread(target=worker_target, args=(context, system_stage),
+                          name=f'crawl-worker-{index}')
+                   for index in range(self._crawl_workers)]
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            system_stage.stop()
+            body_stage.stop()
+
+    @logit
+    def replay_dead_letters(self, limit: int = DEFAULT_REPLAY_LIMIT) -> int:
+        """
+        Run again the refreshes of systems and bodies, and the searches, failed on EDSM whose
+        retry is due
+        :param limit: the maximum number of refreshes run again
+        :return: the number of refreshes which succeeded this time
+        """
+        dead_letters = self._dead_letter_service.read_due(limit)
+        replayed = []
+        for dead_letter in dead_letters:
+            kind, key, payload = dead_letter['kind'], dead_letter['key'], dead_letter['payload']
+            try:
+                if kind == BODIES_KIND:
+                    self.__refresh_bodies_entities(key, payload.get('name'), payload.get('bodyCount'))
+                elif kind == SEARCH_KIND:
+                    self.__replay_search(key)
+                else:
+                    self.refresh_a_full_system({**key, 'name': payload.get('name')})
+                replayed.append((kind, key))
+            except Exception as error:
+                self._log.error(f'[dead letter]Retry of the {kind} of {key} failed: {redact(str(error))}')
+                self.__dead_letter(kind, key, payload, error)
+        # the refreshes go through the write buffer, the dead letters are deleted straight away:
+        # a dead letter is only deleted once its refresh is written
+        if self._write_buffer is not None and len(replayed) > 0:
+            self._write_buffer.flush()
+        for kind, key in replayed:
+            self._dead_letter_service.delete(kind, key)
+        if len(dead_letters) > 0:
+            self._log.info(f'[dead letter]{len(replayed)}/{len(dead_letters)} failed refreshes replayed')
+
+        exhausted = self._dead_letter_service.count_exhausted()
+        if sum(exhausted.values()) > 0:
+            self._log.warning(f'[dead letter]Failed refreshes not retried anymore (attempts used up), '
+                              f'left in the edsm_dead_letter table: {exhausted}')
+        return len(replayed)
+
+    def close(self) -> None:
+        self._edsm_client.close()
+        self._change_history_service.flush()
 
     @logit
     def refresh_system_list(self, data: List[dict]) -> None:
@@ -51,126 +364,341 @@ class EDSMOrchestrator:
 
     @logit
     def refresh_a_full_system(self, data: dict, init: bool = False) -> None:
-        key = {'id': data['id'], 'id64': data['id64']}
-        self._log.info(f'Processing system {key}')
+        key = key_of(data)
+        self._log.info('Processing system %s', key, sampled='system')
         if init and self._state_service.read_sync_state_by_key(key) is not None:
             return
-        self.__refresh_system_entity(key)
-        self.__refresh_bodies_entities(key)
-
-    def __recursive_system_scan_from_coord(self,
-                                           system_already_registered: ThreadSafeList,
-                                           scans_done: ThreadSafeList,
-                                           x_coord: int,
-                                           y_coord: int,
-                                           z_coord: int,
-                                           radius: int):
-
-        scans_done.append((x_coord, y_coord, z_coord))
-        systems = self._edsm_client.search_systems_from_coord(x_coord, y_coord, z_coord, radius)
-        self._log.debug(f'{current_thread()}')
-        self._log.info(f'Processing system search on x:`{x_coord}`, y:`{y_coord}`, z:`{z_coord}`')
-
-        threads = []
+        edsm_system, system_changed = self.__refresh_system_entity(key)
+        if self.__bodies_refresh_reason(key, data.get('name'), edsm_system, system_changed) is not None:
+            self.__refresh_bodies_entities(key, data.get('name'), edsm_system.get('bodyCount'))
+
+    def __crawl_worker(self, context: CrawlContext, system_stage: PipelineStage):
+        while True:
+            item = context.pop()
+            if item is None:
+                return
+            ticket = self.__search_ticket(context, item)
+            try:
+                ACTIVE_WORKERS.inc()
+                coord, radius = item
+                self.__system_scan_from_coord(context, system_stage, ticket, *coord, radius)
+                # only a search that succeeded covers its sphere
+                context.coverage.add(coord, radius)
+                ticket.release()
+            except Exception as error:
+                self._log.error(f'[crawl]System search on {item} failed: {redact(str(error))}')
+                self.__dead_letter(SEARCH_KIND, self.__search_key(item), {}, error)
+                ticket.release(succeeded=False)
+            finally:
+                ACTIVE_WORKERS.dec()
+
+    def __planned_worker(self, context: CrawlContext, system_stage: PipelineStage):
+        while True:
+            item = context.pop()
+            if item is None:
+                return
+            coord, radius = item
+            ticket = self.__search_ticket(context, item)
+            ACTIVE_WORKERS.inc()
+            try:
+                systems, local = self.__search_systems(*coord, radius)
+                self._log.info('[plan]Processing system search on %s, radius:`%s`', coord, radius,
+                               sampled='search')
+                systems_found = 0
+                for system in systems:
+                    systems_found += 1
+                    if not local and context.accepts(system):
+                        self.__hand_over_system(system, system_stage, ticket, context.registered)
+                # the systems missing from a truncated answer are searched again by finer
+                # searches; past the minimum radius, the truncated answer is the best EDSM gives
+                if not (context.planner.is_truncated(systems_found)
+                        and self.__split_search(context, coord, radius, 'truncated')):
+                    context.coverage.add(coord, radius)
+                ticket.release()
+            except SearchTimeout as error:
+                # EDSM answers, the area is too dense: the connection and read failures left
+                # once the retries are used up are not split, they are failures
+                if self.__split_search(context, coord, radius, 'timeout'):
+                    ticket.release()
+                else:
+                    self.__dead_letter(SEARCH_KIND, self.__search_key(item), {}, error)
+                    ticket.release(succeeded=False)
+            except Exception as error:
+                self._log.error(f'[plan]System search on {item} failed: {redact(str(error))}')
+                self.__dead_letter(SEARCH_KIND, self.__search_key(item), {}, error)
+                ticket.release(succeeded=False)
+            finally:
+                ACTIVE_WORKERS.dec()
+
+    @staticmethod
+    def __search_key(item: SearchItem) -> dict:
+        (x_coord, y_coord, z_coord), radius = item
+        return {'x': x_coord, 'y': y_coord, 'z': z_coord, 'radius': radius}
+
+    def __replay_search(self, search: dict) -> None:
+        # outside of any scan: the systems found are refreshed at once, without going on from them
+        for system in self._edsm_client.search_systems_from_coord(search['x'], search['y'],
+                                                                  search['z'], search['radius']):
+            key = key_of(system)
+            edsm_system, system_changed = self.__refresh_system_entity(key, system)
+            if self.__bodies_refresh_reason(key, system['name'], edsm_system,
+                                            system_changed) is not None:
+                self.__refresh_bodies_entities(key, system['name'], edsm_system.get('bodyCount'))
+
+    @staticmethod
+    def __search_ticket(context: CrawlContext, item: SearchItem) -> SearchTicket:
+        # a search is only done (in the checkpoint) once the systems it found are stored
+        return SearchTicket(lambda succeeded: context.done(item) if succeeded
+                            else context.failed(item))
+
+    def __split_search(self, context: CrawlContext, coord: Tuple[float, float, float],
+                       radius: int, reason: str) -> bool:
+        """
+        :return: whether the search is split, False once the minimum radius is reached
+        """
+        if not context.planner.can_split(radius):
+            UNSPLIT_SEARCHES.inc(reason=reason)
+            self._log.warning(f'[plan]Dense area on {coord}, radius:`{radius}` cannot be split '
+                              f'anymore (minimum radius), {reason} search left as is')
+            return False
+        finer_searches = context.planner.split(coord, radius, context.coverage)
+        self._log.info('[plan]Dense area on %s, split in %s searches', coord, len(finer_searches),
+                       sampled='search')
+        for finer_search in finer_searches:
+            context.push(finer_search)
+        return True
+
+    def __system_scan_from_coord(self,
+                                 context: CrawlContext,
+                                 system_stage: PipelineStage,
+                                 ticket: SearchTicket,
+                                 x_coord: float,
+                                 y_coord: float,
+                                 z_coord: float,
+                                 radius: int):
+
+        systems, local = self.__search_systems(x_coord, y_coord, z_coord, radius)
+        self._log.info('Processing system search on x:`%s`, y:`%s`, z:`%s`', x_coord, y_coord, z_coord,
+                       sampled='search')
+
+        searches_added = 0
         for system in systems:
-            self.__register_system_and_bodies(system, system_already_registered)
-            self.__add_sub_thread(radius, scans_done, system, system_already_registered, threads,
-                                  x_coord, y_coord, z_coord)
-
-        self._log.info(f'{current_thread()} - {len(threads)} sub-thread created')
-
-        for thread in threads:
-            thread.start()
-
-        for thread in threads:
-            thread.join()
-
-    def __register_system_and_bodies(self, system, system_already_registered):
-        key = {'id': system['id'], 'id64': system['id64']}
-        if key not in system_already_registered:
-            self._log.debug(f'{current_thread()}')
-            self._log.info(f'[scan]Processing system:`{system["name"]}` key:`{json.dumps(key)}`')
-            self.__refresh_system_entity(key, system)
-            self.__refresh_bodies_entities(key)
-            system_already_registered.append(key)
+            if not local:
+                self.__hand_over_system(system, system_stage, ticket, context.registered)
+            if self.__add_search(context, radius, system, x_coord, y_coord, z_coord):
+                searches_added += 1
+
+        self._log.info('%s searches added to frontier (size: %s)', searches_added,
+                       len(context.frontier), sampled='search')
+
+    def __search_systems(self, x_coord: float, y_coord: float, z_coord: float,
+                         radius: int) -> Tuple[Iterable[dict], bool]:
+        """
+        Search the systems of a sphere, in the spatial index when it already holds enough of them
+        :return: the systems found, and whether they come from the index (so are already stored)
+        """
+        if self._spatial_index is not None and self._local_search_min_systems > 0:
+            known = self._spatial_index.within((x_coord, y_coord, z_coord), radius)
+            if len(known) >= self._local_search_min_systems:
+                LOCAL_SEARCHES.inc()
+                return [{'id64'  : id64,
+                         'name'  : f'#{id64}',
+                         'coords': {'x': coord[0], 'y': coord[1], 'z': coord[2]}}
+                        for id64, coord, _ in known], True
+        return self._edsm_client.search_systems_from_coord(x_coord, y_coord, z_coord, radius), False
+
+    def __hand_over_system(self, system: dict, system_stage: PipelineStage, ticket: SearchTicket,
+                           system_already_registered: ThreadSafeSet):
+        key = key_of(system)
+        if system_already_registered.add(key['id64']):
+            self._log.info('[scan]Processing system:`%s` key:`%s`', system['name'], key,
+                           sampled='system')
+            ticket.hold()
+            system_stage.put((key, system, ticket, system_already_registered))
         else:
-            self._log.debug(f'{current_thread()}')
-            self._log.info(f'[scan]Skipping System: `{system["name"]}` (already registered)')
-
-    def __add_sub_thread(self, radius, scans_done, system, system_already_registered, threads,
-                         x_coord, y_coord, z_coord):
+            self._log.info('[scan]Skipping System: `%s` (already registered)', system['name'],
+                           sampled='system')
+
+    def __system_stage(self, body_stage: PipelineStage, item: tuple):
+        key, system, ticket, system_already_registered = item
+        try:
+            edsm_system, system_changed = self.__refresh_system_entity(key, system)
+            if self.__bodies_refresh_reason(key, system['name'], edsm_system, system_changed) is None:
+                ticket.release()
+                return
+            body_stage.put((key, system['name'], edsm_system.get('bodyCount'), ticket,
+                            system_already_registered))
+        except Exception as error:
+            self._log.error(f'[scan]Refresh of system `{system["name"]}` failed: {redact(str(error))}')
+            self.__dead_letter(SYSTEM_KIND, key, {'name': system['name']}, error)
+            system_already_registered.discard(key['id64'])
+            ticket.release(succeeded=False)
+
+    def __body_stage(self, item: tuple):
+        key, system_name, reported_body_count, ticket, system_already_registered = item
+        try:
+            self.__refresh_bodies_entities(key, system_name, reported_body_count)
+            ticket.release()
+        except Exception as error:
+            self._log.error(f'[body scan]Refresh of the bodies of `{system_name}` failed: '
+                            f'{redact(str(error))}')
+            self.__dead_letter(BODIES_KIND, key, {'name': system_name, 'bodyCount': reported_body_count},
+                               error)
+            system_already_registered.discard(key['id64'])
+            ticket.release(succeeded=False)
+
+    def __dead_letter(self, kind: str, key: dict, payload: dict, error: Exception) -> None:
+        # never raises: the stages must release their ticket whatever happens
+        try:
+            self._dead_letter_service.record_failure(kind, key, payload, error)
+        except Exception as record_error:
+            self._log.error(f'[dead letter]Cannot record the failed {kind} of {key}: '
+                            f'{redact(str(record_error))}')
+
+    def __add_search(self, context: CrawlContext, radius, system,
+                     x_coord, y_coord, z_coord) -> bool:
         if 'coords' in system:
             coords = system['coords']
             if Coordinate(coords['x'], coords['y'], coords['z']) \
                     .is_outside_limit(x_coord, y_coord, z_coord, radius - 10):
-                if (coords['x'], coords['y'], coords['z']) not in scans_done:
-                    threads.append(Thread(target=self.__recursive_system_scan_from_coord,
-                                          args=(system_already_registered,
-                                                scans_done,
-                                                coords['x'],
-                                                coords['y'],
-                                                coords['z'],
-                                                radius)))
-                    self._log.debug(f'{current_thread()}')
-                    self._log.info(f'[recursive search]Processing a recursing system search :`{system["name"]}`')
+                coord = (coords['x'], coords['y'], coords['z'])
+                probe = self.__outward_probe(coord, (x_coord, y_coord, z_coord), radius)
+                if not context.is_searched(probe):
+                    context.push((coord, radius))
+                    self._log.info('[recursive search]Processing a recursing system search :`%s`',
+                                   system['name'], sampled='search')
+                    return True
                 else:
-                    self._log.debug(f'{current_thread()}')
-                    self._log.info(f'[recursive search]Skipping System: `{system["name"]}` (already registered)')
+                    self._log.info('[recursive search]Skipping System: `%s` (already registered)',
+                                   system['name'], sampled='search')
+        return False
+
+    @staticmethod
+    def __outward_probe(coord: Tuple[float, float, float],
+                        center: Tuple[float, float, float],
+                        radius: int) -> Tuple[float, float, float]:
+        """
+        Point beyond `coord`, away from the sphere it was found in: a new search centered
+        on `coord` is only worth it if this point is not already inside a searched sphere
+        """
+        direction = [coord[index] - center[index] for index in range(3)]
+        norm = math.sqrt(sum(value ** 2 for value in direction)) or 1.0
+        return (coord[0] + direction[0] / norm * radius / 2,
+                coord[1] + direction[1] / norm * radius / 2,
+                coord[2] + direction[2] / norm * radius / 2)
+
+    def __bodies_refresh_reason(self, key: dict, system_name: str, edsm_system: dict,
+                                system_changed: bool) -> Optional[str]:
+        last_sync = None
+        if self._body_refresh_policy.enabled and not system_changed:
+            last_sync = self._body_sync_service.read_body_sync(key)
+        reported_body_count = edsm_system.get('bodyCount')
+        reason = self._body_refresh_policy.reason_to_fetch(system_changed, reported_body_count,
+                                                           last_sync)
+        if reason is None:
+            BODY_REFRESHES.inc(reason='skipped')
+            self._log.info('[body scan]Skipping bodies of system:`%s` (unchanged)', system_name,
+                           sampled='bodies')
+        else:
+            BODY_REFRESHES.inc(reason=reason)
+        return reason
 
-    def __refresh_bodies_entities(self, key: dict, system_name: str):
+    def __refresh_bodies_entities(self, key: dict, system_name: str,
+                                  reported_body_count: Optional[int]):
         edsm_bodies = self._edsm_client.get_bodies_from_system_id(key['id'])
         if len(edsm_bodies) > 0:
-            self._log.info(f'[body scan]Processing:`{len(edsm_bodies)}` bodies of system:`{system_name}`')
-
-            for edsm_body in edsm_bodies:
-
-                body_key = {'id': edsm_body['id'], 'id64': edsm_body['id64']}
-                body_state = self._state_service.read_sync_state_by_key(body_key)
-
-                if body_state is not None:
-                    edsm_body_hash = self.__compute_hash_of_dict(edsm_body)
-
-                    if edsm_body_hash != body_state.sync_hash:
-                        previous_body_state = self.__update_create_body(key, body_key, edsm_body)
+            BODIES_PROCESSED.inc(len(edsm_bodies))
+            self._log.info('[body scan]Processing:`%s` bodies of system:`%s`', len(edsm_bodies),
+                           system_name, sampled='bodies')
+
+            with self.__unit_of_work():
+                body_keys = [key_of(edsm_body) for edsm_body in edsm_bodies]
+                body_states = {key_to_str(state.key): state
+                               for state in self._state_service.read_sync_states_by_keys(body_keys)}
+
+                changed_bodies = []
+                for body_key, edsm_body in zip(body_keys, edsm_bodies):
+                    body_state = body_states.get(key_to_str(body_key))
+
+                    if body_state is not None:
+                        edsm_body_hash = self.__compute_hash_of_dict(edsm_body)
+
+                        if edsm_body_hash != body_state.sync_hash:
+                            if self._fingerprinter.matches_previous(edsm_body, body_state.sync_hash):
+                                # unchanged, hashed by the previous algorithm: only the hash is replaced
+                                self.__update_sync_state(edsm_body_hash, body_key, 'body')
+                            else:
+                                changed_bodies.append((body_key, edsm_body, edsm_body_hash))
+
+                    else:
+                        body = body_from_edsm(edsm_body)
+                        body.system_key = key
+                        self._body_service.create_body(body)
+                        self.__create_sync_state(edsm_body, body_key, 'body')
+
+                if len(changed_bodies) > 0:
+                    self._refresh_stat_service.record_change(key)
+                    stored_bodies = {key_to_str(body.key): body for body in
+                                     self._body_service.read_bodies_by_keys(
+                                             [body_key for body_key, _, _ in changed_bodies])}
+
+                    for body_key, edsm_body, edsm_body_hash in changed_bodies:
+                        previous_body_state = self.__update_create_body(
+                                key, edsm_body, stored_bodies.get(key_to_str(body_key)))
                         self.__update_sync_state(edsm_body_hash, body_key, 'body',
                                                  previous_body_state)
+        self._body_sync_service.record_body_sync(key, reported_body_count)
 
-                else:
-                    body = body_from_edsm(edsm_body)
-                    body.system_key = key
-                    self._body_service.create_body(body)
-                    self.__create_sync_state(edsm_body, body_key, 'body')
-
-    def __refresh_system_entity(self, key: dict, system: dict = None):
-        sync_state = self._state_service.read_sync_state_by_key(key)
+    def __refresh_system_entity(self, key: dict, system: dict = None) -> Tuple[dict, bool]:
+        """
+        :return: the system read from EDSM, and whether it is new or changed (or unknown to EDSM)
+        """
         if system is None:
             edsm_system: dict = self._edsm_client.get_system_from_system_id(key['id'])
         else:
-            edsm_system: dict = system
+            # the same system found from another center must keep the same fingerprint
+            edsm_system: dict = {field: value for field, value in system.items()
+                                 if field not in SEARCH_ONLY_FIELDS}
 
+        system_changed = True
         if len(edsm_system) > 0:
-            if sync_state is not None:
-                edsm_sys_hash = self.__compute_hash_of_dict(edsm_system)
+            SYSTEMS_PROCESSED.inc()
+            with self.__unit_of_work():
+                sync_state = self._state_service.read_sync_state_by_key(key)
+                if sync_state is not None:
+                    edsm_sys_hash = self.__compute_hash_of_dict(edsm_system)
+
+                    if edsm_sys_hash == sync_state.sync_hash:
+                        system_changed = False
+                    elif self._fingerprinter.matches_previous(edsm_system, sync_state.sync_hash):
+                        # unchanged, hashed by the previous algorithm: only the hash is replaced
+                        self.__update_sync_state(edsm_sys_hash, key, 'system')
+                        system_changed = False
+                    else:
+                        previous_system_state = self.__update_create_system(key, edsm_system)
+                        self.__update_sync_state(edsm_sys_hash, key, 'system', previous_system_state)
+                        self._refresh_stat_service.record_change(key, edsm_system.get('coords'))
 
-                if edsm_sys_hash != sync_state.sync_hash:
-                    previous_system_state = self.__update_create_system(key, edsm_system)
-                    self._log.debug(f'prev : {previous_system_state}')
-                    self.__update_sync_state(edsm_sys_hash, key, 'system', previous_system_state)
+                else:
+                    self._system_service.create_system(system_from_edsm(edsm_system))
+                    self.__create_sync_state(edsm_system, key, 'system')
+                    self._refresh_stat_service.record_position(key, edsm_system.get('coords'))
+        return edsm_system, system_changed
 
-            else:
-                self._system_service.create_system(system_from_edsm(edsm_system))
-                self.__create_sync_state(edsm_system, key, 'system')
+    def __unit_of_work(self) -> ContextManager:
+        if self._write_buffer is not None:
+            return self._write_buffer.unit_of_work()
+        return nullcontext()
 
     def __update_create_body(self,
                              system_key: dict,
-                             body_key: dict,
-                             edsm_body: dict) -> Optional[dict]:
-        body = self._body_service.read_body_by_key(body_key)
-
+                             edsm_body: dict,
+                             body: Optional[Body]) -> Optional[dict]:
         if body is not None:
-            previous_state = body.to_dict_for_db()
             update_body = body_from_edsm(edsm_body)
             update_body.system_key = system_key
+            previous_state = compute_delta(body.to_dict_for_db(), update_body.to_dict_for_db(),
+                                           DELTA_IGNORED_FIELDS)
             self._body_service.update_body_by_key(update_body)
             return previous_state
 
@@ -184,9 +712,10 @@ class EDSMOrchestrator:
     def __update_create_system(self, key: dict, edsm_system: dict) -> Optional[dict]:
         system = self._system_service.read_system_by_key(key)
         if system is not None:
-
-            previous_state = system.to_dict()
-            self._system_service.update_system_by_key(system_from_edsm(edsm_system))
+            update_system = system_from_edsm(edsm_system)
+            previous_state = compute_delta(system.to_dict(), update_system.to_dict(),
+                                           DELTA_IGNORED_FIELDS)
+            self._system_service.update_system_by_key(update_system)
             return previous_state
 
         else:
@@ -196,13 +725,15 @@ class EDSMOrchestrator:
 
     def __update_sync_state(self, object_hash: str, key_to_save: dict, data_type: str,
                             previous_state: dict = None) -> None:
+        # the sync state only keeps the hash and date, the previous state goes to the history
         new_sync = SyncState(
             key=key_to_save,
             data_type=data_type,
-            sync_hash=object_hash,
-            previous_state=previous_state
+            sync_hash=object_hash
         )
         self._state_service.update_sync_state(new_sync)
+        if previous_state:
+            self._change_history_service.record_change(key_to_save, data_type, previous_state)
 
     def __create_sync_state(self, edsm_dict: dict, key_to_save: dict, data_type: str) -> None:
         sync = SyncState(
@@ -213,7 +744,4 @@ class EDSMOrchestrator:
         self._state_service.create_sync_state(sync)
 
     def __compute_hash_of_dict(self, data: dict) -> str:
-        result = hashlib.sha256(
-            bytes(json.dumps(data, sort_keys=True, default=str), 'utf-8')).hexdigest()
-        self._log.debug(f'hash of {data} = {result}')
-        return result
+        return self._fingerprinter.fingerprint(data)
@@ -0,0 +1,101 @@
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Callable, List
+
+import structlog
+
+from ..utils.metrics import REGISTRY
+
+DEFAULT_STAGE_QUEUE_SIZE = 500
+
+STAGE_QUEUE_SIZE = REGISTRY.gauge('edsm_reader_stage_queue_size',
+                                  'Items waiting for a stage of the crawl pipeline', ['stage'])
+STAGE_ACTIVE_WORKERS = REGISTRY.gauge('edsm_reader_stage_active_workers',
+                                      'Workers of a stage of the crawl pipeline currently busy',
+                                      ['stage'])
+
+_STOP = object()
+
+
+class SearchTicket:
+    """
+    Completion of a search whose systems are processed by the later stages of the pipeline:
+    `on_done` is called once every system handed over is processed, with False if one failed.
+    """
+
+    def __init__(self, on_done: Callable[[bool], None]):
+        # the search itself holds the ticket until all its systems are handed over
+        self._pending = 1
+        self._succeeded = True
+        self._on_done = on_done
+        self._lock = Lock()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._pending += 1
+
+    def release(self, succeeded: bool = True) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._succeeded = self._succeeded and succeeded
+            done = self._pending == 0
+        if done:
+            self._on_done(self._succeeded)
+
+
+class PipelineStage:
+    """
+    Stage of the crawl pipeline: workers taking the items of a bounded queue.
+
+    `put` blocks while the queue is full, so a stage falling behind (waiting on its api rate
+    limit) slows down the stages feeding it instead of piling items up in memory.
+    """
+    name: str
+    _queue: Queue
+    _workers: List[Thread]
+
+    def __init__(self, name: str, handler: Callable[[Any], None], workers: int = 1,
+                 queue_size: int = DEFAULT_STAGE_QUEUE_SIZE):
+        """
+        :param name: the name of the stage, in the logs and metrics
+        :param handler: the processing of an item, errors are left to it
+        :param workers: the number of threads of the stage
+        :param queue_size: the maximum number of items waiting for the stage
+        """
+        self.name = name
+        self._handler = handler
+        self._queue = Queue(maxsize=queue_size)
+        self._workers = [Thread(target=self.__work, name=f'{name}-{index}', daemon=True)
+                         for index in range(max(1, workers))]
+        self._log = structlog.get_logger()
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+
+    def put(self, item: Any) -> None:
+        self._queue.put(item)
+        STAGE_QUEUE_SIZE.set(self._queue.qsize(), stage=self.name)
+
+    def stop(self) -> None:
+        """
+        Let the workers finish the items queued, then stop them
+        """
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    def __work(self) -> None:
+        while True:
+            item = self._queue.get()
+            STAGE_QUEUE_SIZE.set(self._queue.qsize(), stage=self.name)
+            if item is _STOP:
+                return
+            STAGE_ACTIVE_WORKERS.inc(stage=self.name)
+            try:
+                self._handler(item)
+            except Exception as error:
+                self._log.error(f'[pipeline]Stage `{self.name}` failed on an item: {error}')
+            finally:
+                STAGE_ACTIVE_WORKERS.dec(stage=self.name)
@@ -0,0 +1,110 @@
+import time
+from typing import Callable, List, Optional, Sequence
+
+import structlog
+
+from ..services.refresh_stat_service import HotRegion, RefreshStatService
+from ..utils.redaction import redact
+
+# a refresh costs a `system` call and a `bodies` call
+CALLS_PER_REFRESH = 2
+ONE_HOUR = 3600.0
+DEFAULT_REFRESH_BUDGET = 600
+DEFAULT_CHANGE_WEIGHT = 1.0
+DEFAULT_HOT_REGION_WEIGHT = 10.0
+
+
+def parse_hot_regions(value: Optional[str]) -> List[HotRegion]:
+    """
+    Parse hot regions written as `x,y,z,radius;x,y,z,radius`
+    :param value: the hot regions, None or empty for none
+    :return: the hot regions, as (x, y, z, radius)
+    """
+    if value is None or value.strip() == '':
+        return []
+    regions = []
+    for region in value.split(';'):
+        if region.strip() == '':
+            continue
+        parts = [float(part) for part in region.split(',')]
+        if len(parts) != 4:
+            raise ValueError(f'Invalid hot region `{region}`, expected `x,y,z,radius`')
+        regions.append((parts[0], parts[1], parts[2], parts[3]))
+    return regions
+
+
+class RefreshScheduler:
+    """
+    Refresh the stored systems by priority within a fixed api budget per hour.
+
+    Every hour, the systems most worth a refresh (stalest first, boosted by how often they
+    changed before and by the hot regions) are refreshed, spread evenly over the hour.
+    """
+    _refresh: Callable[[dict], None]
+    _stat_service: RefreshStatService
+    _refreshes_per_hour: int
+    _hot_regions: Sequence[HotRegion]
+
+    def __init__(self, refresh: Callable[[dict], None],
+                 stat_service: RefreshStatService,
+                 budget_per_hour: int = DEFAULT_REFRESH_BUDGET,
+                 hot_regions: Sequence[HotRegion] = (),
+                 change_weight: float = DEFAULT_CHANGE_WEIGHT,
+                 hot_region_weight: float = DEFAULT_HOT_REGION_WEIGHT):
+        """
+        :param refresh: the refresh of a full system, from its key
+        :param stat_service: the service reading the candidates and recording the checks
+        :param budget_per_hour: the maximum number of EDSM calls per hour
+        :param hot_regions: the regions to keep fresher, as (x, y, z, radius)
+        :param change_weight: the weight of each change seen before
+        :param hot_region_weight: the factor applied to the priority inside a hot region
+        """
+        self._refresh = refresh
+        self._stat_service = stat_service
+        self._refreshes_per_hour = max(1, budget_per_hour // CALLS_PER_REFRESH)
+        self._hot_regions = hot_regions
+        self._change_weight = change_weight
+        self._hot_region_weight = hot_region_weight
+        self._log = structlog.get_logger()
+
+    def run(self, cycles: Optional[int] = None) -> None:
+        """
+        Run refresh cycles of one hour each
+        :param cycles: the number of cycles to run, forever if None
+        """
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            self.run_cycle()
+            cycle += 1
+
+    def run_cycle(self) -> int:
+        """
+        Refresh the systems most worth it, paced to fit in one hour
+        :return: the number of systems refreshed
+        """
+        started_at = time.monotonic()
+        candidates = self._stat_service.read_refresh_candidates(
+                self._refreshes_per_hour, self._hot_regions, self._change_weight,
+                self._hot_region_weight)
+        interval = ONE_HOUR / self._refreshes_per_hour
+        self._log.info(f'[refresh]{len(candidates)} systems to refresh in the next hour')
+
+        refreshed = 0
+        for index, candidate in enumerate(candidates):
+            try:
+                self._refresh(candidate['key'])
+                self._stat_service.record_check(candidate['key'])
+                refreshed += 1
+            except Exception as error:
+                self._log.error(f'[refresh]Refresh of system {candidate["key"]} failed: {redact(str(error))}')
+            self.__wait_until(started_at + (index + 1) * interval)
+
+        self.__wait_until(started_at + ONE_HOUR)
+        self._log.info(f'[refresh]Cycle done - {refreshed}/{len(candidates)} systems refreshed')
+        return refreshed
+
+    @staticmethod
+    def __wait_until(deadline: float) -> None:
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,126 @@
+import math
+from typing import Iterator, List, Optional, Tuple
+
+from ..utils.sphere_coverage import SphereCoverage
+from .crawl_frontier import Coord, SearchItem
+from .sector import SectorBox
+
+DEFAULT_REGION_RADIUS = 1000
+MIN_SEARCH_RADIUS = 10
+# the most systems a sphere search is trusted to answer whole: reaching it, the answer is truncated
+DEFAULT_MAX_RESULTS = 10_000
+
+
+def _cube_shell(shell: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Integer points (i, j, k) with max(|i|, |j|, |k|) == shell
+    """
+    if shell == 0:
+        yield 0, 0, 0
+        return
+    for i in range(-shell, shell + 1):
+        for j in range(-shell, shell + 1):
+            if abs(i) == shell or abs(j) == shell:
+                for k in range(-shell, shell + 1):
+                    yield i, j, k
+            else:
+                yield i, j, -shell
+                yield i, j, shell
+
+
+def bcc_lattice(center: Coord, region_radius: float, radius: float) -> Iterator[Coord]:
+    """
+    Centers of the spheres of `radius` covering a spherical region, laid on a body-centered
+    cubic lattice: the thinnest covering of space by equal spheres (~30% fewer spheres than
+    a face-centered cubic one). Centers are generated lazily, shell by shell from the center.
+    :param center: the center of the region
+    :param region_radius: the radius of the region
+    :param radius: the radius of the covering spheres
+    :return: the centers of the spheres
+    """
+    # covering radius of a bcc lattice of cell `a` is a * sqrt(5) / 4
+    cell = 4 * radius / math.sqrt(5)
+    max_shell = math.ceil((region_radius + radius) / cell)
+    for shell in range(max_shell + 1):
+        for i, j, k in _cube_shell(shell):
+            for offset in (0.0, 0.5):
+                point = (center[0] + (i + offset) * cell,
+                         center[1] + (j + offset) * cell,
+                         center[2] + (k + offset) * cell)
+                if math.dist(point, center) <= region_radius + radius:
+                    yield point
+
+
+class ScanPlanner:
+    """
+    Plan the sphere searches covering a region, instead of following the systems found.
+
+    Searches are laid on a covering lattice, skipping the ones already fully covered by a past
+    search. In dense areas, where a search answer is truncated (or the search times out), the
+    sphere is split into a finer lattice of smaller searches.
+    """
+    _center: Coord
+    _region_radius: float
+    _radius: int
+    _min_radius: int
+    _max_results: int
+    _bounds: Optional[SectorBox]
+
+    def __init__(self, center: Coord,
+                 region_radius: float = DEFAULT_REGION_RADIUS,
+                 radius: int = 100,
+                 min_radius: int = MIN_SEARCH_RADIUS,
+                 max_results: int = DEFAULT_MAX_RESULTS,
+                 bounds: Optional[SectorBox] = None):
+        """
+        :param bounds: restrict the region to a sector: searches not reaching it are skipped
+        """
+        self._center = center
+        self._region_radius = region_radius
+        self._radius = radius
+        self._min_radius = min_radius
+        self._max_results = max_results
+        self._bounds = bounds
+
+    def plan(self, coverage: SphereCoverage) -> Iterator[SearchItem]:
+        """
+        The searches covering the region
+        :param coverage: the spheres already searched
+        :return: lazy iterator of (center, radius)
+        """
+        for point in bcc_lattice(self._center, self._region_radius, self._radius):
+            if self._bounds is not None and not self._bounds.intersects_sphere(point, self._radius):
+                continue
+            if not coverage.covers_sphere(point, self._radius):
+                yield point, self._radius
+
+    def is_truncated(self, systems_found: int) -> bool:
+        return systems_found >= self._max_results
+
+    def can_split(self, radius: int) -> bool:
+        """
+        :return: whether a search of this radius can be split, above the minimum radius
+        """
+        return radius // 2 >= self._min_radius
+
+    def split(self, center: Coord, radius: int,
+              coverage: Optional[SphereCoverage] = None) -> List[SearchItem]:
+        """
+        Finer searches covering a sphere too dense to be searched at once
+        :param center: the center of the dense sphere
+        :param radius: the radius of the dense sphere
+        :param coverage: the spheres already searched, whose searches are skipped
+        :return: the searches of half radius covering it, without the ones already covered or
+                 not reaching the bounds, empty if the minimum radius is reached
+        """
+        if not self.can_split(radius):
+            return []
+        sub_radius = radius // 2
+        searches = []
+        for point in bcc_lattice(center, radius, sub_radius):
+            if self._bounds is not None and not self._bounds.intersects_sphere(point, sub_radius):
+                continue
+            if coverage is not None and coverage.covers_sphere(point, sub_radius):
+                continue
+            searches.append((point, sub_radius))
+        return searches
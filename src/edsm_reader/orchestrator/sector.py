@@ -0,0 +1,110 @@
+import math
+from threading import Event, Thread
+from typing import Callable, List
+
+import structlog
+
+from ..services.sector_lease_service import SectorLeaseService
+from .crawl_frontier import Coord
+
+DEFAULT_SECTOR_SIZE = 250
+DEFAULT_LEASE_DURATION = 300
+
+
+class SectorBox:
+    """
+    Cubic sector of the galaxy, `[lower, lower + size)` on each axis: sectors tile the space
+    without overlap, so every system belongs to exactly one of them.
+    """
+    lower: Coord
+    size: float
+
+    def __init__(self, lower: Coord, size: float):
+        self.lower = lower
+        self.size = size
+
+    @property
+    def sector_id(self) -> str:
+        return f'{self.lower[0]}:{self.lower[1]}:{self.lower[2]}:{self.size}'
+
+    @property
+    def center(self) -> Coord:
+        return (self.lower[0] + self.size / 2,
+                self.lower[1] + self.size / 2,
+                self.lower[2] + self.size / 2)
+
+    @property
+    def radius(self) -> float:
+        """
+        Radius of the sphere circumscribing the sector
+        """
+        return self.size * math.sqrt(3) / 2
+
+    def contains(self, coord: Coord) -> bool:
+        return all(self.lower[axis] <= coord[axis] < self.lower[axis] + self.size
+                   for axis in range(3))
+
+    def intersects_sphere(self, center: Coord, radius: float) -> bool:
+        distance = math.sqrt(sum(max(self.lower[axis] - center[axis], 0.0,
+                                     center[axis] - self.lower[axis] - self.size) ** 2
+                                 for axis in range(3)))
+        return distance <= radius
+
+
+def sectors_of_region(center: Coord, region_radius: float, size: float) -> List[SectorBox]:
+    """
+    Sectors of a grid anchored on `center`, intersecting a spherical region
+    :param center: the center of the region
+    :param region_radius: the radius of the region
+    :param size: the size of the sectors
+    :return: the sectors, nearest to the center first
+    """
+    shells = math.ceil(region_radius / size)
+    sectors = []
+    for i in range(-shells, shells):
+        for j in range(-shells, shells):
+            for k in range(-shells, shells):
+                sector = SectorBox((center[0] + i * size, center[1] + j * size, center[2] + k * size),
+                                   size)
+                if sector.intersects_sphere(center, region_radius):
+                    sectors.append(sector)
+    sectors.sort(key=lambda sector: math.dist(sector.center, center))
+    return sectors
+
+
+class LeaseHeartbeat:
+    """
+    Renew the lease of a sector while it is scanned, calling `on_lost` if another instance
+    took it over (after this one missed its renewals)
+    """
+
+    def __init__(self, lease_service: SectorLeaseService, scan_id: str, sector_id: str, owner: str,
+                 duration: int, on_lost: Callable[[], None]):
+        self._lease_service = lease_service
+        self._scan_id = scan_id
+        self._sector_id = sector_id
+        self._owner = owner
+        self._duration = duration
+        self._on_lost = on_lost
+        self._stopped = Event()
+        self._thread = Thread(target=self.__renew_periodically, name='lease-heartbeat', daemon=True)
+        self._log = structlog.get_logger()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def __renew_periodically(self) -> None:
+        # three renewals per lease: a single missed one does not lose the sector
+        while not self._stopped.wait(self._duration / 3):
+            try:
+                if not self._lease_service.renew_sector(self._scan_id, self._sector_id, self._owner,
+                                                        self._duration):
+                    self._log.error(f'[shard]Lease of sector `{self._sector_id}` lost')
+                    self._on_lost()
+                    return
+            except Exception as error:
+                self._log.error(f'[shard]Renewal of sector `{self._sector_id}` failed: {error}')
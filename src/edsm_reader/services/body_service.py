@@ -1,23 +1,32 @@
 import json
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 import structlog
 
-from astraeus_common.decorator.logit import logit
 from astraeus_common.error.body_not_found import BodyNotFound
 from astraeus_common.io.database import Database
 from astraeus_common.models.body import Body
 
+from ..io.write_buffer import WriteBuffer
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+BODY_SELECT_BY_KEYS = 'SELECT * FROM astraeus.body WHERE key = ANY(%(keys)s::jsonb[])'
+PREPARED_STATEMENTS = (Body.BODY_SELECT_BY_KEY, Body.BODY_INSERT)
+
 
 class BodyService:
     _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
 
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None):
         self._io_db = db
+        self._write_buffer = write_buffer
         self._log = structlog.get_logger()
 
     @logit
+    @observe_query
     def read_body_by_key(self, key: dict) -> Optional[Body]:
         """
         Reads the body from the database using the given key.
@@ -31,10 +40,30 @@ class BodyService:
         if raw_data is not None and len(raw_data) > 0:
             return Body(raw_data[0])
         else:
-            self._log.debug(f'No {Body.__name__} found')
+            self._log.debug('No %s found', Body.__name__)
             return None
 
     @logit
+    @observe_query
+    def read_bodies_by_keys(self, keys: List[dict]) -> List[Body]:
+        """
+        Reads all the bodies matching a list of keys, in a single query.
+
+        :param keys: The keys to search for in the database.
+        :type keys: List[Dict]
+        :return: The bodies found, keys without body are omitted.
+        :rtype: List[Body]
+        """
+        if len(keys) == 0:
+            return []
+        raw_data = self._io_db.exec_db_read(BODY_SELECT_BY_KEYS,
+                                            {'keys': [json.dumps(key) for key in keys]})
+        if raw_data is None:
+            return []
+        return [Body(row) for row in raw_data]
+
+    @logit
+    @observe_query
     def read_body_by_system_key(self, system_key: dict) -> Body:
         """
         Retrieve a Body by its system key.
@@ -52,6 +81,7 @@ class BodyService:
             raise BodyNotFound()
 
     @logit
+    @observe_query
     def create_body(self, body_created: Body) -> None:
         """
         Create a new body in the system.
@@ -59,9 +89,10 @@ class BodyService:
         :param body_created: The body object to create.
         """
         body_created.update_time = datetime.now()
-        self._io_db.exec_db_write(Body.BODY_INSERT, body_created.to_dict_for_db())
+        self.__write(Body.BODY_INSERT, body_created.to_dict_for_db())
 
     @logit
+    @observe_query
     def update_body_by_key(self, body_created: Body) -> None:
         """
         Update the `body_created` object in the database by its key.
@@ -70,9 +101,10 @@ class BodyService:
         :type body_created: Body
         """
         body_created.update_time = datetime.now()
-        self._io_db.exec_db_write(Body.BODY_UPDATE_BY_KEY, body_created.to_dict_for_db())
+        self.__write(Body.BODY_UPDATE_BY_KEY, body_created.to_dict_for_db())
 
     @logit
+    @observe_query
     def delete_body_by_key(self, key: dict) -> None:
         """
         Deletes a body record from the database by the given key.
@@ -81,3 +113,9 @@ class BodyService:
         :type key: Dict
         """
         self._io_db.exec_db_write(Body.BODY_DELETE_BY_KEY, {'key': json.dumps(key)})
+
+    def __write(self, query: str, params: dict) -> None:
+        if self._write_buffer is not None:
+            self._write_buffer.add(query, params)
+        else:
+            self._io_db.exec_db_write(query, params)
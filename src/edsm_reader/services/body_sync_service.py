@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+from typing import Optional
+
+import structlog
+from astraeus_common.io.database import Database
+
+from ..io.write_buffer import WriteBuffer
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+BODY_SYNC_SELECT_BY_KEY = '''
+    SELECT body_count, synced_date FROM astraeus.body_sync WHERE key = %(key)s
+'''
+BODY_SYNC_UPSERT = '''
+    INSERT INTO astraeus.body_sync (key, body_count, synced_date)
+    VALUES (%(key)s, %(body_count)s, %(synced_date)s)
+        ON CONFLICT (key)
+        DO UPDATE SET body_count = EXCLUDED.body_count, synced_date = EXCLUDED.synced_date
+'''
+
+
+class BodySyncService:
+    _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None):
+        self._io_db = db
+        self._write_buffer = write_buffer
+        self._log = structlog.get_logger()
+
+    @logit
+    @observe_query
+    def read_body_sync(self, key: dict) -> Optional[dict]:
+        """
+        Reads the last fetch of the bodies of a system.
+
+        :param key: The key of the system.
+        :return: The fetch, as a dictionary of `body_count` and `synced_date`,
+                 or None if the bodies were never fetched.
+        """
+        raw_data = self._io_db.exec_db_read(BODY_SYNC_SELECT_BY_KEY, {'key': json.dumps(key)})
+        if raw_data is None or len(raw_data) == 0:
+            return None
+        return raw_data[0]
+
+    @logit
+    @observe_query
+    def record_body_sync(self, key: dict, body_count: Optional[int]) -> None:
+        """
+        Record a fetch of the bodies of a system.
+
+        :param key: The key of the system.
+        :param body_count: The number of bodies EDSM reported for the system.
+        """
+        params = {
+                'key'        : json.dumps(key),
+                'body_count' : body_count,
+                'synced_date': datetime.now(),
+        }
+        if self._write_buffer is not None:
+            self._write_buffer.add(BODY_SYNC_UPSERT, params)
+        else:
+            self._io_db.exec_db_write(BODY_SYNC_UPSERT, params)
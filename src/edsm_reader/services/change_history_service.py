@@ -0,0 +1,192 @@
+import json
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional, Set, Tuple
+
+import structlog
+from astraeus_common.io.database import Database
+
+from ..io.write_buffer import WriteBuffer
+from ..utils.compression import compress, decompress
+from ..utils.entity_key import key_to_str
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+DEFAULT_HISTORY_BATCH_SIZE = 200
+
+CHANGE_HISTORY_INSERT = '''
+    INSERT INTO astraeus.change_history (recorded_date, id64s, record_count, codec, records)
+    VALUES (%(recorded_date)s, %(id64s)s, %(record_count)s, %(codec)s, %(records)s)
+'''
+CHANGE_HISTORY_SELECT_BY_ID64 = '''
+    SELECT codec, records FROM astraeus.change_history
+     WHERE id64s @> ARRAY[%(id64)s]::BIGINT[]
+     ORDER BY recorded_date
+'''
+# the rows of the month written to the default partition before (partition not created yet, failed
+# creation...) are moved to the new partition, the default one cannot hold them once it is attached
+CHANGE_HISTORY_PARTITION_CREATE = '''
+    DO $partition$
+    BEGIN
+        IF to_regclass('astraeus.change_history_{suffix}') IS NULL THEN
+            CREATE TABLE astraeus.change_history_{suffix}
+                (LIKE astraeus.change_history INCLUDING DEFAULTS);
+            WITH moved AS (
+                DELETE FROM astraeus.change_history_default
+                 WHERE recorded_date >= '{start}' AND recorded_date < '{end}'
+                RETURNING *
+            )
+            INSERT INTO astraeus.change_history_{suffix} SELECT * FROM moved;
+            ALTER TABLE astraeus.change_history ATTACH PARTITION astraeus.change_history_{suffix}
+                FOR VALUES FROM ('{start}') TO ('{end}');
+        END IF;
+    END
+    $partition$
+'''
+
+
+class ChangeHistoryService:
+    """
+    Append-only history of the changes of the systems and bodies, out of the sync states.
+
+    The previous values of the changed fields are grouped by batches of up to `batch_size` records,
+    compressed together (zstd, or zlib when it is not installed) and written as one row of the
+    `change_history` table, partitioned by month. The batch in progress is written by every flush
+    of the write buffer: a change record is committed with the sync state of its change, or before.
+    Without a write buffer, each record is written at once.
+    """
+    _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+    _batch_size: int
+    _pending: List[dict]
+    _partitions: Set[str]
+
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None,
+                 batch_size: int = DEFAULT_HISTORY_BATCH_SIZE):
+        """
+        :param batch_size: the maximum number of change records compressed together
+        """
+        self._io_db = db
+        self._write_buffer = write_buffer
+        self._batch_size = batch_size
+        self._pending = []
+        self._partitions = set()
+        self._lock = Lock()
+        self._log = structlog.get_logger()
+        if write_buffer is not None:
+            write_buffer.on_flush(self.__take_batch)
+
+    @logit
+    @observe_query
+    def record_change(self, key: dict, data_type: str, previous_state: dict) -> None:
+        """
+        Record the previous values of the fields of an entity, before its change
+        :param key: the key of the changed system or body
+        :param data_type: `system` or `body`
+        :param previous_state: the previous values of the changed fields
+        """
+        record = self.__record(key, data_type, previous_state)
+        if self._write_buffer is None:
+            self._io_db.exec_db_write(CHANGE_HISTORY_INSERT, self.__batch_params([record]))
+            return
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) < self._batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._write_buffer.add(CHANGE_HISTORY_INSERT, self.__batch_params(batch))
+
+    def batch_params(self, changes: List[Tuple[dict, str, dict]]) -> List[dict]:
+        """
+        Rows of `CHANGE_HISTORY_INSERT` recording changes, for a caller writing them in its own
+        transaction (the dump loader)
+        :param changes: the key, data type and previous values of the fields of each changed entity
+        :return: the rows, holding up to `batch_size` records each
+        """
+        records = [self.__record(key, data_type, previous_state)
+                   for key, data_type, previous_state in changes]
+        return [self.__batch_params(records[start:start + self._batch_size])
+                for start in range(0, len(records), self._batch_size)]
+
+    def flush(self) -> None:
+        """
+        Hand the batch in progress to the write buffer
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if len(batch) > 0:
+            self._write_buffer.add(CHANGE_HISTORY_INSERT, self.__batch_params(batch))
+
+    @logit
+    @observe_query
+    def read_changes(self, key: dict) -> List[dict]:
+        """
+        Reads the recorded changes of an entity, oldest first.
+
+        :param key: The key of the system or body.
+        :return: The change records, as dictionaries of `key`, `data_type`, `changed_date`
+                 and `previous_state`.
+        """
+        key_str = key_to_str(key)
+        raw_data = self._io_db.exec_db_read(CHANGE_HISTORY_SELECT_BY_ID64, {'id64': key['id64']})
+        changes = []
+        for row in raw_data or []:
+            records = json.loads(decompress(row['codec'], bytes(row['records'])))
+            changes.extend(record for record in records if key_to_str(record['key']) == key_str)
+        with self._lock:
+            changes.extend(record for record in self._pending if key_to_str(record['key']) == key_str)
+        return changes
+
+    @staticmethod
+    def __record(key: dict, data_type: str, previous_state: dict) -> dict:
+        return {
+                'key'           : key,
+                'data_type'     : data_type,
+                'changed_date'  : datetime.now().isoformat(),
+                'previous_state': previous_state,
+        }
+
+    def __take_batch(self) -> List[Tuple[str, dict]]:
+        # called by each flush of the write buffer, with its pending rows locked
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if len(batch) == 0:
+            return []
+        return [(CHANGE_HISTORY_INSERT, self.__batch_params(batch))]
+
+    def __batch_params(self, batch: List[dict]) -> dict:
+        recorded_date = datetime.now()
+        self.__ensure_partition(recorded_date)
+        codec, records = compress(json.dumps(batch, separators=(',', ':'), default=str).encode('utf-8'))
+        return {
+                'recorded_date': recorded_date,
+                'id64s'        : sorted({record['key']['id64'] for record in batch
+                                         if record['key'].get('id64') is not None}),
+                'record_count' : len(batch),
+                'codec'        : codec,
+                'records'      : records,
+        }
+
+    def __ensure_partition(self, recorded_date: datetime) -> None:
+        suffix, start, end = self.month_partition(recorded_date)
+        if suffix in self._partitions:
+            return
+        try:
+            self._io_db.exec_db_write(CHANGE_HISTORY_PARTITION_CREATE.format(suffix=suffix, start=start,
+                                                                            end=end), {})
+            self._partitions.add(suffix)
+        except Exception as error:
+            # the rows go to the default partition meanwhile, they are moved by the next attempt
+            self._log.error(f'[history]Cannot create the partition `{suffix}`, '
+                            f'tried again with the next batch: {error}')
+
+    @staticmethod
+    def month_partition(recorded_date: datetime) -> Tuple[str, str, str]:
+        """
+        :param recorded_date: a date of the month
+        :return: the suffix of the partition of the month, the first day of the month and of the next one
+        """
+        start = recorded_date.date().replace(day=1)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 \
+            else start.replace(month=start.month + 1)
+        return start.strftime('%Y%m'), start.isoformat(), end.isoformat()
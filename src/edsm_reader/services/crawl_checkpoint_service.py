@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import List, Optional
+
+import structlog
+from astraeus_common.io.database import Database
+
+from ..io.write_buffer import WriteBuffer
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+CRAWL_CHECKPOINT_SELECT_BY_CRAWL = '''
+    SELECT x, y, z, radius, status
+      FROM astraeus.crawl_checkpoint
+     WHERE crawl_id = %(crawl_id)s
+'''
+CRAWL_CHECKPOINT_SELECT_BY_STATUS = '''
+    SELECT x, y, z, radius, status
+      FROM astraeus.crawl_checkpoint
+     WHERE crawl_id = %(crawl_id)s
+       AND status = %(status)s
+     LIMIT %(limit)s
+'''
+CRAWL_CHECKPOINT_UPSERT = '''
+    INSERT INTO astraeus.crawl_checkpoint (crawl_id, x, y, z, radius, status, update_time)
+    VALUES (%(crawl_id)s, %(x)s, %(y)s, %(z)s, %(radius)s, %(status)s, %(update_time)s)
+        ON CONFLICT (crawl_id, x, y, z, radius)
+        DO UPDATE SET status = EXCLUDED.status, update_time = EXCLUDED.update_time
+'''
+CRAWL_CHECKPOINT_DELETE_BY_CRAWL = '''
+    DELETE FROM astraeus.crawl_checkpoint WHERE crawl_id = %(crawl_id)s
+'''
+
+PENDING_STATUS = 'pending'
+IN_FLIGHT_STATUS = 'in_flight'
+DONE_STATUS = 'done'
+# pushed while the crawl frontier was full: waits in the checkpoint until the frontier is drained
+SPILLED_STATUS = 'spilled'
+
+
+class CrawlCheckpointService:
+    _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None):
+        self._io_db = db
+        self._write_buffer = write_buffer
+        self._log = structlog.get_logger()
+
+    @logit
+    @observe_query
+    def read_checkpoint(self, crawl_id: str) -> List[dict]:
+        """
+        Reads every search recorded for a crawl.
+
+        :param crawl_id: The identifier of the crawl.
+        :return: The searches, as dictionaries of `x`, `y`, `z`, `radius` and `status`.
+        """
+        raw_data = self._io_db.exec_db_read(CRAWL_CHECKPOINT_SELECT_BY_CRAWL, {'crawl_id': crawl_id})
+        if raw_data is None:
+            return []
+        return raw_data
+
+    @logit
+    @observe_query
+    def read_searches_by_status(self, crawl_id: str, status: str, limit: int) -> List[dict]:
+        """
+        Reads the searches of a crawl with a status, including the statuses still in the write buffer.
+
+        :param crawl_id: The identifier of the crawl.
+        :param status: The status of the searches to read.
+        :param limit: The maximum number of searches to read.
+        :return: The searches, as dictionaries of `x`, `y`, `z`, `radius` and `status`.
+        """
+        if self._write_buffer is not None:
+            self._write_buffer.flush()
+        raw_data = self._io_db.exec_db_read(CRAWL_CHECKPOINT_SELECT_BY_STATUS,
+                                            {'crawl_id': crawl_id, 'status': status, 'limit': limit})
+        if raw_data is None:
+            return []
+        return raw_data
+
+    @logit
+    @observe_query
+    def save_search_status(self, crawl_id: str, x: float, y: float, z: float, radius: int,
+                           status: str) -> None:
+        """
+        Record the status of a search of a crawl (pending, in_flight, spilled or done).
+
+        :param crawl_id: The identifier of the crawl.
+        :param x: x-axis coordinate of the search center.
+        :param y: y-axis coordinate of the search center.
+        :param z: z-axis coordinate of the search center.
+        :param radius: The radius of the search.
+        :param status: The new status of the search.
+        """
+        params = {
+                'key'        : f'{crawl_id}:{x}:{y}:{z}:{radius}',
+                'crawl_id'   : crawl_id,
+                'x'          : x,
+                'y'          : y,
+                'z'          : z,
+                'radius'     : radius,
+                'status'     : status,
+                'update_time': datetime.now(),
+        }
+        if self._write_buffer is not None:
+            self._write_buffer.add(CRAWL_CHECKPOINT_UPSERT, params)
+        else:
+            self._io_db.exec_db_write(CRAWL_CHECKPOINT_UPSERT, params)
+
+    @logit
+    @observe_query
+    def delete_checkpoint(self, crawl_id: str) -> None:
+        """
+        Delete every search recorded for a crawl.
+
+        :param crawl_id: The identifier of the crawl.
+        """
+        self._io_db.exec_db_write(CRAWL_CHECKPOINT_DELETE_BY_CRAWL, {'crawl_id': crawl_id})
@@ -0,0 +1,133 @@
+import json
+from datetime import datetime
+from typing import Dict, List
+
+import structlog
+from astraeus_common.io.database import Database
+
+from ..utils.log import logit
+from ..utils.metrics import REGISTRY, observe_query
+from ..utils.redaction import redact
+
+SYSTEM_KIND = 'system'
+BODIES_KIND = 'bodies'
+SEARCH_KIND = 'search'
+
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_REPLAY_LIMIT = 100
+
+# the retry delay doubles at each attempt, from one minute up to one day
+DEAD_LETTER_UPSERT = '''
+    INSERT INTO astraeus.edsm_dead_letter (kind, key, payload, error, attempts, created_date,
+                                           next_retry_date)
+    VALUES (%(kind)s, %(key)s, %(payload)s, %(error)s, 1, %(now)s, %(now)s + INTERVAL '1 minute')
+        ON CONFLICT (kind, key)
+        DO UPDATE SET payload = EXCLUDED.payload, error = EXCLUDED.error,
+                      attempts = edsm_dead_letter.attempts + 1,
+                      next_retry_date = EXCLUDED.created_date
+                          + LEAST(INTERVAL '1 minute' * POWER(2, edsm_dead_letter.attempts),
+                                  INTERVAL '1 day')
+'''
+DEAD_LETTER_SELECT_DUE = '''
+    SELECT kind, key, payload, attempts
+      FROM astraeus.edsm_dead_letter
+     WHERE next_retry_date <= %(now)s AND attempts < %(max_attempts)s
+     ORDER BY next_retry_date
+     LIMIT %(limit)s
+'''
+DEAD_LETTER_COUNT_EXHAUSTED = '''
+    SELECT kind, COUNT(*) AS exhausted
+      FROM astraeus.edsm_dead_letter
+     WHERE attempts >= %(max_attempts)s
+     GROUP BY kind
+'''
+DEAD_LETTER_DELETE = '''
+    DELETE FROM astraeus.edsm_dead_letter WHERE kind = %(kind)s AND key = %(key)s
+'''
+
+EXHAUSTED_DEAD_LETTERS = REGISTRY.gauge('edsm_reader_dead_letters_exhausted',
+                                        'Failed refreshes not retried anymore (attempts used up), '
+                                        'by kind', ['kind'])
+
+
+class DeadLetterService:
+    """
+    Durable queue of the refreshes and searches failed on EDSM, to run them again later instead
+    of losing them.
+
+    Written straight to the database, not through the write buffer: a failure is recorded
+    even if the reader stops right after it.
+    """
+    _io_db: Database
+
+    def __init__(self, db: Database):
+        self._io_db = db
+        self._log = structlog.get_logger()
+
+    @logit
+    @observe_query
+    def record_failure(self, kind: str, key: dict, payload: dict, error: Exception) -> None:
+        """
+        Record a failed refresh, or one more failure of a refresh already recorded.
+
+        :param kind: `system`, `bodies` or `search`
+        :param key: The key of the system, or the center and radius of the search.
+        :param payload: What is needed to run the refresh again.
+        :param error: The error of the refresh, stored with the api key masked.
+        """
+        self._io_db.exec_db_write(DEAD_LETTER_UPSERT, {
+                'kind'   : kind,
+                'key'    : json.dumps(key),
+                'payload': json.dumps(payload),
+                'error'  : redact(str(error))[:1000],
+                'now'    : datetime.now(),
+        })
+
+    @logit
+    @observe_query
+    def read_due(self, limit: int = DEFAULT_REPLAY_LIMIT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> List[dict]:
+        """
+        Reads the failed refreshes due for a retry, the longest waiting first.
+
+        :param limit: The maximum number of refreshes read.
+        :param max_attempts: The attempts after which a refresh is not retried anymore.
+        :return: The refreshes, as dictionaries of `kind`, `key`, `payload` and `attempts`.
+        """
+        raw_data = self._io_db.exec_db_read(DEAD_LETTER_SELECT_DUE, {
+                'now'         : datetime.now(),
+                'max_attempts': max_attempts,
+                'limit'       : limit,
+        })
+        if raw_data is None:
+            return []
+        return raw_data
+
+    @logit
+    @observe_query
+    def count_exhausted(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict[str, int]:
+        """
+        Counts the failed refreshes not retried anymore, left in the table to be looked at.
+
+        :param max_attempts: The attempts after which a refresh is not retried anymore.
+        :return: The number of these refreshes, by kind.
+        """
+        raw_data = self._io_db.exec_db_read(DEAD_LETTER_COUNT_EXHAUSTED,
+                                            {'max_attempts': max_attempts})
+        exhausted = {kind: 0 for kind in (SYSTEM_KIND, BODIES_KIND, SEARCH_KIND)}
+        for row in raw_data or []:
+            exhausted[row['kind']] = row['exhausted']
+        for kind, count in exhausted.items():
+            EXHAUSTED_DEAD_LETTERS.set(count, kind=kind)
+        return exhausted
+
+    @logit
+    @observe_query
+    def delete(self, kind: str, key: dict) -> None:
+        """
+        Remove a refresh run again successfully.
+
+        :param kind: `system`, `bodies` or `search`
+        :param key: The key of the system, or the center and radius of the search.
+        """
+        self._io_db.exec_db_write(DEAD_LETTER_DELETE, {'kind': kind, 'key': json.dumps(key)})
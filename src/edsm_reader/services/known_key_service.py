@@ -0,0 +1,32 @@
+from typing import Iterator
+
+import structlog
+
+from ..io.bulk_database import BulkDatabase
+
+# every stored system or body has a sync state
+KNOWN_KEY_ID_SELECT = '''
+    SELECT (key ->> 'id64')::BIGINT
+      FROM astraeus.sync_state
+     WHERE key ? 'id64'
+'''
+
+
+class KnownKeyService:
+    """
+    Keys of the stored systems and bodies, streamed to warm the known key index.
+
+    Runs on a `BulkDatabase`, like the `SystemPositionService`: the keys are read through a
+    server-side cursor instead of being fetched at once.
+    """
+    _io_db: BulkDatabase
+
+    def __init__(self, db: BulkDatabase):
+        self._io_db = db
+        self._log = structlog.get_logger()
+
+    def stream_key_ids(self) -> Iterator[int]:
+        """
+        :return: iterator over the id64 of the stored systems and bodies
+        """
+        return (row[0] for row in self._io_db.stream_db_read(KNOWN_KEY_ID_SELECT, {}))
@@ -0,0 +1,168 @@
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+import structlog
+from astraeus_common.io.database import Database
+
+from ..io.write_buffer import WriteBuffer
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+# `entity_key` instead of `key`: the write buffer must keep every increment of a same system
+REFRESH_STAT_UPSERT = '''
+    INSERT INTO astraeus.refresh_stat (key, change_count, checked_date, x, y, z)
+    VALUES (%(entity_key)s, %(changes)s, %(checked_date)s, %(x)s, %(y)s, %(z)s)
+        ON CONFLICT (key)
+        DO UPDATE SET change_count = refresh_stat.change_count + EXCLUDED.change_count,
+                      checked_date = COALESCE(EXCLUDED.checked_date, refresh_stat.checked_date),
+                      x            = COALESCE(EXCLUDED.x, refresh_stat.x),
+                      y            = COALESCE(EXCLUDED.y, refresh_stat.y),
+                      z            = COALESCE(EXCLUDED.z, refresh_stat.z)
+'''
+# the priority is only computed over the stalest systems and the stalest ones of the hot regions,
+# both read through an index (`checked_date` is the date of the last refresh, NULL if never done),
+# instead of over the whole galaxy
+REFRESH_CANDIDATES_SELECT = '''
+    SELECT r.key, r.change_count,
+           EXTRACT(EPOCH FROM now() - r.checked_date) / 3600 AS age_hours
+      FROM ((SELECT key, change_count, checked_date, x, y, z
+               FROM astraeus.refresh_stat
+              ORDER BY checked_date NULLS FIRST
+              LIMIT %(window)s)
+            UNION
+            (SELECT key, change_count, checked_date, x, y, z
+               FROM astraeus.refresh_stat r
+              WHERE {hot_box_condition}
+              ORDER BY checked_date NULLS FIRST
+              LIMIT %(window)s)) r
+     ORDER BY EXTRACT(EPOCH FROM now() - r.checked_date) / 3600
+              * (1 + %(change_weight)s * r.change_count)
+              * (CASE WHEN {hot_condition} THEN %(hot_region_weight)s ELSE 1 END) DESC NULLS FIRST
+     LIMIT %(limit)s
+'''
+HOT_REGION_CONDITION = '''
+    (r.x - %(hot_x_{index})s) ^ 2 + (r.y - %(hot_y_{index})s) ^ 2 + (r.z - %(hot_z_{index})s) ^ 2
+        <= %(hot_radius_{index})s ^ 2
+'''
+# the box around a hot region, matched through the index of `x`
+HOT_REGION_BOX_CONDITION = '''
+    (r.x BETWEEN %(hot_x_{index})s - %(hot_radius_{index})s
+             AND %(hot_x_{index})s + %(hot_radius_{index})s
+     AND r.y BETWEEN %(hot_y_{index})s - %(hot_radius_{index})s
+                 AND %(hot_y_{index})s + %(hot_radius_{index})s
+     AND r.z BETWEEN %(hot_z_{index})s - %(hot_radius_{index})s
+                 AND %(hot_z_{index})s + %(hot_radius_{index})s)
+'''
+# the stalest systems read for each candidate, among which the priority picks the candidates
+DEFAULT_CANDIDATE_WINDOW = 10
+
+# a hot region, as (x, y, z, radius)
+HotRegion = Tuple[float, float, float, float]
+
+
+class RefreshStatService:
+    _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None):
+        self._io_db = db
+        self._write_buffer = write_buffer
+        self._log = structlog.get_logger()
+
+    @logit
+    @observe_query
+    def read_refresh_candidates(self, limit: int,
+                                hot_regions: Sequence[HotRegion] = (),
+                                change_weight: float = 1.0,
+                                hot_region_weight: float = 1.0,
+                                candidate_window: int = DEFAULT_CANDIDATE_WINDOW) -> List[dict]:
+        """
+        Reads the systems most worth a refresh, by descending priority.
+
+        The priority grows with the hours since the system was last refreshed,
+        with the number of changes seen so far, and is boosted inside the hot regions.
+        It is computed over the `limit * candidate_window` stalest systems, and as many of the
+        stalest ones of the hot regions.
+
+        :param limit: The maximum number of systems to read.
+        :param hot_regions: The regions to keep fresher, as (x, y, z, radius).
+        :param change_weight: The weight of each change seen so far.
+        :param hot_region_weight: The factor applied to the priority inside a hot region.
+        :param candidate_window: The stalest systems read for each system returned.
+        :return: The systems, as dictionaries of `key`, `change_count` and `age_hours`.
+        """
+        params = {'limit': limit, 'window': limit * candidate_window,
+                  'change_weight': change_weight, 'hot_region_weight': hot_region_weight}
+        conditions = []
+        box_conditions = []
+        for index, (x, y, z, radius) in enumerate(hot_regions):
+            conditions.append(HOT_REGION_CONDITION.format(index=index))
+            box_conditions.append(HOT_REGION_BOX_CONDITION.format(index=index))
+            params.update({f'hot_x_{index}': x, f'hot_y_{index}': y, f'hot_z_{index}': z,
+                           f'hot_radius_{index}': radius})
+        hot_condition = ' OR '.join(conditions) if len(conditions) > 0 else 'FALSE'
+        hot_box_condition = ' OR '.join(box_conditions) if len(box_conditions) > 0 else 'FALSE'
+
+        raw_data = self._io_db.exec_db_read(
+                REFRESH_CANDIDATES_SELECT.format(hot_condition=hot_condition,
+                                                 hot_box_condition=hot_box_condition), params)
+        if raw_data is None:
+            return []
+        return raw_data
+
+    @logit
+    @observe_query
+    def record_change(self, key: dict, coords: Optional[dict] = None) -> None:
+        """
+        Record a change of a system (or of one of its bodies), just refreshed.
+
+        :param key: The key of the system.
+        :param coords: The coordinates of the system, if known.
+        """
+        self.__save(key, 1, coords, datetime.now())
+
+    @logit
+    @observe_query
+    def record_position(self, key: dict, coords: Optional[dict]) -> None:
+        """
+        Record a system just created, with its coordinates used to match the hot regions.
+
+        :param key: The key of the system.
+        :param coords: The coordinates of the system, if known.
+        """
+        self.__save(key, 0, coords, datetime.now())
+
+    @logit
+    @observe_query
+    def record_check(self, key: dict) -> None:
+        """
+        Record that a system was just refreshed, whether it changed or not.
+
+        :param key: The key of the system.
+        """
+        self.__save(key, 0, None, datetime.now())
+
+    @staticmethod
+    def stat_params(key: dict, changes: int, coords: Optional[dict] = None,
+                    checked_date: Optional[datetime] = None) -> dict:
+        """
+        :return: the parameters of `REFRESH_STAT_UPSERT`
+        """
+        coords = coords or {}
+        return {
+                'entity_key'  : json.dumps(key),
+                'changes'     : changes,
+                'checked_date': checked_date,
+                'x'           : coords.get('x'),
+                'y'           : coords.get('y'),
+                'z'           : coords.get('z'),
+        }
+
+    def __save(self, key: dict, changes: int, coords: Optional[dict],
+               checked_date: Optional[datetime] = None) -> None:
+        params = self.stat_params(key, changes, coords, checked_date)
+        if self._write_buffer is not None:
+            self._write_buffer.add(REFRESH_STAT_UPSERT, params)
+        else:
+            self._io_db.exec_db_write(REFRESH_STAT_UPSERT, params)
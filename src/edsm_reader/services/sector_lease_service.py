@@ -0,0 +1,172 @@
+from typing import Iterable, Optional
+
+import structlog
+
+from ..io.bulk_database import BulkDatabase
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+
+SECTOR_LEASE_INSERT = '''
+    INSERT INTO astraeus.sector_lease (scan_id, sector_id, x, y, z, size, status)
+    VALUES (%(scan_id)s, %(sector_id)s, %(x)s, %(y)s, %(z)s, %(size)s, 'pending')
+        ON CONFLICT (scan_id, sector_id) DO NOTHING
+'''
+# a pending sector, or one whose owner stopped renewing its lease
+SECTOR_LEASE_CLAIM = '''
+    UPDATE astraeus.sector_lease
+       SET status      = 'leased',
+           owner       = %(owner)s,
+           lease_until = now() + make_interval(secs => %(duration)s),
+           update_time = now()
+     WHERE scan_id = %(scan_id)s
+       AND sector_id = (SELECT sector_id
+                          FROM astraeus.sector_lease
+                         WHERE scan_id = %(scan_id)s
+                           AND (status = 'pending' OR (status = 'leased' AND lease_until < now()))
+                         ORDER BY (x + size / 2) ^ 2 + (y + size / 2) ^ 2 + (z + size / 2) ^ 2
+                         LIMIT 1
+                           FOR UPDATE SKIP LOCKED)
+    RETURNING sector_id, x, y, z, size
+'''
+SECTOR_LEASE_RENEW = '''
+    UPDATE astraeus.sector_lease
+       SET lease_until = now() + make_interval(secs => %(duration)s),
+           update_time = now()
+     WHERE scan_id = %(scan_id)s AND sector_id = %(sector_id)s AND owner = %(owner)s
+       AND status = 'leased'
+    RETURNING sector_id
+'''
+SECTOR_LEASE_SET_STATUS = '''
+    UPDATE astraeus.sector_lease
+       SET status      = %(status)s,
+           owner       = CASE WHEN %(status)s = 'done' THEN owner END,
+           lease_until = NULL,
+           update_time = now()
+     WHERE scan_id = %(scan_id)s AND sector_id = %(sector_id)s AND owner = %(owner)s
+    RETURNING sector_id
+'''
+SECTOR_LEASE_COUNT_UNFINISHED = '''
+    SELECT count(*) AS unfinished
+      FROM astraeus.sector_lease
+     WHERE scan_id = %(scan_id)s AND status <> 'done'
+'''
+SECTOR_LEASE_RESET_DONE = '''
+    UPDATE astraeus.sector_lease
+       SET status      = 'pending',
+           owner       = NULL,
+           update_time = now()
+     WHERE scan_id = %(scan_id)s AND status = 'done'
+    RETURNING sector_id
+'''
+
+PENDING_STATUS = 'pending'
+DONE_STATUS = 'done'
+
+
+class SectorLeaseService:
+    """
+    Leases of the sectors of the galaxy, shared by the reader instances of a sharded scan.
+    The sectors of each scan (region and sector size) are kept apart by its `scan_id`.
+
+    Runs on a `BulkDatabase`: its reads are committed, so a claim (an update returning
+    the sector claimed) is visible to the other instances at once.
+    """
+    _io_db: BulkDatabase
+
+    def __init__(self, db: BulkDatabase):
+        self._io_db = db
+        self._log = structlog.get_logger()
+
+    @logit
+    @observe_query
+    def create_sectors(self, scan_id: str, sectors: Iterable) -> None:
+        """
+        Register the sectors to scan, the ones already registered are left untouched.
+
+        :param scan_id: The identifier of the sharded scan.
+        :param sectors: The sectors (`SectorBox`) to register.
+        """
+        self._io_db.exec_db_batch([(SECTOR_LEASE_INSERT, [
+                {'scan_id'  : scan_id,
+                 'sector_id': sector.sector_id,
+                 'x'        : sector.lower[0],
+                 'y'        : sector.lower[1],
+                 'z'        : sector.lower[2],
+                 'size'     : sector.size} for sector in sectors])])
+
+    @logit
+    @observe_query
+    def claim_sector(self, scan_id: str, owner: str, duration: int) -> Optional[dict]:
+        """
+        Lease the nearest sector to `Sol` not scanned yet, skipping the ones locked by other instances.
+
+        :param scan_id: The identifier of the sharded scan.
+        :param owner: The identifier of the instance.
+        :param duration: The duration of the lease, in seconds.
+        :return: The sector claimed, as a dictionary of `sector_id`, `x`, `y`, `z` and `size`,
+                 or None if there is none left.
+        """
+        raw_data = self._io_db.exec_db_read(SECTOR_LEASE_CLAIM, {'scan_id' : scan_id,
+                                                                 'owner'   : owner,
+                                                                 'duration': duration})
+        if raw_data is None or len(raw_data) == 0:
+            return None
+        return raw_data[0]
+
+    @logit
+    def renew_sector(self, scan_id: str, sector_id: str, owner: str, duration: int) -> bool:
+        """
+        Extend the lease of a sector.
+
+        :return: False if the sector is not leased by `owner` anymore.
+        """
+        return len(self._io_db.exec_db_read(SECTOR_LEASE_RENEW, {'scan_id'  : scan_id,
+                                                                 'sector_id': sector_id,
+                                                                 'owner'    : owner,
+                                                                 'duration' : duration})) > 0
+
+    @logit
+    def complete_sector(self, scan_id: str, sector_id: str, owner: str) -> bool:
+        """
+        Mark a sector as scanned.
+
+        :return: False if the sector is not leased by `owner` anymore.
+        """
+        return self.__set_status(scan_id, sector_id, owner, DONE_STATUS)
+
+    @logit
+    def release_sector(self, scan_id: str, sector_id: str, owner: str) -> bool:
+        """
+        Hand a sector back, to be claimed again.
+
+        :return: False if the sector is not leased by `owner` anymore.
+        """
+        return self.__set_status(scan_id, sector_id, owner, PENDING_STATUS)
+
+    @logit
+    @observe_query
+    def count_unfinished(self, scan_id: str) -> int:
+        """
+        :param scan_id: The identifier of the sharded scan.
+        :return: The number of sectors of the scan not scanned yet, leased or not.
+        """
+        return self._io_db.exec_db_read(SECTOR_LEASE_COUNT_UNFINISHED,
+                                        {'scan_id': scan_id})[0]['unfinished']
+
+    @logit
+    @observe_query
+    def reset_sectors(self, scan_id: str) -> int:
+        """
+        Mark the sectors of a scan already scanned as pending again, to scan its region again.
+        The sectors leased are left to their owner.
+
+        :param scan_id: The identifier of the sharded scan.
+        :return: The number of sectors reset.
+        """
+        return len(self._io_db.exec_db_read(SECTOR_LEASE_RESET_DONE, {'scan_id': scan_id}) or [])
+
+    def __set_status(self, scan_id: str, sector_id: str, owner: str, status: str) -> bool:
+        return len(self._io_db.exec_db_read(SECTOR_LEASE_SET_STATUS, {'scan_id'  : scan_id,
+                                                                      'sector_id': sector_id,
+                                                                      'owner'    : owner,
+                                                                      'status'   : status})) > 0
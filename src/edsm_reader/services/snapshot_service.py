@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+from typing import Iterator, Tuple
+
+import structlog
+
+from ..io.bulk_database import BulkDatabase
+
+# the positions of the systems synced in a time range, from the coordinates of the systems
+SNAPSHOT_SYSTEM_SELECT = '''
+    SELECT (sy.key ->> 'id64')::BIGINT,
+           (sy.coords::JSONB ->> 'x')::DOUBLE PRECISION,
+           (sy.coords::JSONB ->> 'y')::DOUBLE PRECISION,
+           (sy.coords::JSONB ->> 'z')::DOUBLE PRECISION
+      FROM astraeus.system sy
+      JOIN astraeus.sync_state s ON s.key = sy.key
+     WHERE sy.coords IS NOT NULL AND sy.key ? 'id64'
+       AND s.sync_date > %(since)s AND s.sync_date <= %(until)s
+'''
+SNAPSHOT_BODY_SELECT = '''
+    SELECT row_to_json(b)::TEXT
+      FROM astraeus.body b
+      JOIN astraeus.sync_state s ON s.key = b.key
+     WHERE s.sync_date > %(since)s AND s.sync_date <= %(until)s
+'''
+
+
+class SnapshotService:
+    """
+    Systems and bodies synced in a time range, streamed to export the columnar snapshots.
+
+    Runs on a `BulkDatabase`, like the `SystemPositionService`: the rows are read through a
+    server-side cursor instead of being fetched at once.
+    """
+    _io_db: BulkDatabase
+
+    def __init__(self, db: BulkDatabase):
+        self._io_db = db
+        self._log = structlog.get_logger()
+
+    def stream_system_positions(self, since: datetime,
+                                until: datetime) -> Iterator[Tuple[int, float, float, float]]:
+        """
+        :param since: the sync date after which the systems are read (excluded)
+        :param until: the sync date up to which the systems are read (included)
+        :return: iterator over the positions of the systems, as (id64, x, y, z)
+        """
+        return self._io_db.stream_db_read(SNAPSHOT_SYSTEM_SELECT, {'since': since, 'until': until})
+
+    def stream_bodies(self, since: datetime, until: datetime) -> Iterator[dict]:
+        """
+        :param since: the sync date after which the bodies are read (excluded)
+        :param until: the sync date up to which the bodies are read (included)
+        :return: iterator over the bodies, as dictionaries of their columns
+        """
+        return (json.loads(row[0]) for row in
+                self._io_db.stream_db_read(SNAPSHOT_BODY_SELECT, {'since': since, 'until': until}))
@@ -1,21 +1,37 @@
 import json
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 import structlog
-from astraeus_common.decorator.logit import logit
 from astraeus_common.io.database import Database
 from astraeus_common.models.sync_state import SyncState
 
+from ..io.write_buffer import WriteBuffer
+from ..utils.known_key_index import KnownKeyIndex
+from ..utils.log import logit
+from ..utils.metrics import REGISTRY, observe_query
+
+SYNC_STATE_SELECT_BY_KEYS = 'SELECT * FROM astraeus.sync_state WHERE key = ANY(%(keys)s::jsonb[])'
+PREPARED_STATEMENTS = (SyncState.SYNC_STATE_SELECT_BY_KEY, SyncState.SYNC_STATE_INSERT)
+
+SKIPPED_LOOKUPS = REGISTRY.counter('edsm_reader_sync_state_lookups_skipped_total',
+                                   'Sync state lookups skipped for keys absent of the known key index')
+
 
 class SyncStateService:
     _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+    _known_keys: Optional[KnownKeyIndex]
 
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None,
+                 known_keys: Optional[KnownKeyIndex] = None):
         self._io_db = db
+        self._write_buffer = write_buffer
+        self._known_keys = known_keys
         self._log = structlog.get_logger()
 
     @logit
+    @observe_query
     def read_sync_state_by_key(self, key: dict) -> Optional[SyncState]:
         """
         Reads the sync state by key.
@@ -23,14 +39,39 @@ class SyncStateService:
         :param key: A dictionary representing the key to query for the sync state.
         :return: An optional `SyncState` object if the sync state is found, otherwise returns `None`.
         """
+        if self._known_keys is not None and not self._known_keys.may_contain(key):
+            SKIPPED_LOOKUPS.inc()
+            return None
         raw_data = self._io_db.exec_db_read(SyncState.SYNC_STATE_SELECT_BY_KEY, {'key': json.dumps(key)})
         if raw_data is not None and len(raw_data) > 0:
             return SyncState(raw_data[0])
         else:
-            self._log.debug(f'No {SyncState.__name__} found')
+            self._log.debug('No %s found', SyncState.__name__)
             return None
 
     @logit
+    @observe_query
+    def read_sync_states_by_keys(self, keys: List[dict]) -> List[SyncState]:
+        """
+        Reads all the sync states matching a list of keys, in a single query.
+
+        :param keys: A list of dictionaries representing the keys to query for.
+        :return: The list of `SyncState` found, keys without sync state are omitted.
+        """
+        if self._known_keys is not None:
+            known = [key for key in keys if self._known_keys.may_contain(key)]
+            SKIPPED_LOOKUPS.inc(len(keys) - len(known))
+            keys = known
+        if len(keys) == 0:
+            return []
+        raw_data = self._io_db.exec_db_read(SYNC_STATE_SELECT_BY_KEYS,
+                                            {'keys': [json.dumps(key) for key in keys]})
+        if raw_data is None:
+            return []
+        return [SyncState(row) for row in raw_data]
+
+    @logit
+    @observe_query
     def create_sync_state(self, sync_state: SyncState) -> None:
         """
         Create a sync state in the database.
@@ -39,9 +80,12 @@ class SyncStateService:
         :type sync_state: SyncState
         """
         sync_state.sync_date = datetime.now()
-        self._io_db.exec_db_write(SyncState.SYNC_STATE_INSERT, sync_state.to_dict_for_db())
+        self.__write(SyncState.SYNC_STATE_INSERT, sync_state.to_dict_for_db())
+        if self._known_keys is not None:
+            self._known_keys.add(sync_state.key)
 
     @logit
+    @observe_query
     def update_sync_state(self, sync_state: SyncState) -> None:
         """
         Update the sync state.
@@ -50,9 +94,10 @@ class SyncStateService:
         :type sync_state: SyncState
         """
         sync_state.sync_date = datetime.now()
-        self._io_db.exec_db_write(SyncState.SYNC_STATE_UPDATE_BY_KEY, sync_state.to_dict_for_db())
+        self.__write(SyncState.SYNC_STATE_UPDATE_BY_KEY, sync_state.to_dict_for_db())
 
     @logit
+    @observe_query
     def delete_sync_state_by_key(self, key: dict) -> None:
         """
         Delete the sync state by key.
@@ -60,3 +105,9 @@ class SyncStateService:
         :param key: The key for the sync state to be deleted.
         """
         self._io_db.exec_db_write(SyncState.SYNC_STATE_DELETE_BY_KEY, {'key': json.dumps(key)})
+
+    def __write(self, query: str, params: dict) -> None:
+        if self._write_buffer is not None:
+            self._write_buffer.add(query, params)
+        else:
+            self._io_db.exec_db_write(query, params)
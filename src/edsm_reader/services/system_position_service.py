@@ -0,0 +1,32 @@
+from typing import Iterator, Tuple
+
+import structlog
+
+from ..io.bulk_database import BulkDatabase
+
+# the positions are recorded with the refresh statistics, for every system created or loaded
+SYSTEM_POSITION_SELECT = '''
+    SELECT (key ->> 'id64')::BIGINT, x, y, z
+      FROM astraeus.refresh_stat
+     WHERE x IS NOT NULL AND key ? 'id64'
+'''
+
+
+class SystemPositionService:
+    """
+    Positions of the stored systems, streamed to build the spatial index.
+
+    Runs on a `BulkDatabase`: the positions of the whole galaxy are read through a
+    server-side cursor instead of being fetched at once.
+    """
+    _io_db: BulkDatabase
+
+    def __init__(self, db: BulkDatabase):
+        self._io_db = db
+        self._log = structlog.get_logger()
+
+    def stream_positions(self) -> Iterator[Tuple[int, float, float, float]]:
+        """
+        :return: iterator over the positions of the stored systems, as (id64, x, y, z)
+        """
+        return self._io_db.stream_db_read(SYSTEM_POSITION_SELECT, {})
@@ -1,21 +1,35 @@
 import json
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 import structlog
-from astraeus_common.decorator.logit import logit
 from astraeus_common.io.database import Database
 from astraeus_common.models.system import System
 
+from ..io.write_buffer import WriteBuffer
+from ..utils.log import logit
+from ..utils.metrics import observe_query
+from ..utils.spatial_index import SpatialIndex
+
+SYSTEM_SELECT_BY_KEYS = 'SELECT * FROM astraeus.system WHERE key = ANY(%(keys)s::jsonb[])'
+# the hot queries of the services, prepared once per pooled connection
+PREPARED_STATEMENTS = (System.SYSTEM_SELECT_BY_KEY, System.SYSTEM_INSERT)
+
 
 class SystemService:
     _io_db: Database
+    _write_buffer: Optional[WriteBuffer]
+    _spatial_index: Optional[SpatialIndex]
 
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, write_buffer: Optional[WriteBuffer] = None,
+                 spatial_index: Optional[SpatialIndex] = None):
         self._io_db = db
+        self._write_buffer = write_buffer
+        self._spatial_index = spatial_index
         self._log = structlog.get_logger()
 
     @logit
+    @observe_query
     def read_system_by_key(self, key: dict) -> Optional[System]:
         """
         This method reads a system record by key from the database.
@@ -29,10 +43,30 @@ class SystemService:
         if raw_data is not None and len(raw_data) > 0:
             return System(raw_data[0])
         else:
-            self._log.debug(f'No {System.__name__} found')
+            self._log.debug('No %s found', System.__name__)
             return None
 
     @logit
+    @observe_query
+    def read_systems_by_keys(self, keys: List[dict]) -> List[System]:
+        """
+        Reads all the systems matching a list of keys, in a single query.
+
+        :param keys: The keys to search for in the database.
+        :type keys: List[Dict]
+        :return: The systems found, keys without system are omitted.
+        :rtype: List[System]
+        """
+        if len(keys) == 0:
+            return []
+        raw_data = self._io_db.exec_db_read(SYSTEM_SELECT_BY_KEYS,
+                                            {'keys': [json.dumps(key) for key in keys]})
+        if raw_data is None:
+            return []
+        return [System(row) for row in raw_data]
+
+    @logit
+    @observe_query
     def create_system(self, system: System) -> None:
         """
         Adds a new system to the database.
@@ -41,9 +75,11 @@ class SystemService:
         :type system: System
         """
         system.update_time = datetime.now()
-        self._io_db.exec_db_write(System.SYSTEM_INSERT, system.to_dict_for_db())
+        self.__write(System.SYSTEM_INSERT, system.to_dict_for_db())
+        self.__index(system)
 
     @logit
+    @observe_query
     def update_system_by_key(self, system: System) -> None:
         """
         Updates the system by key in the database.
@@ -52,9 +88,11 @@ class SystemService:
         :type system: System
         """
         system.update_time = datetime.now()
-        self._io_db.exec_db_write(System.SYSTEM_UPDATE_BY_KEY, system.to_dict_for_db())
+        self.__write(System.SYSTEM_UPDATE_BY_KEY, system.to_dict_for_db())
+        self.__index(system)
 
     @logit
+    @observe_query
     def delete_system_by_key(self, key: dict) -> None:
         """
         Deletes a system from the database based on the given key.
@@ -63,3 +101,24 @@ class SystemService:
         :type key: dict
         """
         self._io_db.exec_db_write(System.SYSTEM_DELETE_BY_KEY, {'key': json.dumps(key)})
+
+    def __index(self, system: System) -> None:
+        if self._spatial_index is None:
+            return
+        key = self.__as_dict(getattr(system, 'key', None))
+        coords = self.__as_dict(getattr(system, 'coords', None))
+        if key is not None and 'id64' in key and coords is not None:
+            self._spatial_index.add(key['id64'], coords['x'], coords['y'], coords['z'])
+
+    @staticmethod
+    def __as_dict(value) -> Optional[dict]:
+        # stored as json in the database, as a dictionary once read from EDSM
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def __write(self, query: str, params: dict) -> None:
+        if self._write_buffer is not None:
+            self._write_buffer.add(query, params)
+        else:
+            self._io_db.exec_db_write(query, params)
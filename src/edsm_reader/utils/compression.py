@@ -0,0 +1,39 @@
+import zlib
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is an optional speed-up, zlib is used otherwise
+    zstandard = None
+
+ZSTD_CODEC = 'zstd'
+ZLIB_CODEC = 'zlib'
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """
+    Compress with zstd when installed, zlib otherwise
+    :param data: the bytes to compress
+    :return: (codec used, compressed bytes), the codec is needed to decompress them
+    """
+    if zstandard is not None:
+        return ZSTD_CODEC, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return ZLIB_CODEC, zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """
+    :param codec: the codec returned by `compress`
+    :param data: the compressed bytes
+    :return: the original bytes
+    """
+    if codec == ZLIB_CODEC:
+        return zlib.decompress(data)
+    if codec == ZSTD_CODEC:
+        if zstandard is None:
+            raise RuntimeError('The data is compressed with zstd, install it with `pip install zstandard`')
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f'Unknown compression codec `{codec}`, expected one of {[ZSTD_CODEC, ZLIB_CODEC]}')
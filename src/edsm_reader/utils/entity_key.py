@@ -0,0 +1,19 @@
+import json
+
+
+def key_of(data: dict) -> dict:
+    """
+    Build the key of an EDSM entity (system or body)
+    :param data: the EDSM entity
+    :return: the key as stored in database
+    """
+    return {'id': data['id'], 'id64': data['id64']}
+
+
+def key_to_str(key: dict) -> str:
+    """
+    Serialize a key into a stable string, usable as dictionary key
+    :param key: the key to serialize
+    :return: the serialized key
+    """
+    return json.dumps(key, sort_keys=True)
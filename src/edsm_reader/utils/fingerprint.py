@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterable, Optional
+
+LEGACY_ALGORITHM = 'legacy'
+BLAKE2B_ALGORITHM = 'blake2b'
+SHA256_ALGORITHM = 'sha256'
+
+DEFAULT_ALGORITHM = BLAKE2B_ALGORITHM
+# the algorithm of the hashes stored by previous versions: a stored hash which is the previous
+# fingerprint of an unchanged entity is replaced, without seeing the entity as changed
+DEFAULT_PREVIOUS_ALGORITHM = LEGACY_ALGORITHM
+# fields changing on EDSM side without any change of the entity itself, or depending on the
+# request (the distance to the center of a sphere search); not left out of the legacy
+# fingerprint, which covered them
+DEFAULT_IGNORED_FIELDS = ('updateTime', 'distance')
+# fields of the stored entities left out of the change deltas
+DELTA_IGNORED_FIELDS = ('update_time',)
+
+
+def _canonical_bytes(data: dict) -> bytes:
+    # a single encoder, whatever is installed: the same entity must always give the same bytes
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                      default=str).encode('utf-8')
+
+
+def _legacy_bytes(data: dict) -> bytes:
+    return bytes(json.dumps(data, sort_keys=True, default=str), 'utf-8')
+
+
+HASH_FUNCTIONS: Dict[str, Callable[[dict], str]] = {
+        # the historical fingerprint, kept to stay compatible with the hashes already stored
+        LEGACY_ALGORITHM : lambda data: hashlib.sha256(_legacy_bytes(data)).hexdigest(),
+        BLAKE2B_ALGORITHM: lambda data: hashlib.blake2b(_canonical_bytes(data),
+                                                        digest_size=16).hexdigest(),
+        SHA256_ALGORITHM : lambda data: hashlib.sha256(_canonical_bytes(data)).hexdigest(),
+}
+
+
+class Fingerprinter:
+    """
+    Compute the fingerprint of an EDSM entity, used to detect its changes.
+
+    The entity is encoded canonically (sorted keys, compact utf-8 json) without its volatile
+    fields, then hashed with the chosen algorithm.
+
+    The algorithm can be switched without seeing every stored entity as changed: a stored
+    hash which differs from the fingerprint is checked against the previous algorithm, and
+    the entity is unchanged if it matches (see `matches_previous`).
+    """
+    _hash_function: Callable[[dict], str]
+    _ignored_fields: frozenset
+    _previous: Optional['Fingerprinter']
+
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM,
+                 ignored_fields: Optional[Iterable[str]] = None,
+                 previous_algorithm: Optional[str] = DEFAULT_PREVIOUS_ALGORITHM):
+        """
+        :param algorithm: one of `legacy`, `blake2b` or `sha256`
+        :param ignored_fields: top-level fields left out of the fingerprint, by default none
+                               for `legacy` and `updateTime` and `distance` for the others
+        :param previous_algorithm: the algorithm of the hashes stored before a switch, None
+                                   once they are all replaced
+        """
+        if algorithm not in HASH_FUNCTIONS:
+            raise ValueError(f'Unknown fingerprint algorithm `{algorithm}`, '
+                             f'expected one of {sorted(HASH_FUNCTIONS)}')
+        if ignored_fields is None:
+            ignored_fields = () if algorithm == LEGACY_ALGORITHM else DEFAULT_IGNORED_FIELDS
+        self._hash_function = HASH_FUNCTIONS[algorithm]
+        self._ignored_fields = frozenset(ignored_fields)
+        self._previous = None
+        if previous_algorithm is not None and previous_algorithm != algorithm:
+            self._previous = Fingerprinter(previous_algorithm, previous_algorithm=None)
+
+    @classmethod
+    def from_env(cls) -> 'Fingerprinter':
+        """
+        Build the fingerprinter from `EDSM_FINGERPRINT_ALGORITHM`,
+        `EDSM_FINGERPRINT_IGNORED_FIELDS` (comma separated) and
+        `EDSM_FINGERPRINT_PREVIOUS_ALGORITHM` (empty for none) environment variables
+        """
+        algorithm = os.getenv('EDSM_FINGERPRINT_ALGORITHM', default=DEFAULT_ALGORITHM)
+        previous_algorithm = os.getenv('EDSM_FINGERPRINT_PREVIOUS_ALGORITHM',
+                                       default=DEFAULT_PREVIOUS_ALGORITHM) or None
+        ignored_fields = os.getenv('EDSM_FINGERPRINT_IGNORED_FIELDS')
+        if ignored_fields is not None:
+            ignored_fields = [field.strip() for field in ignored_fields.split(',') if field.strip()]
+        return cls(algorithm, ignored_fields, previous_algorithm)
+
+    def fingerprint(self, data: dict) -> str:
+        """
+        :param data: the EDSM entity
+        :return: the fingerprint of the entity
+        """
+        if self._ignored_fields and not self._ignored_fields.isdisjoint(data):
+            data = {key: value for key, value in data.items() if key not in self._ignored_fields}
+        return self._hash_function(data)
+
+    def matches_previous(self, data: dict, stored_hash: str) -> bool:
+        """
+        Whether a stored hash, different from the fingerprint of the entity, is its fingerprint
+        with the previous algorithm: the entity is unchanged, only its hash is to be replaced.
+        Only computed on a mismatch, so it costs nothing once the stored hashes are replaced.
+        :param data: the EDSM entity
+        :param stored_hash: the hash stored with the entity
+        :return: whether the entity is unchanged
+        """
+        return self._previous is not None and self._previous.fingerprint(data) == stored_hash
+
+
+_default_fingerprinter: Optional[Fingerprinter] = None
+
+
+def _default() -> Fingerprinter:
+    global _default_fingerprinter
+    if _default_fingerprinter is None:
+        _default_fingerprinter = Fingerprinter.from_env()
+    return _default_fingerprinter
+
+
+def fingerprint_of(data: dict) -> str:
+    """
+    Fingerprint of an entity with the fingerprinter configured by the environment
+    :param data: the EDSM entity
+    :return: the fingerprint of the entity
+    """
+    return _default().fingerprint(data)
+
+
+def matches_previous_of(data: dict, stored_hash: str) -> bool:
+    """
+    `Fingerprinter.matches_previous` with the fingerprinter configured by the environment
+    :param data: the EDSM entity
+    :param stored_hash: the hash stored with the entity
+    :return: whether the entity is unchanged
+    """
+    return _default().matches_previous(data, stored_hash)
+
+
+def compute_delta(previous: dict, current: dict, ignored_fields: Iterable[str] = ()) -> dict:
+    """
+    Fields changed between two states of an entity
+    :param previous: the previous state
+    :param current: the current state
+    :param ignored_fields: fields left out of the comparison
+    :return: the previous value of every changed field (None for a field added)
+    """
+    ignored = set(ignored_fields)
+    delta = {}
+    for field in previous.keys() | current.keys():
+        if field in ignored:
+            continue
+        if previous.get(field) != current.get(field):
+            delta[field] = previous.get(field)
+    return delta
@@ -0,0 +1,18 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    """
+    Decode a json document, with orjson when installed
+    :param content: the raw json document
+    :return: the decoded document
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
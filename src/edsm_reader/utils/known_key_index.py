@@ -0,0 +1,159 @@
+import math
+from threading import Lock
+from typing import Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy only speeds up the initial load
+    np = None
+
+DEFAULT_INITIAL_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 0.01
+# each new filter is twice as large, with a tighter error rate, so the overall rate stays bounded
+_GROWTH = 2
+_TIGHTENING = 0.5
+_MASK_64 = (1 << 64) - 1
+_LOAD_CHUNK_SIZE = 100000
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finalizer: spreads the bits of consecutive id64s over the whole word
+    value = (value + 0x9E3779B97F4A7C15) & _MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+class _BloomFilter:
+    capacity: int
+    count: int
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def add(self, id64: int) -> None:
+        for position in self.__positions(_mix(id64 & _MASK_64)):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def add_many(self, ids: 'np.ndarray') -> None:
+        mixed = ids.astype(np.uint64)
+        with np.errstate(over='ignore'):
+            mixed = mixed + np.uint64(0x9E3779B97F4A7C15)
+            mixed = (mixed ^ (mixed >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            mixed = (mixed ^ (mixed >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            mixed = mixed ^ (mixed >> np.uint64(31))
+            first = mixed & np.uint64(0xFFFFFFFF)
+            second = (mixed >> np.uint64(32)) | np.uint64(1)
+            bits = np.frombuffer(self._bits, dtype=np.uint8)
+            for index in range(self._hashes):
+                positions = (first + np.uint64(index) * second) % np.uint64(self._size)
+                np.bitwise_or.at(bits, (positions >> np.uint64(3)).astype(np.int64),
+                                 (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self.count += len(ids)
+
+    def __contains__(self, id64: int) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self.__positions(_mix(id64 & _MASK_64)))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def __positions(self, mixed: int) -> Iterable[int]:
+        # double hashing: k positions out of the two halves of one 64 bits hash
+        first, second = mixed & 0xFFFFFFFF, (mixed >> 32) | 1
+        return ((first + index * second) % self._size for index in range(self._hashes))
+
+
+class KnownKeyIndex:
+    """
+    Compact membership index of the id64 of the stored systems and bodies (they never collide).
+
+    A scalable bloom filter: a key not in the index is certainly not stored, so its lookup in
+    the database can be skipped; a key in the index is only probably stored (`error_rate`).
+    A few bytes per key at 1%, where a python set of id64 costs about 60.
+    The index only knows the keys stored by this process: it must not be shared with other
+    instances writing the same entities.
+    """
+    _filters: List[_BloomFilter]
+
+    def __init__(self, initial_capacity: int = DEFAULT_INITIAL_CAPACITY,
+                 error_rate: float = DEFAULT_ERROR_RATE):
+        """
+        :param initial_capacity: the number of keys of the first filter
+        :param error_rate: the rate of unknown keys reported as known
+        """
+        self._error_rate = error_rate
+        self._filters = [_BloomFilter(initial_capacity, error_rate * (1 - _TIGHTENING))]
+        self._lock = Lock()
+
+    def load(self, ids: Iterable[int]) -> int:
+        """
+        Add a stream of id64, by chunks
+        :param ids: the id64 of the stored keys
+        :return: the number of keys added
+        """
+        loaded = 0
+        chunk = []
+        for id64 in ids:
+            chunk.append(id64)
+            if len(chunk) >= _LOAD_CHUNK_SIZE:
+                loaded += self.__add_chunk(chunk)
+                chunk = []
+        return loaded + self.__add_chunk(chunk)
+
+    def add(self, key: Optional[dict]) -> None:
+        """
+        Record a stored key
+        :param key: the key of the system or body, with its `id64`
+        """
+        if key is None or key.get('id64') is None:
+            return
+        with self._lock:
+            self.__writable_filter().add(key['id64'])
+
+    def may_contain(self, key: dict) -> bool:
+        """
+        :param key: the key of the system or body
+        :return: False if the key is certainly not stored, True if it probably is
+                 (or has no `id64` to check)
+        """
+        id64 = key.get('id64')
+        if id64 is None:
+            return True
+        return any(id64 in bloom_filter for bloom_filter in reversed(self._filters))
+
+    def __len__(self) -> int:
+        return sum(bloom_filter.count for bloom_filter in self._filters)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(bloom_filter.size_bytes for bloom_filter in self._filters)
+
+    def __add_chunk(self, chunk: List[int]) -> int:
+        added = len(chunk)
+        with self._lock:
+            while len(chunk) > 0:
+                bloom_filter = self.__writable_filter()
+                room = bloom_filter.capacity - bloom_filter.count
+                part, chunk = chunk[:room], chunk[room:]
+                if np is not None:
+                    bloom_filter.add_many(np.asarray(part, dtype=np.int64))
+                else:
+                    for id64 in part:
+                        bloom_filter.add(id64)
+        return added
+
+    def __writable_filter(self) -> _BloomFilter:
+        last = self._filters[-1]
+        if last.count < last.capacity:
+            return last
+        bloom_filter = _BloomFilter(last.capacity * _GROWTH,
+                                    self._error_rate * (1 - _TIGHTENING) * _TIGHTENING ** len(self._filters))
+        self._filters.append(bloom_filter)
+        return bloom_filter
@@ -0,0 +1,195 @@
+import atexit
+import functools
+import logging
+import sys
+from queue import Full, Queue
+from threading import Lock, Thread, current_thread
+from typing import Callable, Dict, Optional, TextIO
+
+import structlog
+from astraeus_common.decorator.logit import logit as traced
+
+from .metrics import REGISTRY
+from .redaction import redact
+
+DEFAULT_LOG_QUEUE_SIZE = 10000
+# per-entity messages (a system, a search, bodies...) pass their category in this key to be sampled
+SAMPLED_KEY = 'sampled'
+_KEPT_LEVELS = ('warning', 'warn', 'error', 'critical', 'exception', 'fatal')
+_STOP = object()
+
+LOG_RECORDS_DROPPED = REGISTRY.counter('edsm_reader_log_records_dropped_total',
+                                       'Log records dropped by the sampling (`sampled`) or '
+                                       'because the log queue was full (`queue_full`)', ['reason'])
+
+# the calls are traced at debug level: below it, `logit` runs the bare function
+_tracing_enabled = True
+
+
+def logit(func: Callable) -> Callable:
+    """
+    The call tracing of `astraeus_common`, only run while the debug level is enabled
+    """
+    instrumented = traced(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracing_enabled:
+            return instrumented(*args, **kwargs)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class EntitySampler:
+    """
+    Processor keeping one out of `rate` records of each category of per-entity messages.
+    Warnings and errors, and the records without category, are always kept.
+    """
+    _counts: Dict[str, int]
+
+    def __init__(self, rate: int = 1):
+        self._rate = rate
+        self._counts = {}
+        self._lock = Lock()
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        category = event_dict.pop(SAMPLED_KEY, None)
+        if category is None or self._rate <= 1 or method_name in _KEPT_LEVELS:
+            return event_dict
+        with self._lock:
+            count = self._counts.get(category, 0)
+            self._counts[category] = count + 1
+        if count % self._rate != 0:
+            LOG_RECORDS_DROPPED.inc(reason='sampled')
+            raise structlog.DropEvent
+        return event_dict
+
+
+class AsyncLogWriter:
+    """
+    Render and write the log records from a background thread, so the workers never wait on
+    the console. The records are queued as dictionaries: a full queue drops them instead of
+    blocking the caller.
+    """
+    _queue: Queue
+
+    def __init__(self, renderer: Callable, stream: TextIO = None,
+                 queue_size: int = DEFAULT_LOG_QUEUE_SIZE):
+        """
+        :param renderer: the last structlog processor, turning a record into a line
+        :param stream: where the lines are written, stdout by default
+        :param queue_size: the maximum number of records waiting to be written
+        """
+        self._renderer = renderer
+        self._stream = stream if stream is not None else sys.stdout
+        self._queue = Queue(maxsize=queue_size)
+        self._writer = Thread(target=self.__write, name='log-writer', daemon=True)
+        self._writer.start()
+
+    def put(self, method_name: str, event_dict: dict) -> None:
+        try:
+            self._queue.put_nowait((method_name, event_dict))
+        except Full:
+            LOG_RECORDS_DROPPED.inc(reason='queue_full')
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Write the records queued, then stop the writer
+        """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+
+    def __write(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                self._stream.flush()
+                return
+            method_name, event_dict = record
+            try:
+                self._stream.write(self._renderer(None, method_name, event_dict) + '\n')
+                if self._queue.empty():
+                    self._stream.flush()
+            except Exception as error:
+                # a broken record must not stop the writer, nor go through the logging it serves
+                sys.stderr.write(f'[log]Cannot write a log record: {error}\n')
+
+
+class _QueueLogger:
+    """
+    structlog logger handing the records to an `AsyncLogWriter`, unrendered
+    """
+
+    def __init__(self, writer: AsyncLogWriter):
+        self._writer = writer
+
+    def __getattr__(self, method_name: str) -> Callable:
+        return functools.partial(self.__put, method_name)
+
+    def __put(self, method_name: str, **event_dict) -> None:
+        self._writer.put(method_name, event_dict)
+
+
+def _redact_event(logger, method_name: str, event_dict: dict) -> dict:
+    # the errors of the EDSM calls quote their url, api key included
+    event = event_dict.get('event')
+    if isinstance(event, str):
+        event_dict['event'] = redact(event)
+    return event_dict
+
+
+def _capture_exc_info(logger, method_name: str, event_dict: dict) -> dict:
+    # the writer thread has no current exception: it is taken along with the record
+    if event_dict.get('exc_info') is True:
+        event_dict['exc_info'] = sys.exc_info()
+    return event_dict
+
+
+def _add_thread_name(logger, method_name: str, event_dict: dict) -> dict:
+    event_dict['thread'] = current_thread().name
+    return event_dict
+
+
+def configure_logging(log_level: str, async_writer: bool = False, sample_rate: int = 1,
+                      queue_size: int = DEFAULT_LOG_QUEUE_SIZE) -> Optional[AsyncLogWriter]:
+    """
+    Configure structlog for the reader
+    :param log_level: the minimum level of the records written
+    :param async_writer: render and write the records from a background thread
+    :param sample_rate: keep one out of `sample_rate` per-entity messages (1 to keep them all)
+    :param queue_size: the maximum number of records waiting for the background writer
+    :return: the background writer, to stop on exit, None if the records are written at once
+    """
+    global _tracing_enabled
+    level = logging.getLevelName(log_level)
+    _tracing_enabled = level <= logging.DEBUG
+
+    processors = [
+            # sampled first: dropped records cost nothing more
+            EntitySampler(sample_rate),
+            _redact_event,
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.add_log_level,
+            structlog.processors.StackInfoRenderer(),
+            structlog.dev.set_exc_info,
+            structlog.processors.TimeStamper(fmt='%Y-%m-%d %H:%M:%S', utc=False),
+    ]
+    if _tracing_enabled:
+        processors.append(_add_thread_name)
+    renderer = structlog.dev.ConsoleRenderer()
+
+    if not async_writer:
+        structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(level),
+                            processors=processors + [renderer],
+                            logger_factory=structlog.PrintLoggerFactory())
+        return None
+
+    writer = AsyncLogWriter(renderer, queue_size=queue_size)
+    atexit.register(writer.stop)
+    # the records leave the processors as dictionaries, rendered by the writer thread
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(level),
+                        processors=processors + [_capture_exc_info],
+                        logger_factory=lambda *args: _QueueLogger(writer))
+    return writer
@@ -0,0 +1,272 @@
+import abc
+import functools
+import math
+import os
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+DEFAULT_TEXTFILE_INTERVAL = 15.0
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric(abc.ABC):
+    metric_type: str
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = Lock()
+
+    def _label_values(self, labels: dict) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, label_values: LabelValues, extra: str = '') -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.label_names, label_values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        pass
+
+
+class Counter(_Metric):
+    """
+    Value which only goes up
+    """
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{self._format_labels(label_values)} {value}'
+                    for label_values, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """
+    Value which goes up and down
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{self._format_labels(label_values)} {value}'
+                    for label_values, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, in cumulative buckets
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self._buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        label_values = self._label_values(labels)
+        with self._lock:
+            counts, total, count = self._values.get(label_values,
+                                                    ([0] * len(self._buckets), 0.0, 0))
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        return self._values.get(self._label_values(labels), ([], 0.0, 0))[2]
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for label_values, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self._buckets, counts):
+                    le = 'le="+Inf"' if bound == math.inf else f'le="{bound!r}"'
+                    lines.append(f'{self.name}_bucket{self._format_labels(label_values, le)} '
+                                 f'{bucket_count}')
+                lines.append(f'{self.name}_sum{self._format_labels(label_values)} {total}')
+                lines.append(f'{self.name}_count{self._format_labels(label_values)} {count}')
+        return lines
+
+
+class Registry:
+    """
+    Set of metrics, rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+DB_QUERY_DURATION = REGISTRY.histogram('edsm_reader_db_query_duration_seconds',
+                                       'Duration of the database calls of the services', ['call'])
+DB_QUERY_ROWS = REGISTRY.histogram('edsm_reader_db_query_rows',
+                                   'Rows read or written per database call of the services', ['call'],
+                                   ROWS_BUCKETS)
+
+
+def _row_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def observe_query(func: Callable) -> Callable:
+    """
+    Record the duration and the rows returned of a service call
+    (a write counts its single row, whether it is buffered or not)
+    """
+    call = func.__qualname__
+    writes = not func.__name__.startswith('read_')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        result = func(*args, **kwargs)
+        DB_QUERY_DURATION.observe(time.monotonic() - start, call=call)
+        DB_QUERY_ROWS.observe(1 if writes else _row_count(result), call=call)
+        return result
+
+    return wrapper
+
+
+class MetricsServer:
+    """
+    Serve the metrics of a registry on `http://<host>:<port>/metrics`, from a daemon thread.
+    Only served on the loopback interface by default.
+    """
+
+    def __init__(self, port: int, host: str = DEFAULT_METRICS_HOST, registry: Registry = REGISTRY):
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, message_format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._thread = Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TextfileWriter:
+    """
+    Write the metrics of a registry into a file, for the node exporter textfile collector
+    """
+
+    def __init__(self, path: str, interval: float = DEFAULT_TEXTFILE_INTERVAL,
+                 registry: Registry = REGISTRY):
+        self._path = path
+        self._interval = interval
+        self._registry = registry
+        self._stopped = Event()
+        self._thread = Thread(target=self.__write_periodically, name='metrics-textfile',
+                              daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self.write()
+
+    def write(self) -> None:
+        # written aside then renamed, the collector never reads a partial file
+        directory = os.path.dirname(os.path.abspath(self._path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as file:
+            file.write(self._registry.render())
+        os.replace(file.name, self._path)
+
+    def __write_periodically(self) -> None:
+        while not self._stopped.wait(self._interval):
+            self.write()
@@ -0,0 +1,17 @@
+import re
+
+MASK = '*************'
+
+# the EDSM api key travels in the query string, so in the urls quoted by the requests errors
+_API_KEY_PATTERN = re.compile(r'(apiKey=|[\'"]apiKey[\'"]\s*:\s*[\'"])[^&\s\'"]+')
+
+
+def redact(text: str) -> str:
+    """
+    Mask the EDSM api key of a text (error message, url...) before it is logged or stored
+    :param text: the text to redact
+    :return: the text, with the value of every `apiKey` masked
+    """
+    if 'apiKey' not in text:
+        return text
+    return _API_KEY_PATTERN.sub(lambda match: match.group(1) + MASK, text)
@@ -0,0 +1,195 @@
+import math
+from threading import Lock
+from typing import Iterable, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is only needed by the spatial index
+    np = None
+
+Coord = Tuple[float, float, float]
+# a system found by a query, as (id64, coordinates, distance)
+IndexedSystem = Tuple[int, Coord, float]
+
+DEFAULT_CELL_SIZE = 50.0
+DEFAULT_PENDING_CAPACITY = 10000
+# cell indexes are packed on 21 bits per axis in a single int64 code
+_CELL_BITS = 21
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+
+
+class SpatialIndex:
+    """
+    In-memory index of the positions of the stored systems, for radius and nearest queries
+    without a call to EDSM.
+
+    Positions are kept in numpy arrays sorted by grid cell, with the cells packed in an int64
+    code (x, then y, then z): the cells of a column along z are contiguous, so a radius query
+    costs one binary search per column it crosses, plus a vectorized distance check.
+    Systems added after the build go to a small pending array, scanned as a whole, merged into
+    the sorted arrays once full.
+    """
+    _cell_size: float
+    _codes: 'np.ndarray'
+    _coords: 'np.ndarray'
+    _ids: 'np.ndarray'
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE,
+                 pending_capacity: int = DEFAULT_PENDING_CAPACITY):
+        """
+        :param cell_size: the size of the grid cells, in light years
+        :param pending_capacity: the number of systems added before a merge
+        """
+        if np is None:
+            raise RuntimeError('The spatial index needs numpy, install it with `pip install numpy`')
+        self._cell_size = cell_size
+        self._lock = Lock()
+        self.__set_sorted(np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.float32))
+        self._pending_ids = np.empty(pending_capacity, dtype=np.int64)
+        self._pending_coords = np.empty((pending_capacity, 3), dtype=np.float32)
+        self._pending_count = 0
+
+    def load(self, positions: Iterable[Tuple[int, float, float, float]],
+             chunk_size: int = 100000) -> int:
+        """
+        Build the index from a stream of positions, replacing its content
+        :param positions: the positions, as (id64, x, y, z)
+        :param chunk_size: the number of positions converted to arrays at once
+        :return: the number of systems indexed
+        """
+        id_chunks, coord_chunks, chunk = [], [], []
+        for position in positions:
+            chunk.append(position)
+            if len(chunk) >= chunk_size:
+                self.__append_chunk(chunk, id_chunks, coord_chunks)
+                chunk = []
+        self.__append_chunk(chunk, id_chunks, coord_chunks)
+
+        ids = np.concatenate(id_chunks) if id_chunks else np.empty(0, dtype=np.int64)
+        coords = np.concatenate(coord_chunks) if coord_chunks else np.empty((0, 3), dtype=np.float32)
+        located = ~np.isnan(coords).any(axis=1)
+        ids, coords = ids[located], coords[located]
+        # the last position of a system wins
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = len(ids) - 1 - last
+        with self._lock:
+            self.__set_sorted(ids[keep], coords[keep])
+            self._pending_count = 0
+            return len(self._ids)
+
+    def add(self, id64: int, x: float, y: float, z: float) -> None:
+        """
+        Index the position of a system, or move it if it is already indexed
+        """
+        with self._lock:
+            pending = np.flatnonzero(self._pending_ids[:self._pending_count] == id64)
+            if len(pending) > 0:
+                self._pending_coords[pending[0]] = (x, y, z)
+                return
+            row = self.__sorted_row_of(id64)
+            if row is not None:
+                if tuple(self._coords[row]) == tuple(np.float32((x, y, z))):
+                    return
+                # left in place but out of reach of any query, until the next merge
+                self._coords[row] = np.nan
+                self._dead += 1
+            if self._pending_count == len(self._pending_ids):
+                self.__merge_pending()
+            self._pending_ids[self._pending_count] = id64
+            self._pending_coords[self._pending_count] = (x, y, z)
+            self._pending_count += 1
+
+    def within(self, center: Coord, radius: float) -> List[IndexedSystem]:
+        """
+        :param center: the center of the sphere
+        :param radius: the radius of the sphere
+        :return: the systems inside the sphere, nearest first
+        """
+        with self._lock:
+            rows = self.__rows_near(center, radius)
+            ids = np.concatenate((self._ids[rows], self._pending_ids[:self._pending_count]))
+            coords = np.concatenate((self._coords[rows], self._pending_coords[:self._pending_count]))
+        distances = np.sqrt(((coords - np.asarray(center, dtype=np.float32)) ** 2).sum(axis=1))
+        inside = np.flatnonzero(distances <= radius)
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+        return [(int(ids[index]), tuple(float(value) for value in coords[index]),
+                 float(distances[index])) for index in inside]
+
+    def count_within(self, center: Coord, radius: float) -> int:
+        return len(self.within(center, radius))
+
+    def nearest(self, point: Coord, k: int = 1) -> List[IndexedSystem]:
+        """
+        :param point: the point to search around
+        :param k: the number of systems to find
+        :return: the `k` systems nearest to the point (less if the index is smaller), nearest first
+        """
+        size = len(self)
+        if size == 0 or k <= 0:
+            return []
+        radius = self._cell_size
+        while True:
+            found = self.within(point, radius)
+            if len(found) >= min(k, size):
+                return found[:k]
+            radius *= 2
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids) - self._dead + self._pending_count
+
+    def __rows_near(self, center: Coord, radius: float) -> 'np.ndarray':
+        if len(self._codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        low = [math.floor((center[axis] - radius) / self._cell_size) for axis in range(3)]
+        high = [math.floor((center[axis] + radius) / self._cell_size) for axis in range(3)]
+        if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) > len(self._codes):
+            # more columns than systems: scanning them all is cheaper
+            return np.arange(len(self._codes))
+        cells_x, cells_y = np.meshgrid(np.arange(low[0], high[0] + 1, dtype=np.int64),
+                                       np.arange(low[1], high[1] + 1, dtype=np.int64),
+                                       indexing='ij')
+        starts = np.searchsorted(self._codes, self.__code(cells_x.ravel(), cells_y.ravel(), low[2]),
+                                 side='left')
+        ends = np.searchsorted(self._codes, self.__code(cells_x.ravel(), cells_y.ravel(), high[2]),
+                               side='right')
+        slices = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def __sorted_row_of(self, id64: int):
+        index = np.searchsorted(self._sorted_ids, id64)
+        if index < len(self._sorted_ids) and self._sorted_ids[index] == id64:
+            return self._id_rows[index]
+        return None
+
+    def __merge_pending(self) -> None:
+        alive = ~np.isnan(self._coords[:, 0])
+        self.__set_sorted(np.concatenate((self._ids[alive], self._pending_ids[:self._pending_count])),
+                          np.concatenate((self._coords[alive],
+                                          self._pending_coords[:self._pending_count])))
+        self._pending_count = 0
+
+    def __set_sorted(self, ids: 'np.ndarray', coords: 'np.ndarray') -> None:
+        cells = np.floor(coords / self._cell_size).astype(np.int64)
+        codes = self.__code(cells[:, 0], cells[:, 1], cells[:, 2])
+        order = np.argsort(codes, kind='stable')
+        self._codes = codes[order]
+        self._ids = ids[order]
+        self._coords = coords[order]
+        self._id_rows = np.argsort(self._ids, kind='stable')
+        self._sorted_ids = self._ids[self._id_rows]
+        self._dead = 0
+
+    @staticmethod
+    def __code(cell_x, cell_y, cell_z):
+        return (((np.asarray(cell_x, dtype=np.int64) + _CELL_OFFSET) << (2 * _CELL_BITS))
+                | ((np.asarray(cell_y, dtype=np.int64) + _CELL_OFFSET) << _CELL_BITS)
+                | (np.asarray(cell_z, dtype=np.int64) + _CELL_OFFSET))
+
+    @staticmethod
+    def __append_chunk(chunk: list, id_chunks: list, coord_chunks: list) -> None:
+        if len(chunk) == 0:
+            return
+        array = np.asarray(chunk, dtype=np.float64)
+        id_chunks.append(np.asarray([position[0] for position in chunk], dtype=np.int64))
+        coord_chunks.append(array[:, 1:4].astype(np.float32))
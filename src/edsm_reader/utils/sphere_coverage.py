@@ -0,0 +1,106 @@
+import math
+from threading import Lock
+from typing import Dict, List, Tuple
+
+Coord = Tuple[float, float, float]
+Cell = Tuple[int, int, int]
+
+
+class SphereCoverage:
+    """
+    Spatial index of the spheres already searched, on a uniform grid.
+
+    Each sphere is registered in the cell of its center; with cells at least as large as
+    the radius, a point can only be covered by spheres of its own cell or of the 26 around it,
+    so `contains` cost does not depend on the number of spheres registered.
+    """
+    _cell_size: float
+    _cells: Dict[Cell, List[Tuple[Coord, float]]]
+
+    def __init__(self, cell_size: float):
+        self._cell_size = cell_size
+        self._cells = {}
+        self._count = 0
+        self._max_radius = 0.0
+        self._lock = Lock()
+
+    def add(self, center: Coord, radius: float) -> None:
+        """
+        Register a searched sphere
+        :param center: the center of the sphere
+        :param radius: the radius of the sphere
+        """
+        with self._lock:
+            self._cells.setdefault(self.__cell_of(center), []).append((center, radius))
+            self._count += 1
+            self._max_radius = max(self._max_radius, radius)
+
+    def discard(self, center: Coord, radius: float) -> None:
+        """
+        Unregister a sphere, if registered
+        :param center: the center of the sphere
+        :param radius: the radius of the sphere
+        """
+        with self._lock:
+            spheres = self._cells.get(self.__cell_of(center), [])
+            if (center, radius) in spheres:
+                spheres.remove((center, radius))
+                self._count -= 1
+
+    def clear(self) -> None:
+        """
+        Unregister every sphere
+        """
+        with self._lock:
+            self._cells = {}
+            self._count = 0
+            self._max_radius = 0.0
+
+    def contains(self, point: Coord) -> bool:
+        """
+        Check if a point is inside one of the spheres registered
+        :param point: the point to check
+        :return: True if the point is already covered
+        """
+        span = max(1, math.ceil(self._max_radius / self._cell_size))
+        cell_x, cell_y, cell_z = self.__cell_of(point)
+        for x in range(cell_x - span, cell_x + span + 1):
+            for y in range(cell_y - span, cell_y + span + 1):
+                for z in range(cell_z - span, cell_z + span + 1):
+                    for center, radius in self._cells.get((x, y, z), ()):
+                        if (point[0] - center[0]) ** 2 \
+                                + (point[1] - center[1]) ** 2 \
+                                + (point[2] - center[2]) ** 2 <= radius ** 2:
+                            return True
+        return False
+
+    def covers_sphere(self, center: Coord, radius: float) -> bool:
+        """
+        Check if a whole sphere is inside one of the spheres registered
+        :param center: the center of the sphere to check
+        :param radius: the radius of the sphere to check
+        :return: True if searching this sphere again is useless
+        """
+        span = max(1, math.ceil(self._max_radius / self._cell_size))
+        cell_x, cell_y, cell_z = self.__cell_of(center)
+        for x in range(cell_x - span, cell_x + span + 1):
+            for y in range(cell_y - span, cell_y + span + 1):
+                for z in range(cell_z - span, cell_z + span + 1):
+                    for covered_center, covered_radius in self._cells.get((x, y, z), ()):
+                        if covered_radius < radius:
+                            continue
+                        if math.dist(center, covered_center) + radius <= covered_radius:
+                            return True
+        return False
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def cell_size(self) -> float:
+        return self._cell_size
+
+    def __cell_of(self, point: Coord) -> Cell:
+        return (math.floor(point[0] / self._cell_size),
+                math.floor(point[1] / self._cell_size),
+                math.floor(point[2] / self._cell_size))
@@ -0,0 +1,39 @@
+from threading import Lock
+from typing import Hashable, Set
+
+
+class ThreadSafeSet:
+    """
+    Set shared between threads, with O(1) membership checks
+    """
+    _items: Set[Hashable]
+
+    def __init__(self):
+        self._items = set()
+        self._lock = Lock()
+
+    def add(self, item: Hashable) -> bool:
+        """
+        Add an item, atomically
+        :param item: the item to add
+        :return: True if the item was not in the set yet
+        """
+        with self._lock:
+            if item in self._items:
+                return False
+            self._items.add(item)
+            return True
+
+    def discard(self, item: Hashable) -> None:
+        with self._lock:
+            self._items.discard(item)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,34 @@
+import math
+from unittest import TestCase
+
+from bench.synthetic_galaxy import SyntheticGalaxy
+
+
+class TestSyntheticGalaxy(TestCase):
+
+    def test_same_seed_gives_same_galaxy(self):
+        first = SyntheticGalaxy(seed=7, radius=60)
+        second = SyntheticGalaxy(seed=7, radius=60)
+
+        self.assertEqual(first.systems, second.systems)
+        self.assertEqual(first.bodies(first.systems[-1]), second.bodies(second.systems[-1]))
+
+    def test_sphere_systems_returns_every_system_inside_nearest_first(self):
+        sut = SyntheticGalaxy(seed=7, radius=60)
+
+        found = sut.sphere_systems((10, 0, 10), 30)
+
+        expected = [system for system in sut.systems
+                    if math.dist((10, 0, 10), tuple(system['coords'].values())) <= 30]
+        self.assertEqual(len(expected), len(found))
+        self.assertEqual(sorted(elem['distance'] for elem in found), [elem['distance'] for elem in found])
+
+    def test_bodies_match_body_count_and_reference_their_system(self):
+        sut = SyntheticGalaxy(seed=7, radius=60)
+        system = next(system for system in sut.systems if system['bodyCount'] > 1)
+
+        bodies = sut.bodies(system)
+
+        self.assertEqual(system['bodyCount'], len(bodies))
+        self.assertTrue(all(body['systemId'] == system['id'] for body in bodies))
+        self.assertEqual('Star', bodies[0]['type'])
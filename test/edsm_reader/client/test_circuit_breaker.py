@@ -0,0 +1,48 @@
+from threading import Thread
+from unittest import TestCase
+
+from src.edsm_reader.client.circuit_breaker import (CLOSED_STATE, HALF_OPEN_STATE, OPEN_STATE,
+                                                    CircuitBreaker)
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_the_circuit_opens_after_consecutive_failures_only(self):
+        sut = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+        sut.record_failure()
+        sut.record_failure()
+        sut.record_success()
+        sut.record_failure()
+        sut.record_failure()
+        self.assertEqual(CLOSED_STATE, sut.state)
+
+        sut.record_failure()
+        self.assertEqual(OPEN_STATE, sut.state)
+
+    def test_a_probe_is_let_through_once_the_reset_timeout_elapsed(self):
+        now = [0.0]
+        sut = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, clock=lambda: now[0])
+        sut.record_failure()
+
+        now[0] = 1.0
+        sut.wait_until_closed()
+        self.assertEqual(HALF_OPEN_STATE, sut.state)
+
+        sut.record_failure()
+        self.assertEqual(OPEN_STATE, sut.state)
+
+    def test_waiting_callers_resume_when_the_probe_succeeds(self):
+        sut = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        sut.record_failure()
+        sut.wait_until_closed()
+
+        waiter = Thread(target=sut.wait_until_closed)
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        sut.record_success()
+        waiter.join(1)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(CLOSED_STATE, sut.state)
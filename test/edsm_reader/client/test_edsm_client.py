@@ -0,0 +1,67 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import requests
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from src.edsm_reader.client.circuit_breaker import OPEN_STATE, CircuitBreaker
+from src.edsm_reader.client.edsm_client import EdsmClient, EdsmServerError
+
+
+def _response(payload, status_code: int = 200) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode('utf-8')
+    response.headers = CaseInsensitiveDict()
+    return response
+
+
+class TestEdsmClient(TestCase):
+
+    def setUp(self):
+        self.circuit_breaker = CircuitBreaker(failure_threshold=3)
+        self.sut = EdsmClient(pool_size=1, circuit_breaker=self.circuit_breaker, max_retries=2)
+        self.sut._session = MagicMock()
+
+    def test_search_returns_an_iterator_over_the_systems(self):
+        self.sut._session.get.return_value = _response([{'id': 1, 'id64': 10}, {'id': 2, 'id64': 20}])
+
+        systems = self.sut.search_systems_from_coord(0, 0, 0, 100)
+
+        self.assertEqual([1, 2], [system['id'] for system in systems])
+        self.assertEqual([], list(systems))
+
+    def test_get_bodies_returns_the_bodies_of_the_system(self):
+        self.sut._session.get.return_value = _response({'id': 1, 'bodies': [{'id': 100}]})
+
+        self.assertEqual([{'id': 100}], self.sut.get_bodies_from_system_id(1))
+
+    def test_get_system_returns_empty_dict_when_unknown(self):
+        self.sut._session.get.return_value = _response([])
+
+        self.assertEqual({}, self.sut.get_system_from_system_id(1))
+
+    @patch('time.sleep')
+    def test_server_errors_and_connection_errors_are_retried(self, _):
+        self.sut._session.get.side_effect = [_response({}, 503), requests.ConnectionError('reset'),
+                                             _response({'id': 1, 'bodies': [{'id': 100}]})]
+
+        self.assertEqual([{'id': 100}], self.sut.get_bodies_from_system_id(1))
+        self.assertEqual(3, self.sut._session.get.call_count)
+
+    @patch('time.sleep')
+    def test_the_circuit_opens_when_the_retries_are_exhausted(self, _):
+        self.sut._session.get.return_value = _response({}, 502)
+
+        with self.assertRaises(EdsmServerError):
+            self.sut.get_system_from_system_id(1)
+        self.assertEqual(OPEN_STATE, self.circuit_breaker.state)
+
+    def test_a_search_timeout_is_not_retried(self):
+        self.sut._session.get.side_effect = requests.ReadTimeout('too dense')
+
+        with self.assertRaises(requests.Timeout):
+            self.sut.search_systems_from_coord(0, 0, 0, 100)
+        self.assertEqual(1, self.sut._session.get.call_count)
@@ -0,0 +1,99 @@
+from threading import Thread
+from unittest import TestCase
+
+from src.edsm_reader.client.rate_limiter import (RATE_LIMIT_LIMIT_HEADER, RATE_LIMIT_REMAINING_HEADER,
+                                                 RATE_LIMIT_RESET_HEADER, RETRY_AFTER_HEADER,
+                                                 RateLimiter, TokenBucket)
+
+
+class FakeClock:
+    """
+    Time only moving forward when told to, or when a caller sleeps
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(TestCase):
+
+    def test_refill_at_rate_up_to_capacity(self):
+        sut = TokenBucket(10, 60, now=0.0)
+        sut.tokens = 0.0
+
+        sut.refill(30.0)
+        self.assertAlmostEqual(5.0, sut.tokens)
+
+        sut.refill(600.0)
+        self.assertAlmostEqual(10.0, sut.tokens)
+
+
+class TestRateLimiter(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sut = RateLimiter({'bodies': (10, 60)}, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_a_burst_up_to_capacity_does_not_wait(self):
+        waits = [self.sut.acquire('bodies') for _ in range(10)]
+
+        self.assertEqual([0.0] * 10, waits)
+        self.assertEqual([], self.clock.sleeps)
+
+    def test_a_call_over_capacity_waits_for_its_token(self):
+        for _ in range(10):
+            self.sut.acquire('bodies')
+
+        self.assertAlmostEqual(6.0, self.sut.acquire('bodies'))
+        self.assertAlmostEqual(6.0, self.sut.acquire('bodies'))
+        self.assertEqual(2, len(self.clock.sleeps))
+
+    def test_waiting_callers_reserve_successive_slots(self):
+        waits = []
+        # the sleep of the callers is not simulated: each one only reserves its slot
+        sut = RateLimiter({'bodies': (1, 6)}, clock=self.clock, sleep=lambda seconds: None)
+        sut.acquire('bodies')
+        callers = [Thread(target=lambda: waits.append(sut.acquire('bodies'))) for _ in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(1)
+
+        self.assertEqual([6.0, 12.0, 18.0], sorted(round(wait, 6) for wait in waits))
+
+    def test_tokens_come_back_with_time(self):
+        for _ in range(10):
+            self.sut.acquire('bodies')
+
+        self.clock.now += 30
+
+        self.assertEqual([0.0] * 5, [self.sut.acquire('bodies') for _ in range(5)])
+        self.assertGreater(self.sut.acquire('bodies'), 0.0)
+
+    def test_headers_align_the_bucket_on_edsm(self):
+        self.sut.update_from_headers('bodies', {RATE_LIMIT_LIMIT_HEADER    : '20',
+                                                RATE_LIMIT_REMAINING_HEADER: '0',
+                                                RATE_LIMIT_RESET_HEADER    : '40'})
+
+        # 20 calls refilled over 40s: a token every 2s
+        self.assertAlmostEqual(2.0, self.sut.acquire('bodies'))
+
+    def test_headers_without_remaining_are_ignored(self):
+        self.sut.update_from_headers('bodies', {RATE_LIMIT_LIMIT_HEADER: '1'})
+        self.sut.update_from_headers('bodies', {RATE_LIMIT_REMAINING_HEADER: 'unknown'})
+
+        self.assertEqual([0.0] * 10, [self.sut.acquire('bodies') for _ in range(10)])
+
+    def test_a_throttled_api_is_blocked_until_retry_after(self):
+        delay = self.sut.on_throttled('bodies', {RETRY_AFTER_HEADER: '30'})
+
+        self.assertEqual(30.0, delay)
+        self.assertAlmostEqual(30.0, self.sut.acquire('bodies'))
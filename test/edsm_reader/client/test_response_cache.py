@@ -0,0 +1,102 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from src.edsm_reader.client.response_cache import ResponseCache
+
+KILOBYTE = 1024
+
+
+def response_of(body: bytes, etag: str = None) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = body
+    response.headers = CaseInsensitiveDict({'etag': etag} if etag else {})
+    return response
+
+
+class FakeTime:
+    """
+    Time only moving forward when told to
+    """
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = FakeTime()
+        patcher = patch('src.edsm_reader.client.response_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sut = self.cache()
+
+    def tearDown(self):
+        self.sut.close()
+        self.directory.cleanup()
+
+    def cache(self, max_size_mb: int = 1) -> ResponseCache:
+        return ResponseCache(os.path.join(self.directory.name, 'cache.sqlite'),
+                             {'system': 3600, 'bodies': 0}, max_size_mb)
+
+    def test_a_stored_response_is_a_fresh_hit(self):
+        self.sut.put('system', {'systemId64': 1}, response_of(b'{"name":"Sol"}', etag='"v1"'))
+
+        cached = self.sut.get('system', {'systemId64': 1})
+
+        self.assertEqual(b'{"name":"Sol"}', cached.body)
+        self.assertEqual({'If-None-Match': '"v1"'}, cached.conditional_headers())
+        self.assertTrue(self.sut.is_fresh('system', cached))
+        self.assertIsNone(self.sut.get('system', {'systemId64': 2}))
+        self.assertEqual(1, self.sut.stats()['hits'])
+        self.assertEqual(1, self.sut.stats()['misses'])
+
+    def test_a_response_expires_after_its_ttl_until_refreshed(self):
+        self.sut.put('system', {'systemId64': 1}, response_of(b'{}'))
+        self.clock.now += 3600
+
+        self.assertFalse(self.sut.is_fresh('system', self.sut.get('system', {'systemId64': 1})))
+
+        self.sut.refresh('system', {'systemId64': 1})
+        self.assertTrue(self.sut.is_fresh('system', self.sut.get('system', {'systemId64': 1})))
+
+    def test_endpoints_without_ttl_are_not_stored(self):
+        self.sut.put('bodies', {'systemId64': 1}, response_of(b'{}'))
+
+        self.assertIsNone(self.sut.get('bodies', {'systemId64': 1}))
+
+    def test_least_recently_used_responses_are_evicted_over_max_size(self):
+        for system_id in range(10):
+            self.clock.now += 1
+            self.sut.put('system', {'systemId64': system_id}, response_of(b'x' * 100 * KILOBYTE))
+        self.clock.now += 1
+        self.sut.get('system', {'systemId64': 0})
+
+        self.clock.now += 1
+        self.sut.put('system', {'systemId64': 10}, response_of(b'x' * 100 * KILOBYTE))
+
+        stats = self.sut.stats()
+        self.assertLessEqual(stats['size'], 0.9 * 1024 * KILOBYTE)
+        self.assertEqual(2, stats['evicted'])
+        self.assertIsNotNone(self.sut.get('system', {'systemId64': 0}))
+        self.assertIsNone(self.sut.get('system', {'systemId64': 1}))
+        self.assertIsNone(self.sut.get('system', {'systemId64': 2}))
+        self.assertIsNotNone(self.sut.get('system', {'systemId64': 3}))
+
+    def test_size_is_read_back_on_reopen(self):
+        self.sut.put('system', {'systemId64': 1}, response_of(b'x' * KILOBYTE))
+        self.sut.close()
+
+        self.sut = self.cache()
+
+        self.assertEqual(KILOBYTE, self.sut.stats()['size'])
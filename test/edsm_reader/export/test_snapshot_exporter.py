@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from src.edsm_reader.export.snapshot_exporter import (SYSTEM_IDS_FILE, SnapshotExporter,
+                                                      open_system_coordinates)
+from src.edsm_reader.services.snapshot_service import SNAPSHOT_SYSTEM_SELECT
+
+
+class FakeDatabase:
+    """
+    Serve the systems and bodies whose sync date is in the range of the query
+    """
+
+    def __init__(self):
+        self.systems = []
+        self.bodies = []
+
+    def stream_db_read(self, query, params):
+        def in_range(sync_date):
+            return params['since'] < sync_date <= params['until']
+
+        if query == SNAPSHOT_SYSTEM_SELECT:
+            return iter([system[1:] for system in self.systems if in_range(system[0])])
+        return iter([(json.dumps(body[1]),) for body in self.bodies if in_range(body[0])])
+
+
+class TestSnapshotExporter(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = FakeDatabase()
+        self.start = datetime(2026, 10, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_each_export_appends_the_systems_synced_since_the_last_one(self):
+        sut = SnapshotExporter(self.db, self.directory.name, chunk_size=2)
+        self.db.systems = [(self.start, 1, 0.0, 0.0, 0.0), (self.start, 2, 1.5, -2.0, 3.0),
+                           (self.start, 3, 10.0, 20.0, 30.0)]
+        sut.export(self.start + timedelta(hours=1))
+        self.db.systems.append((self.start + timedelta(hours=2), 2, 4.0, 5.0, 6.0))
+        entry = sut.export(self.start + timedelta(hours=3))
+
+        ids, coords = open_system_coordinates(self.directory.name)
+        self.assertEqual([1, 2, 3, 2], list(ids))
+        self.assertEqual([4.0, 5.0, 6.0], list(coords[3]))
+        self.assertEqual({'since': '2026-10-01T01:00:00', 'systems': 1, 'first_row': 3,
+                          'bodies': 0, 'body_file': None}, entry)
+
+    def test_the_rows_of_an_interrupted_export_are_dropped(self):
+        sut = SnapshotExporter(self.db, self.directory.name)
+        self.db.systems = [(self.start, 1, 0.0, 0.0, 0.0)]
+        sut.export(self.start + timedelta(hours=1))
+        with open(os.path.join(self.directory.name, SYSTEM_IDS_FILE), 'ab') as ids_file:
+            ids_file.write(b'\x00' * 8)
+        self.db.systems.append((self.start + timedelta(hours=2), 7, 1.0, 1.0, 1.0))
+        sut.export(self.start + timedelta(hours=3))
+
+        ids, _ = open_system_coordinates(self.directory.name)
+        self.assertEqual([1, 7], list(ids))
+
+    def test_the_systems_synced_within_the_lag_are_left_to_the_next_export(self):
+        sut = SnapshotExporter(self.db, self.directory.name, lag=600)
+        now = datetime.now()
+        self.db.systems = [(now - timedelta(hours=1), 1, 0.0, 0.0, 0.0), (now, 2, 1.0, 1.0, 1.0)]
+
+        entry = sut.export()
+        again = sut.export()
+
+        self.assertEqual(1, entry['systems'])
+        self.assertEqual(0, again['systems'])
+        ids, _ = open_system_coordinates(self.directory.name)
+        self.assertEqual([1], list(ids))
+
+    def test_bodies_are_written_to_a_file_per_export(self):
+        sut = SnapshotExporter(self.db, self.directory.name, chunk_size=1)
+        self.db.bodies = [(self.start, {'key': {'id': 1, 'id64': 11}, 'name': 'A 1', 'radius': None}),
+                          (self.start, {'key': {'id': 2, 'id64': 12}, 'name': 'A 2', 'radius': 1.5})]
+
+        entry = sut.export(self.start + timedelta(hours=1))
+
+        self.assertEqual(2, entry['bodies'])
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, entry['body_file'])))
@@ -0,0 +1,118 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.edsm_reader.io.bulk_database import BulkDatabase, PreparedStatement
+
+QUERY = 'INSERT INTO t (key) VALUES (%(key)s)'
+
+
+class TestPreparedStatement(TestCase):
+
+    def test_named_parameters_become_positional(self):
+        sut = PreparedStatement('stmt', 'INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)')
+
+        self.assertEqual('PREPARE stmt AS INSERT INTO t (a, b) VALUES ($1, $2)', sut.prepare_sql)
+        self.assertEqual('EXECUTE stmt (%s, %s)', sut.execute_sql)
+        self.assertEqual([1, 2], sut.args({'b': 2, 'a': 1, 'key': 'ignored'}))
+
+    def test_repeated_parameter_is_sent_once(self):
+        sut = PreparedStatement('stmt', 'SELECT * FROM t WHERE a = %(a)s OR b = %(a)s')
+
+        self.assertEqual('PREPARE stmt AS SELECT * FROM t WHERE a = $1 OR b = $1', sut.prepare_sql)
+        self.assertEqual([1], sut.args({'a': 1}))
+
+    def test_escaped_percent_is_unescaped(self):
+        sut = PreparedStatement('stmt', "SELECT * FROM t WHERE name LIKE 'Sol%%'")
+
+        self.assertEqual("PREPARE stmt AS SELECT * FROM t WHERE name LIKE 'Sol%'", sut.prepare_sql)
+        self.assertEqual('EXECUTE stmt', sut.execute_sql)
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        self._connection.executed.append(query)
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    """
+    Hands connections out like psycopg2 pools: the ones handed back over `minconn` idle are closed
+    """
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.minconn = minconn
+        self.idle = []
+        self.opened = []
+
+    def getconn(self):
+        if len(self.idle) > 0:
+            return self.idle.pop()
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def putconn(self, connection, close=False):
+        if close or len(self.idle) >= self.minconn:
+            connection.close()
+        else:
+            self.idle.append(connection)
+
+
+class TestBulkDatabase(TestCase):
+
+    def database(self, min_size, max_size):
+        with patch('src.edsm_reader.io.bulk_database.ThreadedConnectionPool', FakePool):
+            return BulkDatabase('localhost', '5432', 'user', 'astraeus', 'password',
+                                min_size=min_size, max_size=max_size, prepared_statements=[QUERY])
+
+    def test_a_connection_closed_by_the_pool_is_prepared_again_once_reopened(self):
+        sut = self.database(min_size=1, max_size=2)
+        with sut.connection() as closed:
+            with sut.connection() as kept:
+                pass
+        # handed back over the minimum of idle connections: closed by the pool
+        self.assertTrue(closed.closed)
+        self.assertFalse(kept.closed)
+
+        with sut.connection() as reused:
+            sut.exec_db_batch([(QUERY, [{'key': 1}])])
+        reopened = sut._pool.opened[-1]
+
+        self.assertIs(kept, reused)
+        self.assertNotIn(reopened, (closed, kept))
+        self.assertEqual(['PREPARE edsm_reader_0 AS INSERT INTO t (key) VALUES ($1)'],
+                         [query for query in reopened.executed if query.startswith('PREPARE')])
+        self.assertEqual(1, len([query for query in kept.executed if query.startswith('PREPARE')]))
+
+    def test_the_pool_keeps_every_connection_by_default(self):
+        sut = self.database(min_size=0, max_size=3)
+
+        self.assertEqual(3, sut._pool.minconn)
@@ -0,0 +1,153 @@
+from threading import Thread
+from unittest import TestCase
+
+import psycopg2
+
+from src.edsm_reader.io.write_buffer import WriteBuffer
+
+INSERT = 'INSERT INTO astraeus.system (key, name) VALUES (%(key)s, %(name)s)'
+UPDATE = 'UPDATE astraeus.sync_state SET sync_hash = %(sync_hash)s WHERE key = %(key)s'
+
+
+class FakeDatabase:
+    """
+    Record the batches written, failing the next ones on demand, and the ones holding a bad row
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.failures = 0
+        self.bad_names = set()
+
+    def exec_db_batch(self, statements):
+        if self.failures > 0:
+            self.failures -= 1
+            raise psycopg2.OperationalError('connection lost')
+        if any(params.get('name') in self.bad_names for _, rows in statements for params in rows):
+            raise psycopg2.IntegrityError('duplicate key value violates unique constraint')
+        self.batches.append(statements)
+
+
+class TestWriteBuffer(TestCase):
+
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.sut = WriteBuffer(self.db, max_size=3, max_delay=3600)
+
+    def tearDown(self):
+        self.sut.close()
+
+    def test_a_pending_write_on_the_same_key_is_replaced(self):
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol A'})
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'key': 1, 'name': 'Sol A'}])]], self.db.batches)
+
+    def test_inserts_are_written_before_updates(self):
+        self.sut.add(UPDATE, {'key': 1, 'sync_hash': 'abc'})
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+        self.sut.flush()
+
+        self.assertEqual([INSERT, UPDATE], [query for query, _ in self.db.batches[0]])
+
+    def test_nothing_is_flushed_in_the_middle_of_a_unit_of_work(self):
+        with self.sut.unit_of_work():
+            for key in range(5):
+                self.sut.add(INSERT, {'key': key, 'name': f'System {key}'})
+            self.assertEqual([], self.db.batches)
+
+        self.assertEqual([[(INSERT, [{'key': key, 'name': f'System {key}'} for key in range(5)])]],
+                         self.db.batches)
+
+    def test_other_threads_write_while_a_unit_of_work_is_open(self):
+        def write_sync_states():
+            for key in range(3):
+                self.sut.add(UPDATE, {'key': key, 'sync_hash': 'abc'})
+
+        with self.sut.unit_of_work():
+            self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+            writer = Thread(target=write_sync_states)
+            writer.start()
+            writer.join(1)
+            self.assertFalse(writer.is_alive())
+            self.assertEqual([[(UPDATE, [{'key': key, 'sync_hash': 'abc'} for key in range(3)])]],
+                             self.db.batches)
+
+    def test_the_writes_of_a_failed_unit_of_work_are_dropped(self):
+        with self.assertRaises(ValueError):
+            with self.sut.unit_of_work():
+                self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+                raise ValueError('no bodies')
+        self.sut.flush()
+
+        self.assertEqual([], self.db.batches)
+
+    def test_rows_of_a_failed_flush_are_written_by_the_next_one(self):
+        self.db.failures = 1
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+        with self.assertRaises(psycopg2.OperationalError):
+            self.sut.flush()
+        self.sut.add(INSERT, {'key': 2, 'name': 'Achenar'})
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'key': 1, 'name': 'Sol'}, {'key': 2, 'name': 'Achenar'}])]],
+                         self.db.batches)
+
+    def test_a_row_added_during_a_failed_flush_replaces_the_failed_one(self):
+        self.db.failures = 1
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+        with self.assertRaises(psycopg2.OperationalError):
+            self.sut.flush()
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol A'})
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'key': 1, 'name': 'Sol A'}])]], self.db.batches)
+
+    def test_rows_of_a_flush_source_are_written_by_each_flush(self):
+        kept_aside = [{'name': 'Sol'}]
+
+        def take_kept_aside():
+            rows = [(INSERT, params) for params in kept_aside]
+            kept_aside.clear()
+            return rows
+
+        self.sut.on_flush(take_kept_aside)
+        self.sut.add(UPDATE, {'key': 1, 'sync_hash': 'abc'})
+        self.sut.flush()
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'name': 'Sol'}]), (UPDATE, [{'key': 1, 'sync_hash': 'abc'}])]],
+                         self.db.batches)
+
+    def test_a_bad_row_does_not_hold_the_others_back(self):
+        self.db.bad_names = {'Bad'}
+        self.sut.add(INSERT, {'key': 1, 'name': 'Sol'})
+        self.sut.add(INSERT, {'key': 2, 'name': 'Bad'})
+        self.sut.add(UPDATE, {'key': 1, 'sync_hash': 'abc'})
+
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'key': 1, 'name': 'Sol'}])],
+                          [(UPDATE, [{'key': 1, 'sync_hash': 'abc'}])]], self.db.batches)
+
+    def test_a_bad_row_is_dropped_after_max_attempts(self):
+        sut = WriteBuffer(self.db, max_size=100, max_delay=3600, max_attempts=2)
+        self.db.bad_names = {'Bad'}
+        sut.add(INSERT, {'key': 2, 'name': 'Bad'})
+        sut.flush()
+        sut.flush()
+        self.db.bad_names = set()
+        sut.flush()
+        sut.close()
+
+        self.assertEqual([], self.db.batches)
+
+    def test_a_newer_row_replacing_a_bad_one_is_written(self):
+        self.db.bad_names = {'Bad'}
+        self.sut.add(INSERT, {'key': 2, 'name': 'Bad'})
+        self.sut.flush()
+        self.sut.add(INSERT, {'key': 2, 'name': 'Achenar'})
+        self.sut.flush()
+
+        self.assertEqual([[(INSERT, [{'key': 2, 'name': 'Achenar'}])]], self.db.batches)
@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from astraeus_common.models.body import Body
+from astraeus_common.models.sync_state import SyncState
+from astraeus_common.models.system import System
+
+from src.edsm_reader.loader.dump_loader import DumpLoader
+from src.edsm_reader.services.change_history_service import CHANGE_HISTORY_INSERT
+from src.edsm_reader.services.refresh_stat_service import REFRESH_STAT_UPSERT
+from src.edsm_reader.services.sync_state_service import SYNC_STATE_SELECT_BY_KEYS
+from src.edsm_reader.utils.compression import decompress
+from src.edsm_reader.utils.entity_key import key_of, key_to_str
+from src.edsm_reader.utils.fingerprint import Fingerprinter, fingerprint_of
+
+RESOURCES = os.path.join(os.path.dirname(__file__), '..', '..', 'resources')
+SYSTEMS_DUMP = os.path.join(RESOURCES, 'systemsWithCoordinates.json')
+BODIES_DUMP = os.path.join(RESOURCES, 'bodies.json')
+
+
+def records_of(dump_path: str) -> list:
+    with open(dump_path, 'r', encoding='utf-8') as dump_file:
+        return json.load(dump_file)
+
+
+class FakeDatabase:
+    """
+    Record the batches written, and answer the sync states of the entities already stored
+    """
+
+    def __init__(self, stored_records=(), fingerprint=fingerprint_of):
+        self.batches = []
+        self.sync_states = [{'key'      : key_of(record),
+                             'data_type': 'body' if 'systemId' in record else 'system',
+                             'sync_hash': fingerprint(record)} for record in stored_records]
+        self.entities = [{**record, 'key': key_of(record)} for record in stored_records]
+
+    def exec_db_read(self, query, params):
+        keys = {key_to_str(json.loads(key)) for key in params['keys']}
+        rows = self.sync_states if query == SYNC_STATE_SELECT_BY_KEYS else self.entities
+        return [row for row in rows if key_to_str(row['key']) in keys]
+
+    def exec_db_write(self, query, params):
+        pass
+
+    def exec_db_batch(self, statements):
+        self.batches.append(dict(statements))
+
+    def rows(self, query):
+        return [len(batch[query]) for batch in self.batches]
+
+
+class TestDumpLoader(TestCase):
+
+    def test_systems_are_created_by_batches_with_their_position(self):
+        db = FakeDatabase()
+
+        # the `[` and `]` lines of the dump count in the batches, but hold no record
+        DumpLoader(db, batch_size=2, workers=1).load(SYSTEMS_DUMP)
+
+        self.assertEqual([1, 2], db.rows(System.SYSTEM_INSERT))
+        self.assertEqual([1, 2], db.rows(SyncState.SYNC_STATE_INSERT))
+        self.assertEqual([0, 0], db.rows(System.SYSTEM_UPDATE_BY_KEY))
+        self.assertEqual([0, 0], db.rows(Body.BODY_INSERT))
+        positions = [params for batch in db.batches for params in batch[REFRESH_STAT_UPSERT]]
+        self.assertEqual([(0, 0, 0), (87.25, 96.84375, -65), (13.65625, 0.5, -800.375)],
+                         [(params['x'], params['y'], params['z']) for params in positions])
+        self.assertEqual([json.dumps(key_of(record)) for record in records_of(SYSTEMS_DUMP)],
+                         [params['entity_key'] for params in positions])
+
+    def test_bodies_are_created_without_refresh_statistics(self):
+        db = FakeDatabase()
+
+        DumpLoader(db, workers=1).load(BODIES_DUMP)
+
+        self.assertEqual(1, len(db.batches))
+        self.assertEqual([2], db.rows(Body.BODY_INSERT))
+        self.assertEqual([2], db.rows(SyncState.SYNC_STATE_INSERT))
+        self.assertEqual([0], db.rows(System.SYSTEM_INSERT))
+        self.assertEqual([0], db.rows(REFRESH_STAT_UPSERT))
+
+    def test_unchanged_entities_are_skipped_and_changed_ones_updated(self):
+        stored = records_of(SYSTEMS_DUMP)
+        stored[1] = {**stored[1], 'name': 'Previous name'}
+        db = FakeDatabase(stored)
+
+        DumpLoader(db, workers=1).load(SYSTEMS_DUMP)
+
+        self.assertEqual([0], db.rows(System.SYSTEM_INSERT))
+        self.assertEqual([1], db.rows(System.SYSTEM_UPDATE_BY_KEY))
+        self.assertEqual([1], db.rows(SyncState.SYNC_STATE_UPDATE_BY_KEY))
+
+    def test_the_previous_values_of_the_updated_entities_are_recorded_in_the_history(self):
+        stored = records_of(SYSTEMS_DUMP)
+        stored[1] = {**stored[1], 'name': 'Previous name'}
+        db = FakeDatabase(stored)
+
+        DumpLoader(db, workers=1).load(SYSTEMS_DUMP)
+
+        history = db.batches[0][CHANGE_HISTORY_INSERT]
+        self.assertEqual(1, len(history))
+        records = json.loads(decompress(history[0]['codec'], history[0]['records']))
+        self.assertEqual([(key_of(stored[1]), 'system', 'Previous name')],
+                         [(record['key'], record['data_type'], record['previous_state']['name'])
+                          for record in records])
+
+    def test_created_entities_have_no_history(self):
+        db = FakeDatabase()
+
+        DumpLoader(db, workers=1).load(SYSTEMS_DUMP)
+
+        self.assertEqual([0], db.rows(CHANGE_HISTORY_INSERT))
+
+    def test_legacy_hashes_of_unchanged_entities_are_replaced_without_update(self):
+        stored = records_of(SYSTEMS_DUMP)
+        stored[1] = {**stored[1], 'name': 'Previous name'}
+        db = FakeDatabase(stored, Fingerprinter('legacy').fingerprint)
+
+        DumpLoader(db, workers=1).load(SYSTEMS_DUMP)
+
+        self.assertEqual([1], db.rows(System.SYSTEM_UPDATE_BY_KEY))
+        self.assertEqual([fingerprint_of(record) for record in records_of(SYSTEMS_DUMP)],
+                         [params['sync_hash']
+                          for params in db.batches[0][SyncState.SYNC_STATE_UPDATE_BY_KEY]])
+
+    def test_gzipped_dump_is_loaded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        gzipped_dump = os.path.join(directory, 'systemsWithCoordinates.json.gz')
+        with open(SYSTEMS_DUMP, 'rb') as dump_file, gzip.open(gzipped_dump, 'wb') as gzipped_file:
+            shutil.copyfileobj(dump_file, gzipped_file)
+        db = FakeDatabase()
+
+        DumpLoader(db, workers=1).load(gzipped_dump)
+
+        self.assertEqual([3], db.rows(System.SYSTEM_INSERT))
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.body_refresh_policy import BodyRefreshPolicy
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+class TestBodyRefreshPolicy(TestCase):
+
+    def test_unchanged_system_recently_synced_is_skipped(self):
+        sut = BodyRefreshPolicy(max_age_hours=24)
+        last_sync = {'body_count': 3, 'synced_date': NOW - timedelta(hours=1)}
+
+        self.assertIsNone(sut.reason_to_fetch(False, 3, last_sync, NOW))
+        self.assertIsNone(sut.reason_to_fetch(False, None, last_sync, NOW))
+
+    def test_bodies_are_fetched_when_something_may_have_changed(self):
+        sut = BodyRefreshPolicy(max_age_hours=24)
+        last_sync = {'body_count': 3, 'synced_date': NOW - timedelta(hours=1)}
+
+        self.assertEqual('system_changed', sut.reason_to_fetch(True, 3, last_sync, NOW))
+        self.assertEqual('never_synced', sut.reason_to_fetch(False, 3, None, NOW))
+        self.assertEqual('body_count_changed', sut.reason_to_fetch(False, 4, last_sync, NOW))
+
+    def test_bodies_are_fetched_once_the_last_sync_is_too_old(self):
+        sut = BodyRefreshPolicy(max_age_hours=24)
+        last_sync = {'body_count': 3, 'synced_date': NOW - timedelta(hours=25)}
+
+        self.assertEqual('stale', sut.reason_to_fetch(False, 3, last_sync, NOW))
+
+    def test_no_max_age_fetches_every_time(self):
+        sut = BodyRefreshPolicy(max_age_hours=0)
+
+        self.assertFalse(sut.enabled)
+        self.assertEqual('always', sut.reason_to_fetch(False, 3, None, NOW))
@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.crawl_context import CrawlContext
+from src.edsm_reader.orchestrator.crawl_frontier import CrawlFrontier
+from src.edsm_reader.services.crawl_checkpoint_service import (DONE_STATUS, IN_FLIGHT_STATUS,
+                                                              PENDING_STATUS, SPILLED_STATUS)
+from src.edsm_reader.utils.sphere_coverage import SphereCoverage
+
+CRAWL_ID = 'crawl:0:0:0'
+
+
+class FakeCheckpointService:
+    """
+    Keep the status of the searches in memory, by crawl
+    """
+
+    def __init__(self):
+        self.statuses = {}
+
+    def read_checkpoint(self, crawl_id):
+        return [{'x': x, 'y': y, 'z': z, 'radius': radius, 'status': status}
+                for (crawl, x, y, z, radius), status in self.statuses.items() if crawl == crawl_id]
+
+    def read_searches_by_status(self, crawl_id, status, limit):
+        return [row for row in self.read_checkpoint(crawl_id) if row['status'] == status][:limit]
+
+    def save_search_status(self, crawl_id, x, y, z, radius, status):
+        self.statuses[(crawl_id, x, y, z, radius)] = status
+
+    def delete_checkpoint(self, crawl_id):
+        self.statuses = {key: status for key, status in self.statuses.items() if key[0] != crawl_id}
+
+    def status_of(self, item):
+        (x, y, z), radius = item
+        return self.statuses.get((CRAWL_ID, x, y, z, radius))
+
+
+class TestCrawlContext(TestCase):
+
+    def setUp(self):
+        self.checkpoint_service = FakeCheckpointService()
+
+    def context(self, max_size=100):
+        return CrawlContext(CRAWL_ID, CrawlFrontier((0, 0, 0), max_size), SphereCoverage(100),
+                            self.checkpoint_service)
+
+    def run_crawl(self, sut):
+        searched = []
+        item = sut.pop()
+        while item is not None:
+            searched.append(item)
+            sut.coverage.add(*item)
+            sut.done(item)
+            item = sut.pop()
+        return searched
+
+    def test_searches_pushed_while_the_frontier_is_full_are_spilled_then_run(self):
+        sut = self.context(max_size=1)
+        searches = [((index * 100, 0, 0), 100) for index in range(3)]
+        for search in searches:
+            sut.push(search)
+
+        self.assertEqual(2, sut.spilled)
+        self.assertEqual([PENDING_STATUS, SPILLED_STATUS, SPILLED_STATUS],
+                         [self.checkpoint_service.status_of(search) for search in searches])
+
+        self.assertEqual(searches, self.run_crawl(sut))
+        self.assertEqual([DONE_STATUS] * 3,
+                         [self.checkpoint_service.status_of(search) for search in searches])
+
+    def test_restore_covers_the_searches_done_only(self):
+        first_run = self.context()
+        done, failed, in_flight, pending = [((index * 300, 0, 0), 100) for index in range(4)]
+        for search in (done, failed, in_flight, pending):
+            first_run.push(search)
+        first_run.done(first_run.pop())
+        first_run.failed(first_run.pop())
+        first_run.pop()
+        # stopped there: the third search is left in flight, the last one pending
+
+        self.assertEqual(IN_FLIGHT_STATUS, self.checkpoint_service.status_of(in_flight))
+        self.assertEqual(PENDING_STATUS, self.checkpoint_service.status_of(failed))
+
+        sut = self.context()
+        self.assertEqual(3, sut.restore())
+
+        self.assertTrue(sut.coverage.contains(done[0]))
+        for search in (failed, in_flight, pending):
+            self.assertFalse(sut.coverage.contains(search[0]))
+        self.assertEqual([failed, in_flight, pending], self.run_crawl(sut))
+
+    def test_restore_after_a_complete_crawl_queues_nothing(self):
+        first_run = self.context()
+        first_run.push(((0, 0, 0), 100))
+        self.run_crawl(first_run)
+
+        sut = self.context()
+
+        self.assertEqual(0, sut.restore())
+        self.assertTrue(sut.coverage.contains((50, 0, 0)))
+        self.assertEqual([], self.run_crawl(sut))
+
+    def test_a_complete_crawl_resumed_starts_over(self):
+        first_run = self.context()
+        first_run.push(((0, 0, 0), 100))
+        self.run_crawl(first_run)
+
+        sut = self.context()
+        self.assertEqual(0, sut.restore())
+        sut.reset()
+
+        self.assertFalse(sut.is_searched((50, 0, 0)))
+        sut.push(((0, 0, 0), 100))
+        self.assertEqual([((0, 0, 0), 100)], self.run_crawl(sut))
+
+    def test_a_failed_search_no_longer_blocks_its_sphere(self):
+        sut = self.context()
+        sut.push(((0, 0, 0), 100))
+
+        self.assertTrue(sut.is_searched((50, 0, 0)))
+        sut.failed(sut.pop())
+        self.assertFalse(sut.is_searched((50, 0, 0)))
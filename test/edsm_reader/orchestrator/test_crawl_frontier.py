@@ -0,0 +1,81 @@
+from threading import Thread
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.crawl_frontier import CrawlFrontier
+
+
+class TestCrawlFrontier(TestCase):
+
+    def test_pop_nearest_first(self):
+        sut = CrawlFrontier((0, 0, 0))
+        sut.push(((50, 0, 0), 100))
+        sut.push(((10, 0, 0), 100))
+        sut.push(((0, -30, 0), 100))
+
+        self.assertEqual(((10, 0, 0), 100), sut.pop())
+        self.assertEqual(((0, -30, 0), 100), sut.pop())
+        self.assertEqual(((50, 0, 0), 100), sut.pop())
+
+    def test_push_refuses_when_full(self):
+        sut = CrawlFrontier((0, 0, 0), max_size=1)
+
+        self.assertTrue(sut.push(((1, 0, 0), 100)))
+        self.assertFalse(sut.push(((2, 0, 0), 100)))
+        self.assertEqual(1, sut.refused)
+
+    def test_pop_takes_refused_searches_back_once_empty(self):
+        refused = [((2, 0, 0), 100), ((3, 0, 0), 100)]
+
+        def refill(room):
+            taken = refused[:room]
+            del refused[:room]
+            return taken
+
+        sut = CrawlFrontier((0, 0, 0), max_size=1)
+        sut.refill_with(refill)
+        sut.push(((1, 0, 0), 100))
+
+        popped = []
+        item = sut.pop()
+        while item is not None:
+            popped.append(item)
+            sut.task_done()
+            item = sut.pop()
+
+        self.assertEqual([((1, 0, 0), 100), ((2, 0, 0), 100), ((3, 0, 0), 100)], popped)
+
+    def test_the_refill_runs_out_of_the_frontier_lock(self):
+        sut = CrawlFrontier((0, 0, 0))
+        pushes = []
+
+        def refill(room):
+            # another worker pushing its searches meanwhile is not blocked
+            pusher = Thread(target=lambda: pushes.append(sut.push(((1, 0, 0), 100))))
+            pusher.start()
+            pusher.join(timeout=1)
+            return [((2, 0, 0), 100)] if len(pushes) == 1 else []
+
+        sut.refill_with(refill)
+
+        self.assertEqual(((1, 0, 0), 100), sut.pop())
+        self.assertEqual([True], pushes)
+        self.assertEqual(((2, 0, 0), 100), sut.pop())
+
+    def test_pop_returns_none_when_crawl_is_over(self):
+        sut = CrawlFrontier((0, 0, 0))
+        sut.push(((1, 0, 0), 100))
+
+        sut.pop()
+        sut.task_done()
+
+        self.assertIsNone(sut.pop())
+
+    def test_pop_draws_from_source_once_empty(self):
+        sut = CrawlFrontier((0, 0, 0), source=iter([((5, 0, 0), 50)]))
+        sut.push(((1, 0, 0), 100))
+
+        self.assertEqual(((1, 0, 0), 100), sut.pop())
+        self.assertEqual(((5, 0, 0), 50), sut.pop())
+        sut.task_done()
+        sut.task_done()
+        self.assertIsNone(sut.pop())
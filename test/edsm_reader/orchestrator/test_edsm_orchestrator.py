@@ -0,0 +1,87 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import MagicMock, call
+
+from astraeus_common.models.sync_state import SyncState
+
+from src.edsm_reader.orchestrator.edsm_orchestrator import EDSMOrchestrator
+from src.edsm_reader.services.dead_letter_service import SEARCH_KIND
+from src.edsm_reader.utils.entity_key import key_of, key_to_str
+from src.edsm_reader.utils.fingerprint import Fingerprinter
+
+SOL = {'id': 27, 'id64': 10477373803, 'name': 'Sol', 'coords': {'x': 0, 'y': 0, 'z': 0},
+       'bodyCount': 40}
+
+
+class FakeSyncStateService:
+
+    def __init__(self):
+        self.states = {}
+
+    def read_sync_state_by_key(self, key: dict):
+        return self.states.get(key_to_str(key))
+
+    def create_sync_state(self, sync_state) -> None:
+        self.states[key_to_str(sync_state.key)] = sync_state
+
+    def update_sync_state(self, sync_state) -> None:
+        self.states[key_to_str(sync_state.key)] = sync_state
+
+
+class TestEDSMOrchestrator(TestCase):
+
+    def setUp(self):
+        self.sut = EDSMOrchestrator(MagicMock())
+        self.sut._state_service = FakeSyncStateService()
+        self.sut._system_service = MagicMock()
+        self.sut._refresh_stat_service = MagicMock()
+        self.sut._change_history_service = MagicMock()
+        self.sut._body_sync_service = MagicMock()
+        self.sut._body_sync_service.read_body_sync.return_value = {
+                'body_count' : SOL['bodyCount'],
+                'synced_date': datetime.now(),
+        }
+        self.sut._dead_letter_service = MagicMock()
+        self.sut._dead_letter_service.count_exhausted.return_value = {}
+        self.sut._edsm_client = MagicMock()
+        self.sut._edsm_client.get_bodies_from_system_id.return_value = []
+
+    def search_from(self, center: dict, distance: float) -> None:
+        self.sut._dead_letter_service.read_due.return_value = [
+                {'kind': SEARCH_KIND, 'key': {**center, 'radius': 100}, 'payload': {}, 'attempts': 1}]
+        self.sut._edsm_client.search_systems_from_coord.return_value = [{**SOL, 'distance': distance}]
+        self.sut.replay_dead_letters()
+
+    def test_a_system_found_again_from_another_center_skips_its_bodies(self):
+        self.search_from({'x': 10, 'y': 0, 'z': 0}, 10)
+        self.search_from({'x': 0, 'y': 40, 'z': 0}, 40)
+
+        self.sut._edsm_client.get_bodies_from_system_id.assert_called_once_with(SOL['id'])
+        self.sut._system_service.update_system_by_key.assert_not_called()
+        self.sut._change_history_service.record_change.assert_not_called()
+        self.sut._refresh_stat_service.record_change.assert_not_called()
+
+    def test_a_system_hashed_by_the_legacy_algorithm_only_gets_its_hash_replaced(self):
+        self.sut._fingerprinter = Fingerprinter('blake2b', previous_algorithm='legacy')
+        self.sut._state_service.create_sync_state(
+                SyncState(key=key_of(SOL), data_type='system',
+                          sync_hash=Fingerprinter('legacy').fingerprint(SOL)))
+
+        self.search_from({'x': 10, 'y': 0, 'z': 0}, 10)
+
+        self.assertEqual(Fingerprinter('blake2b').fingerprint(SOL),
+                         self.sut._state_service.read_sync_state_by_key(key_of(SOL)).sync_hash)
+        self.sut._edsm_client.get_bodies_from_system_id.assert_not_called()
+        self.sut._system_service.update_system_by_key.assert_not_called()
+
+    def test_a_replayed_refresh_is_written_before_its_dead_letter_is_deleted(self):
+        writes = MagicMock()
+        self.sut._write_buffer = writes.write_buffer
+        self.sut._dead_letter_service = writes.dead_letter_service
+        self.sut._dead_letter_service.count_exhausted.return_value = {'search': 2}
+
+        self.search_from({'x': 10, 'y': 0, 'z': 0}, 10)
+
+        self.assertLess(writes.mock_calls.index(call.write_buffer.flush()),
+                        writes.mock_calls.index(call.dead_letter_service.delete(
+                                SEARCH_KIND, {'x': 10, 'y': 0, 'z': 0, 'radius': 100})))
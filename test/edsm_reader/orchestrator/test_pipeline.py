@@ -0,0 +1,71 @@
+from threading import Event
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.pipeline import PipelineStage, SearchTicket
+
+
+class TestSearchTicket(TestCase):
+
+    def test_search_is_done_once_its_systems_are_processed(self):
+        outcomes = []
+        sut = SearchTicket(outcomes.append)
+        sut.hold()
+        sut.hold()
+
+        sut.release()
+        sut.release()
+        self.assertEqual([], outcomes)
+
+        sut.release()
+        self.assertEqual([True], outcomes)
+
+    def test_search_fails_if_one_of_its_systems_failed(self):
+        outcomes = []
+        sut = SearchTicket(outcomes.append)
+        sut.hold()
+
+        sut.release(succeeded=False)
+        sut.release()
+
+        self.assertEqual([False], outcomes)
+
+
+class TestPipelineStage(TestCase):
+
+    def test_queued_items_are_processed_before_stop(self):
+        processed = []
+        sut = PipelineStage('test', processed.append, workers=2, queue_size=10)
+        sut.start()
+
+        for item in range(20):
+            sut.put(item)
+        sut.stop()
+
+        self.assertEqual(list(range(20)), sorted(processed))
+
+    def test_put_blocks_while_the_queue_is_full(self):
+        release = Event()
+        sut = PipelineStage('test', lambda item: release.wait(), workers=1, queue_size=1)
+        sut.start()
+        sut.put(1)  # taken by the worker, blocked
+        sut.put(2)  # fills the queue
+
+        self.assertTrue(sut._queue.full())
+        release.set()
+        sut.stop()
+
+    def test_error_of_an_item_does_not_stop_the_stage(self):
+        processed = []
+
+        def handler(item):
+            if item == 1:
+                raise ValueError('boom')
+            processed.append(item)
+
+        sut = PipelineStage('test', handler)
+        sut.start()
+        for item in range(3):
+            sut.put(item)
+        sut.stop()
+
+        self.assertEqual([0, 2], processed)
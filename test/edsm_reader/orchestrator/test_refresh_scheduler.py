@@ -0,0 +1,39 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src.edsm_reader.orchestrator.refresh_scheduler import RefreshScheduler, parse_hot_regions
+
+
+class TestRefreshScheduler(TestCase):
+
+    def test_parse_hot_regions(self):
+        self.assertEqual([(0.0, 0.0, 0.0, 100.0), (-9530.5, -910.3, 19808.1, 500.0)],
+                         parse_hot_regions('0,0,0,100; -9530.5,-910.3,19808.1,500'))
+        self.assertEqual([], parse_hot_regions(None))
+        with self.assertRaises(ValueError):
+            parse_hot_regions('0,0,100')
+
+    @patch('src.edsm_reader.orchestrator.refresh_scheduler.time.sleep')
+    def test_cycle_refreshes_candidates_within_budget(self, sleep):
+        stat_service = MagicMock()
+        stat_service.read_refresh_candidates.return_value = [{'key': {'id': 1, 'id64': 10}},
+                                                             {'key': {'id': 2, 'id64': 20}}]
+        refresh = MagicMock()
+        sut = RefreshScheduler(refresh, stat_service, budget_per_hour=10)
+
+        refreshed = sut.run_cycle()
+
+        self.assertEqual(2, refreshed)
+        self.assertEqual(5, stat_service.read_refresh_candidates.call_args[0][0])
+        refresh.assert_any_call({'id': 2, 'id64': 20})
+        stat_service.record_check.assert_any_call({'id': 1, 'id64': 10})
+        self.assertTrue(sleep.called)
+
+    @patch('src.edsm_reader.orchestrator.refresh_scheduler.time.sleep')
+    def test_failed_refresh_is_not_recorded_as_checked(self, _):
+        stat_service = MagicMock()
+        stat_service.read_refresh_candidates.return_value = [{'key': {'id': 1, 'id64': 10}}]
+        sut = RefreshScheduler(MagicMock(side_effect=RuntimeError('boom')), stat_service)
+
+        self.assertEqual(0, sut.run_cycle())
+        stat_service.record_check.assert_not_called()
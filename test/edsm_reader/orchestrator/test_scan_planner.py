@@ -0,0 +1,54 @@
+import math
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.scan_planner import ScanPlanner, bcc_lattice
+from src.edsm_reader.orchestrator.sector import SectorBox
+from src.edsm_reader.utils.sphere_coverage import SphereCoverage
+
+
+class TestScanPlanner(TestCase):
+
+    def test_bcc_lattice_covers_the_region(self):
+        centers = list(bcc_lattice((0, 0, 0), 300, 100))
+
+        for point in [(0, 0, 0), (299, 0, 0), (120, -150, 170), (-200, 200, 0)]:
+            self.assertLessEqual(min(math.dist(point, center) for center in centers), 100)
+
+    def test_plan_skips_covered_searches(self):
+        coverage = SphereCoverage(100)
+        coverage.add((0, 0, 0), 100)
+        sut = ScanPlanner((0, 0, 0), region_radius=300, radius=100)
+
+        searches = list(sut.plan(coverage))
+
+        self.assertNotIn(((0, 0, 0), 100), searches)
+        self.assertGreater(len(searches), 0)
+
+    def test_split_stops_at_min_radius(self):
+        sut = ScanPlanner((0, 0, 0), radius=100, min_radius=30)
+
+        self.assertGreater(len(sut.split((0, 0, 0), 100)), 0)
+        self.assertEqual([], sut.split((0, 0, 0), 50))
+        self.assertTrue(sut.can_split(60))
+        self.assertFalse(sut.can_split(50))
+
+    def test_split_skips_covered_searches_and_the_ones_outside_the_bounds(self):
+        sector = SectorBox((0, 0, 0), 200)
+        coverage = SphereCoverage(100)
+        coverage.add((0, 0, 0), 100)
+        sut = ScanPlanner(sector.center, sector.radius, radius=100, bounds=sector)
+
+        searches = sut.split((0, 0, 0), 100, coverage)
+
+        self.assertLess(len(searches), len(sut.split((0, 0, 0), 100)))
+        self.assertTrue(all(sector.intersects_sphere(center, radius) for center, radius in searches))
+        self.assertFalse(any(coverage.covers_sphere(center, radius) for center, radius in searches))
+
+    def test_plan_skips_searches_outside_the_bounds(self):
+        sector = SectorBox((0, 0, 0), 200)
+        sut = ScanPlanner(sector.center, sector.radius, radius=100, bounds=sector)
+
+        searches = list(sut.plan(SphereCoverage(100)))
+
+        self.assertGreater(len(searches), 0)
+        self.assertTrue(all(sector.intersects_sphere(center, radius) for center, radius in searches))
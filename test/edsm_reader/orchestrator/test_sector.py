@@ -0,0 +1,32 @@
+import math
+from unittest import TestCase
+
+from src.edsm_reader.orchestrator.sector import SectorBox, sectors_of_region
+
+
+class TestSector(TestCase):
+
+    def test_sectors_tile_the_region_without_overlap(self):
+        sectors = sectors_of_region((0, 0, 0), 300, 100)
+
+        for point in [(0, 0, 0), (-100, 50, 99.9), (250, -120, 10), (0, 0, -299)]:
+            owners = [sector for sector in sectors if sector.contains(point)]
+            self.assertEqual(1, len(owners))
+
+    def test_sectors_are_nearest_first(self):
+        sectors = sectors_of_region((0, 0, 0), 300, 100)
+
+        distances = [math.dist(sector.center, (0, 0, 0)) for sector in sectors]
+        self.assertEqual(sorted(distances), distances)
+
+    def test_sectors_outside_the_region_are_left_out(self):
+        sectors = sectors_of_region((0, 0, 0), 150, 100)
+
+        self.assertNotIn('100:100:100:100', [sector.sector_id for sector in sectors])
+
+    def test_intersects_sphere(self):
+        sut = SectorBox((0, 0, 0), 100)
+
+        self.assertTrue(sut.intersects_sphere((50, 50, 50), 1))
+        self.assertTrue(sut.intersects_sphere((150, 50, 50), 50))
+        self.assertFalse(sut.intersects_sphere((150, 150, 150), 80))
@@ -0,0 +1,107 @@
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from src.edsm_reader.io.write_buffer import WriteBuffer
+from src.edsm_reader.services.change_history_service import (CHANGE_HISTORY_INSERT,
+                                                             ChangeHistoryService)
+from src.edsm_reader.utils.compression import decompress
+
+UPDATE = 'UPDATE astraeus.sync_state SET sync_hash = %(sync_hash)s WHERE key = %(key)s'
+SOL = {'id64': 10477373803}
+ACHENAR = {'id64': 164098653}
+
+
+class FakeDatabase:
+    """
+    Record the writes and batches, and read the change history back from the batches written
+    """
+
+    def __init__(self):
+        self.writes = []
+        self.batches = []
+        self.partition_failures = 0
+
+    def exec_db_write(self, query, params):
+        if 'PARTITION' in query and self.partition_failures > 0:
+            self.partition_failures -= 1
+            raise RuntimeError('partition constraint for default partition would be violated')
+        self.writes.append((query, params))
+
+    def exec_db_batch(self, statements):
+        self.batches.append(statements)
+
+    def exec_db_read(self, query, params):
+        return [row for statements in self.batches for statement, rows in statements
+                if statement == CHANGE_HISTORY_INSERT for row in rows if params['id64'] in row['id64s']]
+
+    def history_rows(self):
+        return [row for statements in self.batches for statement, rows in statements
+                if statement == CHANGE_HISTORY_INSERT for row in rows]
+
+
+class TestChangeHistoryService(TestCase):
+
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.write_buffer = WriteBuffer(self.db, max_size=1000, max_delay=3600)
+        self.sut = ChangeHistoryService(self.db, self.write_buffer, batch_size=3)
+
+    def tearDown(self):
+        self.write_buffer.close()
+
+    def test_a_change_is_written_by_the_flush_of_its_sync_state(self):
+        with self.write_buffer.unit_of_work():
+            self.write_buffer.add(UPDATE, {'key': str(SOL), 'sync_hash': 'abc'})
+            self.sut.record_change(SOL, 'system', {'population': 0})
+        self.write_buffer.flush()
+
+        self.assertEqual(1, len(self.db.batches))
+        self.assertEqual([CHANGE_HISTORY_INSERT, UPDATE], [query for query, _ in self.db.batches[0]])
+
+    def test_records_are_compressed_by_batches(self):
+        for population in range(4):
+            self.sut.record_change(SOL, 'system', {'population': population})
+        self.write_buffer.flush()
+
+        rows = self.db.history_rows()
+        self.assertEqual([3, 1], [row['record_count'] for row in rows])
+        records = json.loads(decompress(rows[0]['codec'], bytes(rows[0]['records'])))
+        self.assertEqual([{'population': population} for population in range(3)],
+                         [record['previous_state'] for record in records])
+
+    def test_changes_of_an_entity_are_read_back_oldest_first(self):
+        self.sut.record_change(SOL, 'system', {'population': 0})
+        self.sut.record_change(ACHENAR, 'system', {'security': 'Low'})
+        self.write_buffer.flush()
+        self.sut.record_change(SOL, 'system', {'population': 1})
+
+        changes = self.sut.read_changes(SOL)
+
+        self.assertEqual([{'population': 0}, {'population': 1}],
+                         [change['previous_state'] for change in changes])
+        self.assertEqual(['system', 'system'], [change['data_type'] for change in changes])
+
+    def test_partition_creation_is_tried_again_after_a_failure(self):
+        self.db.partition_failures = 1
+        self.sut.record_change(SOL, 'system', {'population': 0})
+        self.write_buffer.flush()
+        self.sut.record_change(SOL, 'system', {'population': 1})
+        self.write_buffer.flush()
+
+        self.assertEqual(2, len(self.db.history_rows()))
+        self.assertEqual(1, len([query for query, _ in self.db.writes if 'PARTITION' in query]))
+
+    def test_without_write_buffer_each_record_is_written_at_once(self):
+        sut = ChangeHistoryService(self.db, batch_size=3)
+
+        sut.record_change(SOL, 'system', {'population': 0})
+
+        self.assertEqual([CHANGE_HISTORY_INSERT], [query for query, _ in self.db.writes
+                                                   if 'PARTITION' not in query])
+
+    def test_month_partition(self):
+        self.assertEqual(('202610', '2026-10-01', '2026-11-01'),
+                         ChangeHistoryService.month_partition(datetime(2026, 10, 18, 12, 30)))
+        self.assertEqual(('202612', '2026-12-01', '2027-01-01'),
+                         ChangeHistoryService.month_partition(datetime(2026, 12, 31, 23, 59)))
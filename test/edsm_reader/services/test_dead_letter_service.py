@@ -0,0 +1,32 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import requests
+
+from src.edsm_reader.services.dead_letter_service import (EXHAUSTED_DEAD_LETTERS, SEARCH_KIND,
+                                                          DeadLetterService)
+
+
+class TestDeadLetterService(TestCase):
+
+    def test_the_api_key_is_masked_in_the_error_stored(self):
+        db = MagicMock()
+        sut = DeadLetterService(db)
+        error = requests.ConnectionError('Max retries exceeded with url: '
+                                         '/api-v1/sphere-systems?x=0&apiKey=SECRET123')
+
+        sut.record_failure(SEARCH_KIND, {'x': 0, 'y': 0, 'z': 0, 'radius': 100}, {}, error)
+
+        params = db.exec_db_write.call_args[0][1]
+        self.assertNotIn('SECRET123', params['error'])
+        self.assertEqual({'x': 0, 'y': 0, 'z': 0, 'radius': 100}, json.loads(params['key']))
+
+    def test_the_refreshes_whose_attempts_are_used_up_are_counted_by_kind(self):
+        db = MagicMock()
+        db.exec_db_read.return_value = [{'kind': SEARCH_KIND, 'exhausted': 3}]
+        sut = DeadLetterService(db)
+
+        self.assertEqual({'system': 0, 'bodies': 0, 'search': 3}, sut.count_exhausted())
+        self.assertEqual(3, EXHAUSTED_DEAD_LETTERS.value(kind=SEARCH_KIND))
+        self.assertEqual(0, EXHAUSTED_DEAD_LETTERS.value(kind='system'))
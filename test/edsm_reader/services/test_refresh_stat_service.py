@@ -0,0 +1,29 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.edsm_reader.services.refresh_stat_service import RefreshStatService
+
+
+class TestRefreshStatService(TestCase):
+
+    def test_candidates_are_read_from_a_window_of_the_stalest_systems(self):
+        db = MagicMock()
+        db.exec_db_read.return_value = None
+        sut = RefreshStatService(db)
+
+        self.assertEqual([], sut.read_refresh_candidates(50, [(0, 0, 0, 200)], candidate_window=4))
+
+        query, params = db.exec_db_read.call_args[0]
+        self.assertEqual(200, params['window'])
+        self.assertIn('r.x BETWEEN', query)
+        self.assertNotIn('{', query)
+
+    def test_a_created_system_is_recorded_as_just_refreshed(self):
+        db = MagicMock()
+        sut = RefreshStatService(db)
+
+        sut.record_position({'id': 1, 'id64': 10}, None)
+
+        params = db.exec_db_write.call_args[0][1]
+        self.assertIsNotNone(params['checked_date'])
+        self.assertIsNone(params['x'])
@@ -0,0 +1,44 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.edsm_reader.orchestrator.sector import SectorBox
+from src.edsm_reader.services.sector_lease_service import (SECTOR_LEASE_CLAIM,
+                                                           SECTOR_LEASE_COUNT_UNFINISHED,
+                                                           SECTOR_LEASE_INSERT, SectorLeaseService)
+
+SCAN_ID = 'shard:0:0:0:500:250'
+
+
+class TestSectorLeaseService(TestCase):
+
+    def test_the_sectors_are_registered_with_their_scan(self):
+        db = MagicMock()
+        sut = SectorLeaseService(db)
+
+        sut.create_sectors(SCAN_ID, [SectorBox((0, 0, 0), 250)])
+
+        (query, rows), = db.exec_db_batch.call_args[0][0]
+        self.assertEqual(SECTOR_LEASE_INSERT, query)
+        self.assertEqual([(SCAN_ID, '0:0:0:250')], [(row['scan_id'], row['sector_id']) for row in rows])
+
+    def test_the_claims_and_the_unfinished_sectors_are_the_ones_of_the_scan(self):
+        db = MagicMock()
+        db.exec_db_read.side_effect = [[], [{'unfinished': 2}]]
+        sut = SectorLeaseService(db)
+
+        self.assertIsNone(sut.claim_sector(SCAN_ID, 'reader-1', 60))
+        self.assertEqual(2, sut.count_unfinished(SCAN_ID))
+
+        for (query, params), expected_query in zip([call[0] for call in db.exec_db_read.call_args_list],
+                                                   [SECTOR_LEASE_CLAIM, SECTOR_LEASE_COUNT_UNFINISHED]):
+            self.assertEqual(expected_query, query)
+            self.assertEqual(SCAN_ID, params['scan_id'])
+            self.assertIn('scan_id = %(scan_id)s', query)
+
+    def test_reset_counts_the_sectors_scanned_again(self):
+        db = MagicMock()
+        db.exec_db_read.return_value = [{'sector_id': '0:0:0:250'}, {'sector_id': '250:0:0:250'}]
+        sut = SectorLeaseService(db)
+
+        self.assertEqual(2, sut.reset_sectors(SCAN_ID))
+        self.assertEqual({'scan_id': SCAN_ID}, db.exec_db_read.call_args[0][1])
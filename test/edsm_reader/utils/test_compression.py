@@ -0,0 +1,27 @@
+import zlib
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.edsm_reader.utils import compression
+from src.edsm_reader.utils.compression import ZLIB_CODEC, compress, decompress
+
+
+class TestCompression(TestCase):
+    data = b'{"key":{"id":12,"id64":1234},"previous_state":{"name":"Sol"}}' * 50
+
+    def test_compressed_data_is_decompressed_back(self):
+        codec, compressed = compress(self.data)
+
+        self.assertLess(len(compressed), len(self.data))
+        self.assertEqual(self.data, decompress(codec, compressed))
+
+    def test_zlib_is_used_without_zstandard(self):
+        with patch.object(compression, 'zstandard', None):
+            codec, compressed = compress(self.data)
+
+        self.assertEqual(ZLIB_CODEC, codec)
+        self.assertEqual(self.data, zlib.decompress(compressed))
+
+    def test_unknown_codec_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decompress('lz4', b'')
@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from src.edsm_reader.utils.fingerprint import Fingerprinter, _canonical_bytes, compute_delta
+
+
+class TestFingerprinter(TestCase):
+
+    def test_fingerprint_does_not_depend_on_keys_order(self):
+        sut = Fingerprinter()
+
+        self.assertEqual(sut.fingerprint({'id': 1, 'name': 'Sol'}),
+                         sut.fingerprint({'name': 'Sol', 'id': 1}))
+
+    def test_fingerprint_ignores_volatile_fields(self):
+        sut = Fingerprinter(ignored_fields=['updateTime'])
+
+        self.assertEqual(sut.fingerprint({'id': 1, 'updateTime': '2024-01-01'}),
+                         sut.fingerprint({'id': 1, 'updateTime': '2024-02-01'}))
+        self.assertNotEqual(sut.fingerprint({'id': 1}), sut.fingerprint({'id': 2}))
+
+    def test_legacy_fingerprint_is_the_historical_sha256(self):
+        sut = Fingerprinter('legacy', ignored_fields=[])
+
+        self.assertEqual('354aaef7a5f6ecbb2faee49fbe47a24e024cb62b3183b853a1ecc01e01920e49',
+                         sut.fingerprint({'id': 1}))
+
+    def test_default_fingerprint_ignores_the_update_time_and_search_distance(self):
+        sut = Fingerprinter()
+
+        self.assertEqual(sut.fingerprint({'id': 1, 'updateTime': '2024-01-01', 'distance': 10}),
+                         sut.fingerprint({'id': 1, 'updateTime': '2024-02-01', 'distance': 40}))
+
+    def test_legacy_hash_of_an_unchanged_entity_matches_the_previous_fingerprint(self):
+        sut = Fingerprinter('blake2b', previous_algorithm='legacy')
+        legacy_hash = Fingerprinter('legacy').fingerprint({'id': 1, 'name': 'Sol'})
+
+        self.assertNotEqual(legacy_hash, sut.fingerprint({'id': 1, 'name': 'Sol'}))
+        self.assertTrue(sut.matches_previous({'id': 1, 'name': 'Sol'}, legacy_hash))
+        self.assertFalse(sut.matches_previous({'id': 1, 'name': 'Earth'}, legacy_hash))
+
+    def test_without_previous_algorithm_no_stored_hash_matches(self):
+        legacy_hash = Fingerprinter('legacy').fingerprint({'id': 1})
+
+        self.assertFalse(Fingerprinter('blake2b', previous_algorithm=None)
+                         .matches_previous({'id': 1}, legacy_hash))
+        self.assertFalse(Fingerprinter('legacy').matches_previous({'id': 1}, legacy_hash))
+
+    def test_canonical_encoding_of_text_and_floats_is_stable(self):
+        encoded = _canonical_bytes({'name': 'Col 285 Sector Ü', 'gravity': 0.1, 'distance': 1e16})
+
+        self.assertEqual('{"distance":1e+16,"gravity":0.1,"name":"Col 285 Sector Ü"}'.encode('utf-8'),
+                         encoded)
+
+    def test_unknown_algorithm_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Fingerprinter('md5')
+
+
+class TestComputeDelta(TestCase):
+
+    def test_compute_delta_keeps_previous_values_of_changed_fields(self):
+        delta = compute_delta({'name': 'Sol', 'population': 10, 'update_time': 1},
+                              {'name': 'Sol', 'population': 12, 'update_time': 2, 'allegiance': 'x'},
+                              ['update_time'])
+
+        self.assertEqual({'population': 10, 'allegiance': None}, delta)
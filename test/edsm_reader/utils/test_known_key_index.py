@@ -0,0 +1,44 @@
+import random
+from unittest import TestCase
+
+from src.edsm_reader.utils.known_key_index import KnownKeyIndex
+
+
+class TestKnownKeyIndex(TestCase):
+
+    def setUp(self):
+        generator = random.Random(11)
+        self.stored = generator.sample(range(1, 1 << 60), 20000)
+        stored = set(self.stored)
+        self.unknown = [id64 + 1 for id64 in self.stored if id64 + 1 not in stored]
+
+    def test_loaded_keys_are_all_known(self):
+        sut = KnownKeyIndex(initial_capacity=50000)
+        self.assertEqual(len(self.stored), sut.load(iter(self.stored)))
+
+        self.assertTrue(all(sut.may_contain({'id': 0, 'id64': id64}) for id64 in self.stored))
+
+    def test_unknown_keys_are_mostly_reported_absent(self):
+        sut = KnownKeyIndex(initial_capacity=50000, error_rate=0.01)
+        sut.load(iter(self.stored))
+
+        false_positives = sum(sut.may_contain({'id64': id64}) for id64 in self.unknown)
+        self.assertLess(false_positives / len(self.unknown), 0.02)
+
+    def test_the_index_grows_past_its_initial_capacity(self):
+        sut = KnownKeyIndex(initial_capacity=1000)
+        sut.load(iter(self.stored[:15000]))
+        for id64 in self.stored[15000:]:
+            sut.add({'id': 1, 'id64': id64})
+
+        self.assertEqual(len(self.stored), len(sut))
+        self.assertTrue(all(sut.may_contain({'id64': id64}) for id64 in self.stored))
+        false_positives = sum(sut.may_contain({'id64': id64}) for id64 in self.unknown)
+        self.assertLess(false_positives / len(self.unknown), 0.02)
+
+    def test_keys_without_id64_are_never_skipped(self):
+        sut = KnownKeyIndex(initial_capacity=10)
+        sut.add({'id': 12})
+
+        self.assertEqual(0, len(sut))
+        self.assertTrue(sut.may_contain({'id': 13}))
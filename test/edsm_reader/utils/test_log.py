@@ -0,0 +1,67 @@
+import io
+from unittest import TestCase
+from unittest.mock import patch
+
+import structlog
+
+from src.edsm_reader.utils import log
+from src.edsm_reader.utils.log import AsyncLogWriter, EntitySampler, logit
+
+
+class TestLog(TestCase):
+
+    def test_one_record_per_rate_is_kept_by_category(self):
+        sut = EntitySampler(rate=3)
+        kept = []
+        for index in range(6):
+            try:
+                kept.append(sut(None, 'info', {'event': index, 'sampled': 'system'})['event'])
+            except structlog.DropEvent:
+                pass
+
+        self.assertEqual([0, 3], kept)
+        self.assertEqual({'event': 'failed'}, sut(None, 'error', {'event': 'failed', 'sampled': 'system'}))
+
+    def test_calls_are_traced_at_debug_level_only(self):
+        traced_calls = []
+
+        def traced(func):
+            def instrumented(*args):
+                traced_calls.append(args)
+                return func(*args)
+            return instrumented
+
+        with patch.object(log, 'traced', traced):
+            double = logit(lambda value: value * 2)
+        with patch.object(log, '_tracing_enabled', False):
+            self.assertEqual(4, double(2))
+        with patch.object(log, '_tracing_enabled', True):
+            self.assertEqual(6, double(3))
+
+        self.assertEqual([(3,)], traced_calls)
+
+    def test_queued_records_are_written_by_the_writer(self):
+        stream = io.StringIO()
+        sut = AsyncLogWriter(lambda logger, method_name, event_dict: event_dict['event'], stream)
+
+        sut.put('info', {'event': 'first'})
+        sut.put('info', {'event': 'second'})
+        sut.stop()
+
+        self.assertEqual('first\nsecond\n', stream.getvalue())
+
+    def test_a_broken_record_is_reported_without_stopping_the_writer(self):
+        def render(logger, method_name, event_dict):
+            return event_dict['event'].upper()
+
+        stream = io.StringIO()
+        errors = io.StringIO()
+        sut = AsyncLogWriter(render, stream)
+
+        with patch('sys.stderr', errors):
+            sut.put('info', {'event': None})
+            sut.put('info', {'event': 'after'})
+            sut.stop()
+
+        self.assertEqual('AFTER\n', stream.getvalue())
+        self.assertTrue(errors.getvalue().startswith('[log]Cannot write a log record: '))
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import urllib.request
+
+from src.edsm_reader.utils.metrics import MetricsServer, Registry, _Metric
+
+
+class TestMetrics(TestCase):
+
+    def test_counter_renders_one_sample_per_label_set(self):
+        registry = Registry()
+        sut = registry.counter('calls_total', 'Calls', ['api'])
+        sut.inc(api='system')
+        sut.inc(2, api='bodies')
+
+        rendered = registry.render()
+
+        self.assertIn('# TYPE calls_total counter', rendered)
+        self.assertIn('calls_total{api="system"} 1.0', rendered)
+        self.assertIn('calls_total{api="bodies"} 2.0', rendered)
+
+    def test_gauge_goes_up_and_down(self):
+        sut = Registry().gauge('workers', 'Workers')
+        sut.inc()
+        sut.inc()
+        sut.dec()
+
+        self.assertEqual(1.0, sut.value())
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        sut = registry.histogram('duration_seconds', 'Duration', buckets=(0.1, 1.0))
+        sut.observe(0.05)
+        sut.observe(0.5)
+        sut.observe(5.0)
+
+        rendered = registry.render()
+
+        self.assertIn('duration_seconds_bucket{le="0.1"} 1', rendered)
+        self.assertIn('duration_seconds_bucket{le="1.0"} 2', rendered)
+        self.assertIn('duration_seconds_bucket{le="+Inf"} 3', rendered)
+        self.assertIn('duration_seconds_count 3', rendered)
+
+    def test_register_twice_returns_the_same_metric(self):
+        registry = Registry()
+
+        self.assertIs(registry.counter('calls_total', 'Calls'), registry.counter('calls_total', 'Calls'))
+
+    def test_metric_without_samples_cannot_be_created(self):
+        class Untyped(_Metric):
+            metric_type = 'untyped'
+
+        with self.assertRaises(TypeError):
+            Untyped('untyped', 'Untyped')
+
+    def test_server_serves_on_the_loopback_interface_by_default(self):
+        registry = Registry()
+        registry.counter('calls_total', 'Calls').inc()
+        sut = MetricsServer(0, registry=registry)
+        sut.start()
+        try:
+            host, port = sut._server.server_address[:2]
+            with urllib.request.urlopen(f'http://{host}:{port}/metrics', timeout=5) as response:
+                payload = response.read().decode('utf-8')
+        finally:
+            sut.stop()
+
+        self.assertEqual('127.0.0.1', host)
+        self.assertIn('calls_total 1.0', payload)
@@ -0,0 +1,22 @@
+from unittest import TestCase
+
+from src.edsm_reader.utils.redaction import redact
+
+
+class TestRedaction(TestCase):
+
+    def test_api_key_of_an_url_is_masked(self):
+        message = ("HTTPSConnectionPool(host='www.edsm.net', port=443): Read timed out. "
+                   "(read timeout=30) url: /api-v1/system?systemId=1&apiKey=SECRET123&showId=1")
+
+        redacted = redact(message)
+
+        self.assertNotIn('SECRET123', redacted)
+        self.assertIn('apiKey=*************&showId=1', redacted)
+
+    def test_api_key_of_parameters_is_masked(self):
+        self.assertEqual("{'systemId': 1, 'apiKey': '*************'}",
+                         redact("{'systemId': 1, 'apiKey': 'SECRET123'}"))
+
+    def test_text_without_api_key_is_unchanged(self):
+        self.assertEqual('Status: 500', redact('Status: 500'))
@@ -0,0 +1,57 @@
+import math
+import random
+from unittest import TestCase
+
+from src.edsm_reader.utils.spatial_index import SpatialIndex
+
+
+def _brute_force_within(positions, center, radius):
+    return sorted((math.dist(center, position[1:]), position[0]) for position in positions
+                  if math.dist(center, position[1:]) <= radius)
+
+
+class TestSpatialIndex(TestCase):
+
+    def setUp(self):
+        generator = random.Random(7)
+        self.positions = [(index, generator.uniform(-500, 500), generator.uniform(-50, 50),
+                           generator.uniform(-500, 500)) for index in range(5000)]
+
+    def test_within_finds_the_same_systems_as_a_full_scan(self):
+        sut = SpatialIndex(cell_size=20)
+        sut.load(iter(self.positions))
+
+        for center, radius in [((0, 0, 0), 40), ((123.4, -10, -321), 75), ((480, 0, 480), 30)]:
+            expected = _brute_force_within(self.positions, center, radius)
+            found = sut.within(center, radius)
+            self.assertEqual([id64 for _, id64 in expected], [id64 for id64, _, _ in found])
+
+    def test_nearest_returns_the_k_closest_systems(self):
+        sut = SpatialIndex(cell_size=20)
+        sut.load(iter(self.positions))
+        point = (10, 5, -20)
+
+        expected = sorted(self.positions, key=lambda position: math.dist(point, position[1:]))[:7]
+        self.assertEqual([position[0] for position in expected],
+                         [id64 for id64, _, _ in sut.nearest(point, 7)])
+
+    def test_added_systems_are_found_before_and_after_a_merge(self):
+        sut = SpatialIndex(cell_size=20, pending_capacity=3)
+        sut.load(iter(self.positions))
+
+        for id64 in range(10000, 10010):
+            sut.add(id64, 1000, 1000, 1000)
+
+        self.assertEqual(5010, len(sut))
+        self.assertEqual(list(range(10000, 10010)),
+                         sorted(id64 for id64, _, _ in sut.within((1000, 1000, 1000), 1)))
+
+    def test_moved_system_is_only_found_at_its_new_position(self):
+        sut = SpatialIndex(cell_size=20)
+        sut.load(iter([(1, 0, 0, 0), (2, 100, 0, 0)]))
+
+        sut.add(1, 200, 0, 0)
+
+        self.assertEqual(2, len(sut))
+        self.assertEqual([], sut.within((0, 0, 0), 10))
+        self.assertEqual([(1, (200.0, 0.0, 0.0), 0.0)], sut.within((200, 0, 0), 10))
@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from src.edsm_reader.utils.sphere_coverage import SphereCoverage
+
+
+class TestSphereCoverage(TestCase):
+
+    def test_contains_point_inside_a_sphere(self):
+        sut = SphereCoverage(100)
+        sut.add((0, 0, 0), 100)
+
+        self.assertTrue(sut.contains((99, 0, 0)))
+        self.assertTrue(sut.contains((-50, 50, 50)))
+
+    def test_does_not_contain_point_outside_every_sphere(self):
+        sut = SphereCoverage(100)
+        sut.add((0, 0, 0), 100)
+
+        self.assertFalse(sut.contains((80, 80, 0)))
+        self.assertFalse(sut.contains((250, 0, 0)))
+
+    def test_contains_with_radius_larger_than_cells(self):
+        sut = SphereCoverage(10)
+        sut.add((0, 0, 0), 100)
+
+        self.assertTrue(sut.contains((0, 95, 0)))
+
+    def test_covers_sphere_only_when_fully_inside(self):
+        sut = SphereCoverage(100)
+        sut.add((0, 0, 0), 100)
+
+        self.assertTrue(sut.covers_sphere((0, 0, 0), 100))
+        self.assertTrue(sut.covers_sphere((40, 0, 0), 50))
+        self.assertFalse(sut.covers_sphere((60, 0, 0), 50))
+
+    def test_discarded_sphere_no_longer_covers(self):
+        sut = SphereCoverage(100)
+        sut.add((0, 0, 0), 100)
+        sut.add((150, 0, 0), 100)
+
+        sut.discard((0, 0, 0), 100)
+        sut.discard((500, 0, 0), 100)
+
+        self.assertFalse(sut.contains((-50, 0, 0)))
+        self.assertTrue(sut.contains((100, 0, 0)))
+        self.assertEqual(1, len(sut))
+
+    def test_cleared_coverage_covers_nothing(self):
+        sut = SphereCoverage(100)
+        sut.add((0, 0, 0), 300)
+
+        sut.clear()
+
+        self.assertFalse(sut.contains((0, 0, 0)))
+        self.assertEqual(0, len(sut))